@@ -1,120 +1,805 @@
+import time
+STARTUP_START = time.perf_counter()  # Taken before any other import for --profile-startup
+
+import argparse
 import tkinter as tk
 import tkinter
 from tkinter import ttk, messagebox, filedialog
 import customtkinter
 import sounddevice as sd
 import numpy as np
-import whisper
 import os
-import time
+import re
 from datetime import datetime
-import win32com.client  # For MS Word integration
 import threading
-import queue
 import warnings
-from docx import Document
 from PIL import Image  # Import the Image class from PIL
-import docx
-from docx.shared import Inches
-from pdf2image import convert_from_path
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-import fitz
-import time 
 import psutil
-import tempfile
+from config import load_config, update_config_file
+from backends import create_backend, BACKENDS
+from vad import frame_rms, pause_threshold, trim_silence
+from audio_buffer import AudioRingBuffer
+from transcription_cache import TranscriptionCache, audio_fingerprint
+from preview import PreviewRenderer
+from document_output import create_output_worker
+from preprocessing import AudioPreprocessor, normalize, denoise
+from longform import LongFormTranscriber
+from vocabulary import Vocabulary, join_prompts
+from devices import DeviceMonitor, InputDevice, scan_input_devices
+from spool import SpoolWriter, find_unfinished, read_spool, remove_spool, spool_info
+from archive import PrescriptionArchive, print_results
+from model_manager import LANGUAGES, MODEL_SIZES, ModelCache, choose_model
+import telemetry
+from jobs import JobScheduler, PRIORITY_TRANSCRIPTION, PRIORITY_DOCUMENT, PRIORITY_PREVIEW
 
 warnings.filterwarnings("ignore", category=UserWarning)
 
 customtkinter.set_appearance_mode("Dark")
 customtkinter.set_default_color_theme("blue")
 
-# Load Whisper model (outside class for performance)
-model = whisper.load_model("base")
+# --- Model Settings ---
+# The inference engine and the document libraries (docx, reportlab,
+# win32com) are imported where they are first used so the window can show
+# right away. Backend, model size and language come from quickdoc_config.json.
+config = load_config()
+model = None  # The loaded backends.TranscriptionBackend
+model_error = None
+model_ready = threading.Event()
+model_warm = threading.Event()  # Set once the warm-up decode has run (or was skipped)
+inference_lock = threading.Lock()  # Whisper decoding is not safe to run concurrently on one model
+longform = None  # (model name, parallel decoder for long dictations), created on first use
+longform_lock = threading.Lock()  # Jobs and the live/recovery path may ask for it at the same time
+startup_profiler = None
+
+
+class StartupProfiler:
+    """Collect per-phase startup timings for --profile-startup."""
+
+    def __init__(self, start):
+        self.start = start
+        self.last = start
+        self.phases = []
+        self.lock = threading.Lock()
+
+    def mark(self, phase):
+        """Record a phase that ran since the previous mark on the main thread."""
+        now = time.perf_counter()
+        with self.lock:
+            self.phases.append((phase, self.last - self.start, now - self.last))
+            self.last = now
+
+    def record(self, phase, started_at):
+        """Record a phase that ran concurrently, e.g. on a background thread."""
+        now = time.perf_counter()
+        with self.lock:
+            self.phases.append((phase, started_at - self.start, now - started_at))
+
+    def report(self):
+        print("Startup profile:")
+        with self.lock:
+            for phase, offset, duration in sorted(self.phases, key=lambda p: p[1]):
+                print(f"  {phase:<28} {duration * 1000:9.1f} ms  (started at {offset * 1000:8.1f} ms)")
+        print(f"  {'total':<28} {(time.perf_counter() - self.start) * 1000:9.1f} ms")
+
+
+def load_model():
+    """Load the configured backend; sets `model_ready` whether or not it succeeded."""
+    global model, model_error
+    started_at = time.perf_counter()
+    try:
+        # Switching back to a model used before takes it from the cache
+        model = model_cache.get(config["model"])
+        model_error = None
+        # Cold: the weights were just converted; warm: mapped from the converted file
+        start_kind = "cold" if getattr(model, "converted", False) else "warm"
+        print(f"Loaded {config['backend']} '{config['model']}' in {time.perf_counter() - started_at:.2f} s "
+              f"({start_kind} start)")
+        if startup_profiler:
+            startup_profiler.record(f"load model, {start_kind} (background)", started_at)
+    except Exception as e:
+        model, model_error = None, e
+        print(f"Model loading error: {e}")
+    finally:
+        model_ready.set()
+
+    if model is not None and config["warmup"]:
+        warm_up_model()
+    model_warm.set()
+
+
+def warm_up_model():
+    """Run a short decode so the first dictation does not pay for the warm-up."""
+    started_at = time.perf_counter()
+    try:
+        with inference_lock:
+            seconds = model.warm_up(language=transcription_language())
+        print(f"Model warm-up took {seconds:.2f} s")
+        if startup_profiler:
+            startup_profiler.record("warm-up decode (background)", started_at)
+    except Exception as e:
+        print(f"Model warm-up failed: {e}")
+
+
+def new_backend(model_name=None, threads=None):
+    """Create and load an instance of the configured backend (not warmed up)."""
+    return create_backend(config["backend"], model_name or config["model"], config["model_cache_dir"],
+                          **backend_options(threads)).load()
+
+
+def transcription_language():
+    """The configured language; "auto" (or none) lets Whisper detect it."""
+    return None if config["language"] in (None, "auto") else config["language"]
+
+
+def backend_options(threads=None):
+    """Extra constructor arguments for the configured backend; `threads` overrides the thread count."""
+    if config["backend"] == "remote":
+        return {"server_url": config["server_url"]}
+    if config["backend"] == "ctranslate2":
+        return {"threads": threads}
+    if config["backend"] == "pytorch":
+        return {
+            "quantize": config["pytorch_quantize"],
+            "threads": threads or config["torch_threads"],
+            "interop_threads": config["torch_interop_threads"],
+            "priority": config["inference_priority"],
+            "cores": config["inference_cores"]
+        }
+    return {}
+
+
+def load_model_async():
+    """Load the configured backend on a background thread."""
+    model_ready.clear()
+    model_warm.clear()
+    threading.Thread(target=load_model, daemon=True).start()
+
+
+def get_model(model_name=None):
+    """Return the loaded backend, waiting for the background load to finish.
+
+    Other model sizes than the configured one are loaded into the model cache on first use.
+    """
+    model_ready.wait()
+    if model_name is not None and model_name != config["model"]:
+        return model_cache.get(model_name, keep=(config["model"],))
+    if model is None:
+        raise RuntimeError(f"Whisper model could not be loaded: {model_error}")
+    return model
+
+
+def get_longform(model_name):
+    """Return the parallel long-dictation decoder for `model_name`, or None if it is switched off."""
+    global longform
+    workers = config["longform_workers"] or max(1, min(4, (os.cpu_count() or 1) // 2))
+    if workers < 2:
+        return None
+    with longform_lock:
+        if longform is None or longform[0] != model_name:
+            if longform is not None:
+                model_cache.release_instances(longform[0])
+                longform = None
+            # Its own model instances; the shared one stays free for short takes. They count
+            # against "model_cache_max_mb", so only as many as fit next to the models in use
+            keep = (config["model"], model_name)
+            workers = min(workers, model_cache.instances_that_fit(model_name, keep))
+            if workers < 2:
+                return None
+            # The instances decode at the same time, so they share the cores instead of each taking all
+            threads = max(1, (config["torch_threads"] or os.cpu_count() or 1) // workers)
+            longform = (model_name, LongFormTranscriber(
+                lambda: model_cache.load_instance(model_name, keep, threads=threads), workers))
+        return longform[1]
+
+
+# Every model size that was loaded, so switching back and forth does not reload
+model_cache = ModelCache(new_backend, config["model_cache_max_mb"])
+
+
+def load_vocabulary(path):
+    """Read the medical vocabulary; None if it is switched off or missing."""
+    if not path:
+        return None
+    try:
+        return Vocabulary.load(path)
+    except OSError as e:
+        print(f"Vocabulary not loaded: {e}")
+        return None
+
+
+# Drug names and phrases for the prompt and the post-correction, indexed once
+vocabulary = load_vocabulary(config["vocabulary_path"])
+
+
+def vocabulary_prompt(backend):
+    """The vocabulary prompt, fitted to the backend's tokenizer (computed once per tokenizer)."""
+    if vocabulary is None or not config["vocabulary_prompt"]:
+        return None
+    return vocabulary.prompt(getattr(backend, "count_tokens", None))
+
+
+def correct_transcription(text):
+    """Fix misheard drug names and units with the vocabulary."""
+    if vocabulary is None or not config["vocabulary_correction"] or not text:
+        return text
+    with telemetry.span("vocabulary.correct", log=False):
+        text, corrections = vocabulary.correct(text)
+    if corrections:
+        telemetry.increment("vocabulary.corrections", len(corrections))
+        print("Vocabulary: " + ", ".join(f"{heard} -> {corrected}" for heard, corrected in corrections))
+    return text
+
+
+def vocabulary_suggestions(text):
+    """Near misses of drug names that are left for the user to confirm: [(heard, suggestion), ...]."""
+    if vocabulary is None or not config["vocabulary_correction"] or not text:
+        return []
+    return vocabulary.suggest(text)
 
 # --- Image Settings ---
 IMAGE_WIDTH = 400  # Reduced width
 IMAGE_HEIGHT = 200 # Reduced height
 IMAGE_PATH = 'template.png'  # Update to match actual path
 
+# --- Preview Settings ---
+PREVIEW_SIZE = (464, 600)     # US Letter aspect ratio
+PREVIEW_DEBOUNCE_MS = 300     # Wait for a pause in typing before re-rendering
+
+# --- Streaming Settings ---
+STREAM_MAX_WINDOW_SECONDS = 30    # Whisper's native context length
+STREAM_MIN_WINDOW_SECONDS = 5     # Don't cut windows shorter than this
+STREAM_SILENCE_SECONDS = 0.4      # Pause length that counts as a boundary
+STREAM_LEVEL_HISTORY_SECONDS = 60 # Recent audio the pause level is estimated from (adapts to mic and room)
+STREAM_FRAME_SECONDS = 0.02       # Frame size used for the RMS analysis
+STREAM_PROMPT_CHARS = 200         # Previous text passed on as decoding context
+
+# --- Capture Buffer Settings ---
+BUFFER_SECONDS = 10               # Preallocated; the spool writer empties it several times a second
+BUFFER_MAX_SECONDS = 60 * 60      # Unread audio beyond this is dropped (and counted)
+SPOOL_INTERVAL_SECONDS = 0.25     # How often captured audio is appended to the spool file
+DEVICE_LOCK_RETRY_MS = 50         # Retry interval while a device scan holds the stream lock
+
+# --- Document Settings ---
+TEMPLATE_PATH = "template.docx"  # Replace with actual path if needed
+PRESCRIPTIONS_FOLDER = "prescriptions"
+ARCHIVE_SEARCH_LIMIT = 50         # Results shown in the search window
+ARCHIVE_SEARCH_DEBOUNCE_MS = 150
+
+# Every embedded prescription is recorded here (opened on first use)
+archive = PrescriptionArchive(config["archive_path"])
+
+
+def write_prescription(transcription, doc_path=None, template_path=TEMPLATE_PATH, **fields):
+    """Fill the prescription template with the transcription and save it.
+
+    Saved as doc_path, or under a new unique name in PRESCRIPTIONS_FOLDER.
+    Extra fields (patient, date, ...) fill the matching {{placeholders}}.
+    """
+    from templates import get_template
+
+    with telemetry.span("docx.write"):
+        template = get_template(template_path)  # Parsed once, rendered from memory
+        if doc_path is None:
+            return template.render_to_file(PRESCRIPTIONS_FOLDER, transcription, **fields)
+
+        folder = os.path.dirname(doc_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(doc_path, "wb") as f:
+            template.render(f, transcription, **fields)
+        return doc_path
+
+
+def load_template_async(template_path=TEMPLATE_PATH):
+    """Parse the prescription template in the background so the first embed is fast."""
+    def load():
+        from templates import get_template
+        try:
+            get_template(template_path)
+        except Exception as e:
+            print(f"Template loading error: {e}")
+    threading.Thread(target=load, daemon=True).start()
+
 class AudioRecorder:
     def __init__(self, sample_rate=16000):
         self.sample_rate = sample_rate
         self.recording = False
-        self.audio_queue = queue.Queue()
+        self.ring_buffer = self._new_buffer()
         self.thread = None
+        self.preprocessor = None  # Capture rate -> model rate, set up per recording
+        self.stream = None
+        # Held while opening or closing the stream, so the device monitor never re-initializes PortAudio
+        # then; reentrant so the UI can hold it while it picks the device from the current scan
+        self.stream_lock = threading.RLock()
+
+        # The recording goes to disk as it is captured; live transcription reads a copy
+        self.spool = None
+        self.spool_thread = None
+        self.spool_stop = threading.Event()
+        self.live_buffer = None
+
+        # Voice activity detection before inference
+        self.use_vad = config["vad"]
+        self.vad_total_seconds = 0.0
+        self.vad_skipped_seconds = 0.0
+        self.last_segments = []  # Segments of the last transcription, in recording time
+
+        # Results of earlier transcriptions of the same audio
+        self.cache = None
+        if config["cache"]:
+            self.cache = TranscriptionCache(config["cache_dir"], config["cache_max_mb"] * 1024 * 1024)
 
     def list_microphones(self):
-        """List all available audio input devices."""
-        devices = sd.query_devices()
-        input_devices = [dev for dev in devices if dev['max_input_channels'] > 0]
-        return input_devices
+        """List all available audio input devices (blocking; the app uses a DeviceMonitor)."""
+        return scan_input_devices()
 
-    def select_microphone(self, input_devices, selected_mic_index):
-        """Select a microphone."""
-        return input_devices[selected_mic_index], selected_mic_index
+    def _new_buffer(self):
+        return AudioRingBuffer(
+            BUFFER_SECONDS * self.sample_rate,
+            max_capacity=BUFFER_MAX_SECONDS * self.sample_rate
+        )
 
     def audio_callback(self, indata, frames, time, status):
         """Callback to store audio data."""
         if status:
-            print(f"Status: {status}")
+            self.ring_buffer.record_status(status)
         if self.recording:
-            self.audio_queue.put(indata.copy())
+            # Runs every few milliseconds, so only the histogram is updated
+            with telemetry.span("capture", log=False):
+                self.ring_buffer.write(self.preprocessor.process(indata[:, 0]))
+
+    def start_recording(self, device, live=False):
+        """Start audio recording; with `live`, the audio is also made available in `live_buffer`.
 
-    def start_recording(self, device_index):
-        """Start audio recording."""
+        `device` is an InputDevice from the last scan, or a PortAudio index
+        (None for the default input).
+        """
         self.recording = True
-        self.audio_queue = queue.Queue()
+        self.ring_buffer = self._new_buffer()
+        self.live_buffer = self._new_buffer() if live else None
+        try:
+            self.spool = SpoolWriter(config["spool_dir"], self.sample_rate)
+        except OSError as e:
+            # Without a spool the ring buffer keeps the whole recording, as before
+            print(f"Could not create the audio spool, recording to memory: {e}")
+            self.spool = None
 
         try:
-            self.stream = sd.InputStream(
-                samplerate=self.sample_rate,
-                channels=1,
-                device=device_index,
-                callback=self.audio_callback
-            )
-            self.stream.start()
+            with self.stream_lock:
+                if isinstance(device, InputDevice):
+                    # Known from the scan, so starting does not wait for a device query
+                    device_index, default_rate = device.index, device.default_samplerate
+                else:
+                    device_index, default_rate = device, sd.query_devices(device, "input")["default_samplerate"]
+                # Capture at the device's own rate; forcing 16 kHz fails or sounds bad on many headsets
+                capture_rate = config["capture_rate"] or int(default_rate)
+                self.preprocessor = AudioPreprocessor(capture_rate, self.sample_rate)
+                self.stream = sd.InputStream(
+                    samplerate=capture_rate,
+                    channels=1,
+                    device=device_index,
+                    callback=self.audio_callback
+                )
+                self.stream.start()
         except sd.PortAudioError as e:
             print(f"Audio input error: {e}")
+            self._close_stream()
             self.recording = False
+            if self.spool is not None:
+                self.spool.close()
+                remove_spool(self.spool.path)
+                self.spool = None
+            return
 
-    def stop_recording(self):
-        """Stop audio recording and collect audio data."""
+        if self.spool is not None or live:
+            self.spool_stop.clear()
+            self.spool_thread = threading.Thread(target=self._spool_audio, name="quickdoc-spool", daemon=True)
+            self.spool_thread.start()
+
+    def _close_stream(self):
+        with self.stream_lock:
+            if self.stream is not None:
+                try:
+                    self.stream.stop()
+                    self.stream.close()
+                except sd.PortAudioError as e:
+                    print(f"Audio input error: {e}")
+                self.stream = None
+
+    def _spool_audio(self):
+        """Move captured audio from the ring buffer to the spool file (and the live buffer)."""
+        ring_buffer, spool, live_buffer = self.ring_buffer, self.spool, self.live_buffer
+        while True:
+            stopping = self.spool_stop.wait(SPOOL_INTERVAL_SECONDS)
+            views = ring_buffer.peek()
+            if views:
+                if spool is not None:
+                    with telemetry.span("spool.write", log=False):
+                        spool.write(views)
+                if live_buffer is not None:
+                    for view in views:
+                        live_buffer.write(view)
+                ring_buffer.consume(sum(len(view) for view in views))
+            # The stop flag is checked before reading so no frame is lost
+            if stopping and not views:
+                break
+
+    def stop_stream(self):
+        """Stop the input stream without collecting the recorded audio."""
         if not self.recording:
-            return None
+            return False
 
         self.recording = False
-        self.stream.stop()
+        self._close_stream()
+        # The callback has stopped, so this thread can write the resampler's last samples
+        tail = self.preprocessor.flush()
+        if len(tail):
+            self.ring_buffer.write(tail)
+        if self.spool_thread is not None:
+            self.spool_stop.set()
+            self.spool_thread.join()
+            self.spool_thread = None
+        if self.spool is not None:
+            self.spool.close()
+
+        buffer = self.ring_buffer
+        telemetry.increment("capture.overruns", buffer.overruns)
+        telemetry.increment("capture.dropped_frames", buffer.dropped_frames)
+        telemetry.increment("capture.status_errors", buffer.status_errors)
+        if buffer.overruns or buffer.dropped_frames or buffer.status_errors:
+            print(f"Capture problems: {buffer.overruns} overruns, {buffer.dropped_frames} dropped frames, "
+                  f"{buffer.status_errors} other stream errors")
+        return True
 
-        # Collect audio data from queue
-        audio_chunks = []
-        while not self.audio_queue.empty():
-            audio_chunks.append(self.audio_queue.get())
+    def stop_recording(self):
+        """Stop audio recording and collect audio data.
 
-        if not audio_chunks:
+        The spool file is kept until the recording is transcribed; see `spool`.
+        """
+        if not self.stop_stream():
+            return None
+
+        if self.spool is not None:
+            # Read back through a memory map; nothing of it was kept in memory while recording
+            audio_data = self.spool.read()
+        else:
+            # The stream has stopped, so the buffer can be handed over without a copy
+            audio_data = self.ring_buffer.drain()
+
+        if len(audio_data) == 0:
             print("No audio recorded.")
+            if self.spool is not None:
+                remove_spool(self.spool.path)
             return None
 
-        # Combine and normalize audio
-        audio_data = np.concatenate(audio_chunks, axis=0)
-        audio_data = np.squeeze(audio_data).astype(np.float32)
-        audio_data = audio_data / np.max(np.abs(audio_data))
+        return self.prepare(audio_data, in_place=True)
+
+    def prepare(self, audio_data, in_place=False):
+        """Optional noise reduction and safe gain normalization before inference."""
+        with telemetry.span("preprocess", denoise=config["denoise"]):
+            if config["denoise"]:
+                audio_data = denoise(audio_data, self.sample_rate)
+            # In place is fine for drained audio; the buffer is replaced on the next recording
+            return normalize(audio_data, in_place=in_place)
 
-        return audio_data
+    def transcribe_audio(self, audio_data, initial_prompt=None, model_name=None, raise_errors=False):
+        """Transcribe audio using Whisper; `model_name` overrides the configured model size.
 
-    def transcribe_audio(self, audio_data):
-        """Transcribe audio using Whisper."""
+        Errors are printed and give an empty text unless `raise_errors` is set.
+        """
         if audio_data is None or len(audio_data) == 0:
             return ""
 
+        model_name = model_name or config["model"]
+        language = transcription_language()
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key(
+                audio_data,
+                backend=config["backend"],
+                model=model_name,
+                int8=config["backend"] == "pytorch" and config["pytorch_quantize"],
+                language=language,
+                initial_prompt=initial_prompt,
+                vocabulary=vocabulary.version if vocabulary is not None and config["vocabulary_prompt"] else None,
+                vad=self.use_vad
+            )
+            cached = self.cache.get(cache_key)
+            telemetry.increment("cache.hits" if cached is not None else "cache.misses")
+            if cached is not None:
+                print(f"Transcription cache hit: {self.cache.stats()}")
+                self.last_segments = cached["segments"]
+                # Cached before correction, so vocabulary changes apply to earlier takes too
+                return correct_transcription(cached["text"])
+
+        speech_map = None
+        if self.use_vad:
+            with telemetry.span("vad"):
+                audio_data, speech_map = trim_silence(audio_data, self.sample_rate)
+            self.vad_total_seconds += speech_map.total_seconds
+            self.vad_skipped_seconds += speech_map.skipped_seconds
+            print(f"VAD: skipped {speech_map.skipped_seconds:.1f} s of {speech_map.total_seconds:.1f} s "
+                  f"(session total {self.vad_skipped_seconds:.1f} s of {self.vad_total_seconds:.1f} s)")
+            if len(audio_data) == 0:
+                self.last_segments = []
+                return ""
+
         try:
-            result = model.transcribe(audio_data, language="de", fp16=False)
-            return result.get("text", "").strip()
+            backend = get_model(model_name)
+            shared_prompt = vocabulary_prompt(backend)
+            long_decoder = None
+            if len(audio_data) >= config["longform_min_seconds"] * self.sample_rate:
+                long_decoder = get_longform(model_name)
+            with telemetry.span("inference", backend=backend.name, model=backend.model_name,
+                                audio_seconds=round(len(audio_data) / self.sample_rate, 2),
+                                longform=long_decoder is not None):
+                if long_decoder is not None:
+                    result = long_decoder.transcribe(audio_data, self.sample_rate, language=language,
+                                                     initial_prompt=initial_prompt, shared_prompt=shared_prompt)
+                else:
+                    with inference_lock:
+                        result = backend.transcribe(audio_data, language=language,
+                                                    initial_prompt=join_prompts(shared_prompt, initial_prompt))
+            segments = []
+            for segment in result.get("segments", []):
+                mapped = {"start": float(segment["start"]), "end": float(segment["end"]), "text": segment["text"]}
+                if segment.get("words"):
+                    mapped["words"] = [
+                        {"word": word["word"], "start": float(word["start"]), "end": float(word["end"])}
+                        for word in segment["words"]
+                    ]
+                segments.append(mapped)
+            self.last_segments = speech_map.map_segments(segments) if speech_map else segments
+            text = result.get("text", "").strip()
+            if cache_key is not None:
+                self.cache.put(cache_key, {"text": text, "segments": self.last_segments})
+            return correct_transcription(text)
         except Exception as e:
             print(f"Transcription error: {e}")
+            if raise_errors:
+                raise
             return ""
 
 
+class StreamingTranscriber:
+    """Transcribe audio window by window while it is still being recorded.
+
+    A worker thread consumes the frames that `AudioRecorder` copies into its
+    live buffer while spooling the recording, cuts them at pauses into windows of at most
+    STREAM_MAX_WINDOW_SECONDS and transcribes each window as soon as it is
+    complete. After recording stops only the last window is left to decode.
+    What counts as a pause is measured against the noise floor of the last
+    minute, so quiet microphones and noisy rooms are cut at pauses as well.
+    """
+
+    def __init__(self, audio_recorder, on_partial, on_finished=None, model_name=None, reason="fixed"):
+        self.audio_recorder = audio_recorder
+        self.model_name = model_name or config["model"]  # Chosen once, so a dictation is not split across models
+        self.reason = reason
+        self.sample_rate = audio_recorder.sample_rate
+        self.on_partial = on_partial
+        self.on_finished = on_finished
+        self.texts = []
+        self.errors = []  # Exceptions of windows that could not be decoded
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.level_history = np.zeros(0)  # Frame levels (dBFS) of the windows cut so far
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start consuming audio in the background."""
+        self.thread = threading.Thread(target=self._run, name="quickdoc-streaming", daemon=True)
+        self.thread.start()
+
+    def finish(self):
+        """Signal that recording stopped; remaining audio is flushed and decoded."""
+        self.stop_event.set()
+
+    def wait(self):
+        """Block until the last window is decoded and return the full text."""
+        self.thread.join()
+        return " ".join(self.texts)
+
+    def _run(self):
+        ring_buffer = self.audio_recorder.live_buffer
+        while True:
+            stopping = self.stop_event.wait(0.2)
+            # Copy straight from the buffer's views into the pending window
+            views = ring_buffer.peek()
+            chunks = [self.pending] + views
+            if views:
+                self.pending = np.concatenate(chunks)
+                ring_buffer.consume(len(self.pending) - len(chunks[0]))
+
+            # Cut as many complete windows as the pending audio allows
+            while True:
+                cut = self._find_cut(self.pending)
+                if cut is None:
+                    break
+                window, self.pending = self.pending[:cut], self.pending[cut:]
+                self._transcribe_window(window)
+
+            # The stop flag is checked before reading so no frame is lost
+            if stopping and not views:
+                break
+
+        # Whatever is left is the last (at most 30 s) window
+        if len(self.pending):
+            self._transcribe_window(self.pending)
+            self.pending = np.zeros(0, dtype=np.float32)
+
+        if self.on_finished is not None:
+            self.on_finished(" ".join(self.texts))
+
+    def _frame_levels(self, audio):
+        """Frame levels in dBFS and the frame length."""
+        frame = int(self.sample_rate * STREAM_FRAME_SECONDS)
+        return 20 * np.log10(frame_rms(audio, frame) + 1e-10), frame
+
+    def _pause_threshold(self, level_db):
+        return pause_threshold(np.concatenate([self.level_history, level_db]))
+
+    def _find_cut(self, audio):
+        """Return the sample index to cut the next window at, or None to keep waiting."""
+        min_len = int(self.sample_rate * STREAM_MIN_WINDOW_SECONDS)
+        max_len = int(self.sample_rate * STREAM_MAX_WINDOW_SECONDS)
+        if len(audio) < min_len:
+            return None
+
+        level_db, frame = self._frame_levels(audio[:max_len])
+        silent = level_db <= self._pause_threshold(level_db)
+        run = max(1, int(STREAM_SILENCE_SECONDS / STREAM_FRAME_SECONDS))
+
+        # Start indices of runs of `run` consecutive silent frames
+        fully_silent = np.convolve(silent.astype(np.int32), np.ones(run, dtype=np.int32), mode="valid") == run
+        cut_frames = np.nonzero(fully_silent)[0] + run // 2
+        cut_frames = cut_frames[cut_frames * frame >= min_len]
+        if len(cut_frames):
+            return int(cut_frames[-1] * frame)
+
+        # No pause within the maximum window: cut at the quietest frame
+        if len(audio) >= max_len:
+            first = min_len // frame
+            return int((first + np.argmin(level_db[first:])) * frame)
+        return None
+
+    def _transcribe_window(self, window):
+        with telemetry.profiled():
+            self._decode_window(window)
+
+    def _decode_window(self, window):
+        level_db, _ = self._frame_levels(window)
+        if not len(level_db):
+            return
+        threshold = self._pause_threshold(level_db)
+        history = int(STREAM_LEVEL_HISTORY_SECONDS / STREAM_FRAME_SECONDS)
+        self.level_history = np.concatenate([self.level_history, level_db])[-history:]
+        if np.max(level_db) <= threshold:
+            return  # Nothing above the noise floor; pure silence only makes Whisper hallucinate
+
+        window = self.audio_recorder.prepare(window)
+        prompt = " ".join(self.texts)[-STREAM_PROMPT_CHARS:] or None
+        try:
+            text = self.audio_recorder.transcribe_audio(window, initial_prompt=prompt, model_name=self.model_name,
+                                                        raise_errors=True)
+        except Exception as e:
+            # Already printed; keep going, the job fails at the end and the spool stays for recovery
+            self.errors.append(e)
+            return
+        if text:
+            self.texts.append(text)
+            self.on_partial(text)
+
+
+class JobListFrame(customtkinter.CTkScrollableFrame):
+    """Non-modal list of background jobs with progress and cancel/open buttons."""
+
+    STATUS_COLORS = {"pending": "gray", "running": "orange", "done": "green", "failed": "red", "cancelled": "gray"}
+
+    def __init__(self, master, scheduler, on_open, **kwargs):
+        super().__init__(master, height=110, label_text="Jobs", **kwargs)
+        self.grid_columnconfigure(0, weight=1)
+        self.scheduler = scheduler
+        self.on_open = on_open
+        self.rows = {}  # job id -> widgets
+        scheduler.listeners.append(self.update_job)
+
+    def update_job(self, job):
+        if job.id not in self.rows:
+            label = customtkinter.CTkLabel(self, anchor="w")
+            button = customtkinter.CTkButton(self, width=70, height=24)
+            self.rows[job.id] = (label, button)
+            self._regrid()
+        label, button = self.rows[job.id]
+
+        text = f"{job.name} - {job.status}"
+        if job.progress is not None and job.status == "running":
+            text += f" {job.progress:.0%}"
+        if job.message and not job.finished:
+            text += f" ({job.message})"
+        label.configure(text=text, text_color=self.STATUS_COLORS[job.status])
+
+        if not job.finished:
+            button.configure(text="Cancel", state="normal", command=job.cancel)
+        elif job.status == "done" and job.kind == "transcription":
+            button.configure(text="Open", state="normal", command=lambda: self.on_open(job))
+        else:
+            button.configure(text="", state="disabled")
+
+    def _regrid(self):
+        # Newest first; drop rows of jobs the scheduler no longer keeps
+        kept = {job.id for job in self.scheduler.jobs}
+        for job_id in list(self.rows):
+            if job_id not in kept:
+                for widget in self.rows.pop(job_id):
+                    widget.destroy()
+        for row, job_id in enumerate(sorted(self.rows, reverse=True)):
+            label, button = self.rows[job_id]
+            label.grid(row=row, column=0, padx=(5, 5), pady=2, sticky="ew")
+            button.grid(row=row, column=1, padx=(0, 5), pady=2)
+
+
+class ArchiveSearchWindow(customtkinter.CTkToplevel):
+    """Full-text search over the prescription archive; picking a result loads it for editing."""
+
+    def __init__(self, master, on_select, **kwargs):
+        super().__init__(master, **kwargs)
+        self.title("Prescription Archive")
+        self.geometry("720x520")
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(2, weight=1)
+        self.on_select = on_select
+        self.pending_search = None
+
+        self.query_entry = customtkinter.CTkEntry(self, placeholder_text="Search prescriptions (drug, dose, ...)")
+        self.query_entry.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="ew")
+        self.patient_entry = customtkinter.CTkEntry(self, placeholder_text="Patient name")
+        self.patient_entry.grid(row=1, column=0, padx=10, pady=(0, 5), sticky="ew")
+        for entry in (self.query_entry, self.patient_entry):
+            entry.bind("<KeyRelease>", self.schedule_search)
+
+        self.results_frame = customtkinter.CTkScrollableFrame(self)
+        self.results_frame.grid(row=2, column=0, padx=10, pady=5, sticky="nsew")
+        self.results_frame.grid_columnconfigure(0, weight=1)
+        self.status_label = customtkinter.CTkLabel(self, text="", anchor="w")
+        self.status_label.grid(row=3, column=0, padx=10, pady=(0, 10), sticky="ew")
+
+        self.query_entry.focus_set()
+        self.search()
+
+    def schedule_search(self, event=None):
+        # Search once typing pauses; queries take milliseconds, so they run on the UI thread
+        if self.pending_search is not None:
+            self.after_cancel(self.pending_search)
+        self.pending_search = self.after(ARCHIVE_SEARCH_DEBOUNCE_MS, self.search)
+
+    def search(self):
+        self.pending_search = None
+        started_at = time.perf_counter()
+        try:
+            results = archive.search(self.query_entry.get(), patient=self.patient_entry.get(),
+                                     limit=ARCHIVE_SEARCH_LIMIT)
+        except Exception as e:
+            self.status_label.configure(text=f"Search failed: {e}", text_color="red")
+            return
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+
+        for widget in self.results_frame.winfo_children():
+            widget.destroy()
+        for row, result in enumerate(results):
+            patient = f" - {result['patient']}" if result["patient"] else ""
+            snippet = " ".join(result["snippet"].split())
+            label = customtkinter.CTkLabel(self.results_frame, text=f"{result['created_at']}{patient}\n{snippet}",
+                                           anchor="w", justify="left", wraplength=540)
+            label.grid(row=row, column=0, padx=5, pady=3, sticky="ew")
+            button = customtkinter.CTkButton(self.results_frame, text="Open", width=70, height=24,
+                                             command=lambda result=result: self.on_select(result))
+            button.grid(row=row, column=1, padx=5, pady=3)
+        more = "+" if len(results) == ARCHIVE_SEARCH_LIMIT else ""
+        self.status_label.configure(text=f"{len(results)}{more} prescriptions ({elapsed_ms:.0f} ms)",
+                                    text_color=("gray10", "gray90"))
+
+
 class WhisperASRApp(customtkinter.CTk):
     def __init__(self):
         super().__init__()
@@ -123,6 +808,15 @@ class WhisperASRApp(customtkinter.CTk):
         self.title("Whisper ASR Transcription")
         self.geometry("1280x640")  # Increased width to accommodate side-by-side layout
         self.audio_recorder = AudioRecorder()
+
+        # Transcription, document and preview work runs on a shared worker pool;
+        # callbacks are marshalled back to the Tk thread with after()
+        self.jobs = JobScheduler(
+            workers=config["job_workers"],
+            dispatch=lambda func, *args: self.after(0, func, *args)
+        )
+        telemetry.add_collector(self._queue_metrics)
+        psutil.cpu_percent(interval=None)  # The first call only starts the measurement for adaptive mode
         
         # Configure grid layout
         self.grid_columnconfigure(1, weight=1)
@@ -148,13 +842,21 @@ class WhisperASRApp(customtkinter.CTk):
         )
         self.logo_label.grid(row=0, column=0, padx=15, pady=(20, 10))
 
+        # Model readiness indicator
+        self.model_status_label = customtkinter.CTkLabel(
+            self.sidebar_frame,
+            text="Model: loading...",
+            text_color="orange"
+        )
+        self.model_status_label.grid(row=8, column=0, padx=15, pady=(0, 10))
+
         # Microphone selection dropdown
         self.mic_label = customtkinter.CTkLabel(self.sidebar_frame, text="Select Microphone:")
         self.mic_label.grid(row=1, column=0, padx=15, pady=(10, 5))
 
-        # Get available microphones
-        self.microphones = self.audio_recorder.list_microphones()
-        mic_names = [device['name'] for device in self.microphones]
+        # Filled in by the device monitor once the first scan is done
+        self.microphones = []
+        self.selected_mic_id = config["microphone"]
 
         # Create a frame to hold the dropdown to prevent resizing
         self.mic_dropdown_frame = customtkinter.CTkFrame(self.sidebar_frame, fg_color="transparent")
@@ -162,11 +864,19 @@ class WhisperASRApp(customtkinter.CTk):
 
         self.mic_dropdown = customtkinter.CTkOptionMenu(
             self.mic_dropdown_frame,
-            values=mic_names,
+            values=["Searching microphones..."],
             width=220,  # Fixed width
-            command=self.select_microphone
+            command=self.select_microphone,
+            state="disabled"
         )
         self.mic_dropdown.pack(fill="x")
+        self.device_monitor = DeviceMonitor(
+            on_change=lambda devices: self.after(0, self._update_microphones, devices),
+            lock=self.audio_recorder.stream_lock,
+            busy=lambda: self.audio_recorder.stream is not None,
+            poll_seconds=config["device_poll_seconds"]
+        )
+        self.device_monitor.start()
 
         # Recording controls frame
         self.recording_frame = customtkinter.CTkFrame(self.sidebar_frame, fg_color="transparent")
@@ -192,6 +902,11 @@ class WhisperASRApp(customtkinter.CTk):
         )
         self.record_time_label.grid(row=0, column=1, sticky="ew")
 
+        # Live transcription while recording
+        self.streaming_switch = customtkinter.CTkSwitch(self.sidebar_frame, text="Live Transcription")
+        self.streaming_switch.grid(row=7, column=0, padx=15, pady=10, sticky="w")
+        self.streaming_switch.select()
+
         # Embed Transcription Button
         self.embed_button = customtkinter.CTkButton(
             self.sidebar_frame,
@@ -219,6 +934,16 @@ class WhisperASRApp(customtkinter.CTk):
         )
         self.save_button.grid(row=6, column=0, padx=15, pady=10)
 
+        # Search earlier prescriptions
+        self.archive_button = customtkinter.CTkButton(
+            self.sidebar_frame,
+            text="Search Archive",
+            command=self.open_archive_search,
+            width=BUTTON_WIDTH
+        )
+        self.archive_button.grid(row=9, column=0, padx=15, pady=10)
+        self.archive_window = None
+
         # Create a frame to hold scaling and appearance options
         self.settings_frame = customtkinter.CTkFrame(self.sidebar_frame)
         self.settings_frame.grid(row=11, column=0, padx=15, pady=10, sticky="ew")
@@ -244,7 +969,38 @@ class WhisperASRApp(customtkinter.CTk):
             width=BUTTON_WIDTH,
             command=self.change_scaling_event
         )
-        self.scaling_optionemenu.grid(row=3, column=0, padx=0, pady=(0, 0))
+        self.scaling_optionemenu.grid(row=3, column=0, padx=0, pady=(0, 10))
+
+        # Model size and language, saved to quickdoc_config.json
+        self.model_label = customtkinter.CTkLabel(self.settings_frame, text="Model:", anchor="w")
+        self.model_label.grid(row=4, column=0, padx=0, pady=(0, 0))
+        self.model_optionmenu = customtkinter.CTkOptionMenu(
+            self.settings_frame,
+            values=MODEL_SIZES,
+            width=BUTTON_WIDTH,
+            command=self.change_model_event
+        )
+        self.model_optionmenu.set(config["model"])
+        self.model_optionmenu.grid(row=5, column=0, padx=0, pady=(0, 10))
+
+        self.language_label = customtkinter.CTkLabel(self.settings_frame, text="Language:", anchor="w")
+        self.language_label.grid(row=6, column=0, padx=0, pady=(0, 0))
+        self.language_optionmenu = customtkinter.CTkOptionMenu(
+            self.settings_frame,
+            values=LANGUAGES,
+            width=BUTTON_WIDTH,
+            command=self.change_language_event
+        )
+        self.language_optionmenu.set(config["language"] or "auto")
+        self.language_optionmenu.grid(row=7, column=0, padx=0, pady=(0, 10))
+
+        # Adaptive: tiny for short notes, larger for long dictations, smaller when jobs queue up
+        self.adaptive_switch = customtkinter.CTkSwitch(
+            self.settings_frame, text="Adaptive Model", command=self.change_model_mode_event
+        )
+        if config["model_mode"] == "adaptive":
+            self.adaptive_switch.select()
+        self.adaptive_switch.grid(row=8, column=0, padx=0, pady=(0, 0), sticky="w")
 
         # Main area for transcription and document
         self.main_frame = customtkinter.CTkFrame(self)
@@ -266,6 +1022,14 @@ class WhisperASRApp(customtkinter.CTk):
         self.transcription_textbox.grid(row=1, column=0, padx=10, pady=(0, 10), sticky="nsew")
         self.transcription_textbox.insert("0.0", "Transcription will appear here...")
 
+        # Fills the {{patient}} placeholder of the template
+        self.patient_entry = customtkinter.CTkEntry(self.transcription_frame, placeholder_text="Patient name")
+        self.patient_entry.grid(row=2, column=0, padx=10, pady=(0, 10), sticky="ew")
+
+        # Non-modal list of running and finished jobs
+        self.job_list = JobListFrame(self.transcription_frame, self.jobs, on_open=self._show_transcription)
+        self.job_list.grid(row=3, column=0, padx=10, pady=(0, 10), sticky="ew")
+
         # Create a frame for document template
         self.doc_frame = customtkinter.CTkFrame(self.main_frame)
         self.doc_frame.grid(row=0, column=1, padx=10, pady=10, sticky="nsew")
@@ -292,6 +1056,15 @@ class WhisperASRApp(customtkinter.CTk):
         self.image_label = customtkinter.CTkLabel(self.doc_frame, image=self.doc_image, text="")
         self.image_label.grid(row=1, column=0, padx=10, pady=(0,10), sticky="w")
 
+        # Live preview, rendered in memory as the transcription changes
+        self.preview_renderer = PreviewRenderer()
+        self.preview_lock = threading.Lock()
+        self.preview_shown_version = 0  # Renderer version in doc_image; set on the UI thread
+        self.preview_after_id = None
+        self.preview_job = None
+        self.transcription_textbox.bind("<KeyRelease>", self.schedule_preview)
+        self.patient_entry.bind("<KeyRelease>", self.schedule_preview)
+
         # Document textbox
         # self.doc_textbox = customtkinter.CTkTextbox(self.doc_frame, width=500, height=300)
         # self.doc_textbox.grid(row=2, column=0, padx=10, pady=(0, 10), sticky="nsew")
@@ -305,9 +1078,31 @@ class WhisperASRApp(customtkinter.CTk):
 
         # Recording state variables
         self.is_recording = False
-        self.selected_mic_index = 0
+        self.pending_start = None  # after() id while start_recording waits for the stream lock
         self.recording_start_time = None
-        self.audio_data = []
+        self.streaming_transcriber = None
+        self.recording_details = {}  # Audio hash, model, ... of the transcription shown, for the archive
+        self.last_doc_path = None
+        self.output_worker = create_output_worker(config["document_output"], config["printer"])
+
+        self.after(200, self.update_model_status)
+        self.after(1000, self.recover_recordings)
+
+    def update_model_status(self):
+        if not model_ready.is_set():
+            self.after(200, self.update_model_status)
+            return
+        if model is None:
+            self.model_status_label.configure(text="Model: failed to load", text_color="red")
+        elif not model_warm.is_set():
+            # Usable already; a dictation now just waits for the warm-up to finish
+            self.model_status_label.configure(text=f"Model: {config['model']} warming up...", text_color="orange")
+            self.after(200, self.update_model_status)
+            return
+        else:
+            self.model_status_label.configure(text=f"Model: {config['model']} ({config['backend']}) ready", text_color="green")
+        if startup_profiler:
+            startup_profiler.report()
 
     def show_loading(self, message="Loading..."):
         if self.loading_window is not None:  # If there's already a loading window, close it before opening a new one
@@ -330,26 +1125,83 @@ class WhisperASRApp(customtkinter.CTk):
             self.loading_window.destroy()
             self.loading_window = None
 
-    def select_microphone(self, selected_mic):
-        try:
-            self.selected_mic_index = [device['name'] for device in self.microphones].index(selected_mic)
-        except ValueError:
+    def _update_microphones(self, devices):
+        """Show the devices of a new scan, keeping the selected one if it is still there."""
+        self.microphones = devices
+        if not devices:
+            self.mic_dropdown.configure(values=["No microphone found"], state="disabled")
+            self.mic_dropdown.set("No microphone found")
+            return
+        self.mic_dropdown.configure(values=[device.label for device in devices], state="normal")
+        if self.selected_mic_id is not None and self._selected_microphone(devices) is None:
+            print(f"Microphone '{self.selected_mic_id}' is not connected, using the default input")
+        self.mic_dropdown.set(self._microphone_to_use(devices).label)
+
+    def _selected_microphone(self, devices):
+        """The chosen device if it is connected, else None (the default is used)."""
+        if self.selected_mic_id is None:
+            return None
+        return next((device for device in devices if device.id == self.selected_mic_id), None)
+
+    def _microphone_to_use(self, devices):
+        return self._selected_microphone(devices) or next(
+            (device for device in devices if device.is_default), devices[0])
+
+    def select_microphone(self, selected_label):
+        device = next((device for device in self.microphones if device.label == selected_label), None)
+        if device is None:
             messagebox.showerror("Microphone Error", "Selected microphone is no longer available. Please select a different one.")
             return
+        # Saved by name, so the choice survives other devices being plugged in and a restart
+        self.selected_mic_id = device.id
+        config["microphone"] = device.id
+        update_config_file({"microphone": device.id})
 
     def toggle_recording(self):
+        if self.pending_start is not None:
+            return  # Already starting, waiting for a device scan to finish
         if not self.is_recording:
             self.start_recording()
         else:
             self.stop_recording()
 
     def start_recording(self):
-        self.is_recording = True
-        self.record_button.configure(text="Stop Recording")
-        self.audio_data = []
-        self.recording_start_time = time.time()
-
-        self.audio_recorder.start_recording(self.selected_mic_index)
+        self.pending_start = None
+        if not self.microphones:
+            message = "Still searching for microphones." if self.device_monitor.devices is None else "No microphone found."
+            messagebox.showerror("Microphone Error", message)
+            return
+        # A device scan holds the lock while PortAudio is re-initialized; retry instead of freezing the window
+        if not self.audio_recorder.stream_lock.acquire(blocking=False):
+            self.pending_start = self.after(DEVICE_LOCK_RETRY_MS, self.start_recording)
+            return
+        try:
+            # The scan replaces the list under this lock, so its indexes are the current ones
+            devices = self.device_monitor.devices or self.microphones
+            if not devices:
+                messagebox.showerror("Microphone Error", "No microphone found.")
+                return
+            self.is_recording = True
+            self.record_button.configure(text="Stop Recording")
+            self.recording_start_time = time.time()
+
+            live = bool(self.streaming_switch.get())
+            self.audio_recorder.start_recording(self._microphone_to_use(devices), live=live)
+        finally:
+            self.audio_recorder.stream_lock.release()
+        if live and self.audio_recorder.recording:
+            self.transcription_textbox.delete("0.0", "end")
+            # The length is not known yet; adaptive mode still steps down while transcriptions wait
+            model_name, reason = choose_model(config, None, self.jobs.pending(PRIORITY_TRANSCRIPTION),
+                                              psutil.cpu_percent(interval=None))
+            streaming_transcriber = StreamingTranscriber(
+                self.audio_recorder,
+                on_partial=lambda text: self.after(0, self._append_partial_transcription, text, streaming_transcriber),
+                model_name=model_name,
+                reason=reason
+            )
+            self.streaming_transcriber = streaming_transcriber
+            streaming_transcriber.start()
         self.update_record_time()
 
     def update_record_time(self):
@@ -363,20 +1215,125 @@ class WhisperASRApp(customtkinter.CTk):
       self.is_recording = False
       self.record_button.configure(text="Start Recording")
       self.record_time_label.configure(text="00:00")  # Reset time display
+      if self.streaming_transcriber is not None:
+        # Only the last window is left to decode
+        streaming_transcriber, self.streaming_transcriber = self.streaming_transcriber, None
+        self.audio_recorder.stop_stream()
+        streaming_transcriber.finish()
+        spool = self.audio_recorder.spool
+        self.jobs.submit(
+            f"Live transcription {datetime.now().strftime('%H:%M:%S')}",
+            lambda job: self._live_transcription_job(job, streaming_transcriber, spool),
+            priority=PRIORITY_TRANSCRIPTION,
+            on_done=self._transcription_done,
+            kind="transcription"
+        )
+        return
       audio_data = self.audio_recorder.stop_recording()
       if audio_data is not None:
-        self.transcribe_audio(audio_data)
-
-    def transcribe_audio(self, audio_data):
-       self.show_loading(message="Transcribing...")
-       threading.Thread(target=self._transcribe_audio_thread, args=(audio_data,), daemon=True).start()
-    def _transcribe_audio_thread(self, audio_data):
-       transcription = self.audio_recorder.transcribe_audio(audio_data)
-       self.after(0, self._update_transcription_ui, transcription)  # Use after to update the UI
+        spool = self.audio_recorder.spool
+        self.transcribe_audio(audio_data, spool.path if spool else None,
+                              datetime.fromtimestamp(spool.started_at) if spool else None)
+
+    def _queue_metrics(self):
+       # Read when metrics are exported, from the exporter's thread
+       recorder = self.audio_recorder
+       return {
+          "jobs.pending": self.jobs.pending(),
+          "output.pending": self.output_worker.requests.qsize(),
+          "capture.buffered_seconds": round(recorder.ring_buffer.available() / recorder.sample_rate, 3)
+       }
+    def transcribe_audio(self, audio_data, spool_path=None, recorded_at=None, name="Transcription"):
+       # Non-modal: the next dictation can start while this one is transcribing
+       recorded_at = recorded_at or datetime.now()
+       self.jobs.submit(
+          f"{name} {recorded_at.strftime('%H:%M:%S')}",
+          lambda job: self._transcribe_audio_job(job, audio_data, spool_path, recorded_at),
+          priority=PRIORITY_TRANSCRIPTION,
+          on_done=self._transcription_done,
+          kind="transcription"
+       )
+    def _transcribe_audio_job(self, job, audio_data, spool_path, recorded_at):
+       if audio_data is None:
+          # A recovered recording, read from its spool file here rather than on the UI thread
+          audio_data = self.audio_recorder.prepare(read_spool(spool_path)[0], in_place=True)
+       seconds = len(audio_data) / self.audio_recorder.sample_rate
+       model_name, reason = choose_model(config, seconds, self.jobs.pending(PRIORITY_TRANSCRIPTION),
+                                         psutil.cpu_percent(interval=None))
+       job.report(message=f"{seconds:.0f} s of audio, {model_name} ({reason})")
+       job.details = {"audio_sha256": audio_fingerprint(audio_data), "model": model_name,
+                      "language": transcription_language(), "recorded_at": recorded_at}
+       text = self.audio_recorder.transcribe_audio(audio_data, model_name=model_name, raise_errors=True)
+       job.details["suggestions"] = vocabulary_suggestions(text)
+       # A failed or cancelled transcription (whose text the scheduler discards) keeps it for recovery
+       if spool_path and not job.cancelled:
+          remove_spool(spool_path)
+       return text
+    def _live_transcription_job(self, job, streaming_transcriber, spool):
+       job.report(message=f"live, {streaming_transcriber.model_name} ({streaming_transcriber.reason})")
+       text = streaming_transcriber.wait()
+       if streaming_transcriber.errors:
+          # The spool file is kept, so the recording is offered for recovery at the next launch
+          errors = streaming_transcriber.errors
+          raise RuntimeError(f"{len(errors)} live window(s) could not be transcribed: {errors[0]}") from errors[0]
+       job.details = {"model": streaming_transcriber.model_name, "language": transcription_language(),
+                      "recorded_at": datetime.fromtimestamp(spool.started_at if spool else job.submitted_at),
+                      "suggestions": vocabulary_suggestions(text)}
+       if spool is not None:
+          job.details["audio_sha256"] = audio_fingerprint(spool.read())
+          if not job.cancelled:  # The text of a cancelled job is discarded; the recording stays recoverable
+             remove_spool(spool.path)
+       return text
+    def recover_recordings(self):
+       """Offer to transcribe recordings that a crash left in the spool folder."""
+       paths = find_unfinished(config["spool_dir"])
+       if not paths:
+          return
+       minutes = sum(spool_info(path)[0] for path in paths) / 60
+       answer = messagebox.askyesnocancel(
+          "Unfinished Recordings",
+          f"{len(paths)} recording(s) ({minutes:.1f} min) from an earlier session were not transcribed.\n\n"
+          "Yes: transcribe them now\nNo: delete them\nCancel: ask again next time"
+       )
+       if answer is None:
+          return
+       for path in paths:
+          if answer:
+             self.transcribe_audio(None, path, datetime.fromtimestamp(spool_info(path)[1]), name="Recovered")
+          else:
+             remove_spool(path)
+    def _transcription_done(self, job):
+       # While the next dictation is recording, the result waits in the job list
+       if job.status == "done" and not self.is_recording:
+          self._show_transcription(job)
+    def _show_transcription(self, job):
+       self.recording_details = job.details
+       self._update_transcription_ui(job.result)
+       if job.details and job.details.get("suggestions"):
+          self._confirm_suggestions(job.details["suggestions"])
+    def _confirm_suggestions(self, suggestions):
+       # Two edits from a drug name may be another drug, so these are never replaced unasked
+       text = self.transcription_textbox.get("0.0", "end-1c")
+       changed = False
+       for heard, suggestion in suggestions:
+          if messagebox.askyesno("Check Drug Name", f'"{heard}" is not in the vocabulary. Did you mean "{suggestion}"?'):
+             text = re.sub(rf"\b{re.escape(heard)}\b", suggestion, text)
+             changed = True
+       if changed:
+          self._update_transcription_ui(text)
     def _update_transcription_ui(self, transcription):
        self.transcription_textbox.delete("0.0", "end")
        self.transcription_textbox.insert("0.0", transcription)
        self.hide_loading()
+       self.schedule_preview()
+    def _append_partial_transcription(self, text, streaming_transcriber=None):
+       if streaming_transcriber is not self.streaming_transcriber:
+          return  # A late window of a recording that already stopped
+       if self.transcription_textbox.get("0.0", "end").strip():
+          text = " " + text
+       self.transcription_textbox.insert("end", text)
+       self.transcription_textbox.see("end")
+       self.schedule_preview()
     def is_file_locked(self, file_path):
         """Check if the file is locked by another process."""
         for proc in psutil.process_iter(attrs=['pid', 'name', 'open_files']):
@@ -385,122 +1342,85 @@ class WhisperASRApp(customtkinter.CTk):
                     return True
         return False
     
-    def create_image(self, doc_path, image_filename):
-        """Convert a DOCX file to an image without locking issues."""
-        try:
-            # Step 1: Generate a temporary PDF file
-            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_pdf:
-                temp_pdf_path = temp_pdf.name
-
-            try:
-                doc = Document(doc_path)
-                c = canvas.Canvas(temp_pdf_path, pagesize=letter)
-                width, height = letter
-
-                y_position = height - 50
-                for paragraph in doc.paragraphs:
-                    text = paragraph.text
-                    if y_position < 50:  # Create a new page if reaching bottom
-                        c.showPage()
-                        y_position = height - 50
-                    c.drawString(50, y_position, text)
-                    y_position -= 15
-
-                c.save()  # Save the PDF
-                print(f"PDF saved to: {temp_pdf_path}")
-
-            except Exception as e:
-                messagebox.showerror("Error", f"Error creating PDF: {e}")
-                return
+    def schedule_preview(self, event=None):
+        """Debounce preview updates while the transcription is being edited."""
+        if self.preview_after_id is not None:
+            self.after_cancel(self.preview_after_id)
+        self.preview_after_id = self.after(PREVIEW_DEBOUNCE_MS, self.update_preview)
+
+    def update_preview(self):
+        """Render the prescription preview in memory straight into the image label."""
+        self.preview_after_id = None
+        if self.preview_job is not None:
+            self.preview_job.cancel()  # Superseded by this one
 
-            # Step 2: Convert PDF to Image using PyMuPDF (fitz)
-            try:
-                pdf_document = fitz.open(temp_pdf_path)  # Open the temporary PDF
-                first_page = pdf_document.load_page(0)   # Load the first page
-                pix = first_page.get_pixmap()
-                pix.save(image_filename)  # Save the image
-                print(f"Image saved successfully at: {image_filename}")
-                pdf_document.close()
-
-            except Exception as e:
-                messagebox.showerror("Error", f"Error converting PDF to image: {e}")
-                return
+        transcription = self.transcription_textbox.get("0.0", "end").strip()
+        patient = self.patient_entry.get().strip()
+        self.preview_job = self.jobs.submit(
+            "Preview",
+            lambda job: self._render_preview(job, transcription, patient),
+            priority=PRIORITY_PREVIEW,
+            on_done=self._preview_done,
+            listed=False
+        )
 
-            # Step 3: Clean up temporary PDF file
-            if os.path.exists(temp_pdf_path):
-                os.remove(temp_pdf_path)
-                print("Temporary PDF file deleted.")
+    def _render_preview(self, job, transcription, patient):
+        from templates import get_template
+
+        with telemetry.span("preview.render"):
+            paragraphs = get_template(TEMPLATE_PATH).paragraphs(transcription, patient=patient)
+            with self.preview_lock:
+                if job.cancelled:
+                    return None
+                # Only the lines from the first change downwards are redrawn
+                renderer = self.preview_renderer
+                if renderer.render(paragraphs) is None and renderer.version == self.preview_shown_version:
+                    return None  # Unchanged, and a cancelled job did not leave the shown image behind
+                return renderer.version, renderer.image.copy()
+
+    def _preview_done(self, job):
+        if job.status == "failed":
+            print(f"Preview unavailable: {job.error}")
+        elif job.status == "done" and job.result is not None:
+            version, image = job.result
+            self.doc_image.configure(light_image=image, dark_image=image, size=PREVIEW_SIZE)
+            self.preview_shown_version = version
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Error during conversion: {e}")
-        # """Helper method to convert the new document to an image."""
-        
-        # try:
-        #     #first convert to pdf
-        #     print(doc_path)
-        #     pdf_path = os.path.splitext(doc_path)[0] + ".pdf"
-        #     print(pdf_path)
-            
-        #     # Create a temporary PDF from the docx to convert into images
-        #     import subprocess
-        #     try:
-        #       subprocess.run(["soffice", "--headless", "--convert-to", "pdf", doc_path, "--outdir", os.path.dirname(pdf_path)], check=True)
-        #     except Exception as e:
-        #        messagebox.showerror("Error", f"Error converting to PDF: {e}")
-        #        return
-            
-            
-        #     images = convert_from_path(pdf_path)  # returns a list of PIL Image objects
-            
-        #     # For a simple case we will just take the first page
-        #     if images:
-        #         first_page_image = images[0]
-        #         first_page_image_path = image_filename
-        #         first_page_image.save(first_page_image_path)
-        #         print(f"Image saved: {first_page_image_path}")
-            
-            
-        #     #cleanup temp pdf
-        #     os.remove(pdf_path)
-            
-        # except Exception as e:
-        #     messagebox.showerror("Error", f"Error converting to Image: {e}")
-
-    
     def embed_transcription(self):
         transcription = self.transcription_textbox.get("0.0", "end").strip()
         if not transcription:
             messagebox.showwarning("Warning", "Please enter transcription text.")
             return
 
-        try:
-            # 1. Open Template
-            template_path = "template.docx"  # Replace with actual path if needed
-            doc = docx.Document(template_path)
-
-            # 2. Add Text to Body (at the end)
-            doc.add_paragraph(transcription) # Add a paragraph with the transcription
-            
-            # 3. Save New Doc
-            prescriptions_folder = "prescriptions"
-            if not os.path.exists(prescriptions_folder):
-                os.makedirs(prescriptions_folder)
-
-            new_filename = "updated_prescription.docx" #You might want a more unique name
-            new_doc_path = os.path.join(prescriptions_folder, new_filename)
-
-            doc.save(new_doc_path)
-            
-            # 4. Create Image (will save in root folder with a similar name)
-            self.create_image(new_doc_path, os.path.splitext(new_filename)[0] + ".png")
-
-            messagebox.showinfo("Success", "Document updated and saved.")
+        # 1.-3. Fill the template and save it under a new unique name, off the UI thread
+        patient = self.patient_entry.get().strip()
+        recording = self.recording_details
+        self.jobs.submit(
+            "Prescription" + (f" {patient}" if patient else ""),
+            lambda job: self._embed_job(transcription, patient, recording),
+            priority=PRIORITY_DOCUMENT,
+            on_done=self._embed_done
+        )
 
+    def _embed_job(self, transcription, patient, recording):
+        doc_path = write_prescription(transcription, template_path=TEMPLATE_PATH, patient=patient)
+        archive.add(transcription, docx_path=doc_path, patient=patient, **recording)
+        return doc_path
+
+    def _embed_done(self, job):
+        if job.status == "failed":
+            if isinstance(job.error, FileNotFoundError):
+                messagebox.showerror("Error", f"Template file not found: {TEMPLATE_PATH}")
+            else:
+                messagebox.showerror("Error", f"An error occurred: {job.error}")
+            return
+        if job.status != "done":
+            return
 
-        except FileNotFoundError:
-            messagebox.showerror("Error", f"Template file not found: {template_path}")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {e}")
+        self.last_doc_path = job.result
+        # 4. Update the preview
+        self.update_preview()
+        messagebox.showinfo("Success", f"Document saved as {job.result}")
 
     # def embed_transcription(self):
     #     transcription = self.transcription_textbox.get("0.0", "end")
@@ -508,7 +1428,22 @@ class WhisperASRApp(customtkinter.CTk):
     #     self.doc_textbox.delete("0.0", "end")
     #     self.doc_textbox.insert("0.0", updated_doc)
 
+    def open_archive_search(self):
+        if self.archive_window is not None and self.archive_window.winfo_exists():
+            self.archive_window.focus()
+            return
+        self.archive_window = ArchiveSearchWindow(self, on_select=self._open_archived)
+
+    def _open_archived(self, result):
+        # Embedding it again archives a new prescription that refers to the same recording
+        self.recording_details = {key: result[key] for key in ("audio_sha256", "model", "language", "recorded_at")}
+        self.patient_entry.delete(0, "end")
+        self.patient_entry.insert(0, result["patient"])
+        self._update_transcription_ui(result["text"])
+
     def load_document_template(self, doc_path):
+        from docx import Document
+
         try:
             doc = Document(doc_path)
             text = ""
@@ -521,43 +1456,43 @@ class WhisperASRApp(customtkinter.CTk):
              self.doc_textbox.delete("0.0", "end")
              self.doc_textbox.insert("0.0", f"Error loading document: {e}")
 
+    def _document_request(self):
+        """Paragraphs of the current prescription and a function that writes it as .docx."""
+        from templates import get_template
+
+        transcription = self.transcription_textbox.get("0.0", "end").strip()
+        patient = self.patient_entry.get().strip()
+        paragraphs = get_template(TEMPLATE_PATH).paragraphs(transcription, patient=patient)
+        return paragraphs, lambda path: write_prescription(transcription, path, patient=patient)
+
+    def _report_output(self, title, success_message=None):
+        """Callback for the output worker; shows the outcome on the UI thread."""
+        def on_done(result, error):
+            if error is not None:
+                self.after(0, lambda: tkinter.messagebox.showerror(f"{title} Error", str(error)))
+            elif success_message:
+                self.after(0, lambda: tkinter.messagebox.showinfo(f"{title} Successful", success_message.format(result)))
+        return on_done
+
     def print_document(self):
           try:
-             # Open MS Word
-             word = win32com.client.Dispatch("Word.Application")
-             word.Visible = False
-             doc = word.Documents.Add()
-
-             # Get document content
-             content = self.doc_textbox.get("0.0", "end")
-             doc.Content.Text = content
-             doc.PrintOut()
-             # Close document and word application
-             doc.Close(False)
-             word.Quit()
-
+             paragraphs, render_docx = self._document_request()
+             # Runs on the long-lived output worker, the UI stays responsive
+             self.output_worker.print(paragraphs, render_docx, on_done=self._report_output("Printing"))
           except Exception as e:
             tkinter.messagebox.showerror("Printing Error", str(e))
     def save_document(self):
         try:
-            # Open MS Word
-            word = win32com.client.Dispatch("Word.Application")
-            word.Visible = False
-            doc = word.Documents.Add()
-
-            # Get document content
-            content = self.doc_textbox.get("0.0", "end")
-            doc.Content.Text = content
-
-            # Save document
-            filename = f"transcription_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
-            doc.SaveAs(filename)
-
-            # Close document and word application
-            doc.Close()
-            word.Quit()
-
-            tkinter.messagebox.showinfo("Save Successful", f"Document saved as {filename}")
+            filename = filedialog.asksaveasfilename(
+                initialfile=f"transcription_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx",
+                defaultextension=".docx",
+                filetypes=[("Word document", "*.docx"), ("PDF", "*.pdf")]
+            )
+            if not filename:
+                return
+            paragraphs, render_docx = self._document_request()
+            self.output_worker.save(filename, paragraphs, render_docx,
+                                    on_done=self._report_output("Save", "Document saved as {}"))
         except Exception as e:
             tkinter.messagebox.showerror("Save Error", str(e))
 
@@ -568,9 +1503,105 @@ class WhisperASRApp(customtkinter.CTk):
         new_scaling_float = int(new_scaling.replace("%", "")) / 100
         customtkinter.set_widget_scaling(new_scaling_float)
 
+    def change_model_event(self, model_name: str):
+        if model_name == config["model"]:
+            return
+        config["model"] = model_name
+        update_config_file({"model": model_name})
+        self.model_status_label.configure(text=f"Model: loading {model_name}...", text_color="orange")
+        load_model_async()
+        self.update_model_status()
+
+    def change_language_event(self, language: str):
+        config["language"] = language
+        update_config_file({"language": language})
+
+    def change_model_mode_event(self):
+        config["model_mode"] = "adaptive" if self.adaptive_switch.get() else "fixed"
+        update_config_file({"model_mode": config["model_mode"]})
+
 def main():
+    parser = argparse.ArgumentParser(description="QuickDoc - Whisper ASR prescriptions")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print a per-phase startup timing breakdown")
+    parser.add_argument("--backend", choices=sorted(BACKENDS),
+                        help="inference engine, overrides the config file")
+    parser.add_argument("--metrics", choices=["prometheus", "jsonl"],
+                        help="export spans and counters, overrides the config file")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="run under cProfile and write the stats to PATH on exit")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch_parser = subparsers.add_parser("batch", help="transcribe a folder of dictations without the GUI")
+    batch_parser.add_argument("directory", help="folder with WAV/FLAC dictations (searched recursively)")
+    batch_parser.add_argument("-o", "--output", default=PRESCRIPTIONS_FOLDER,
+                              help="folder for the generated prescriptions (default: %(default)s)")
+    batch_parser.add_argument("-w", "--workers", type=int, default=None,
+                              help="number of worker processes (default: half the CPU cores)")
+
+    search_parser = subparsers.add_parser("search", help="search the prescription archive")
+    search_parser.add_argument("query", nargs="*", help="words to look for; the last one may be incomplete")
+    search_parser.add_argument("--patient", help="only prescriptions for this patient")
+    search_parser.add_argument("--since", help="archived on or after this date (YYYY-MM-DD)")
+    search_parser.add_argument("--until", help="archived on or before this date (YYYY-MM-DD)")
+    search_parser.add_argument("-n", "--limit", type=int, default=20)
+    search_parser.add_argument("--rank", action="store_true", help="best match first instead of newest first")
+
+    serve_parser = subparsers.add_parser("serve", help="run a local transcription server with one shared model")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--unix", metavar="PATH", help="listen on a Unix domain socket instead of TCP")
+    serve_parser.add_argument("--max-batch", type=int, default=8, help="most requests decoded in one pass")
+    serve_parser.add_argument("--max-wait-ms", type=float, default=50,
+                              help="how long to wait for more requests to fill a batch")
+    args = parser.parse_args()
+
+    if args.backend:
+        config["backend"] = args.backend
+    if args.metrics:
+        config["metrics"] = args.metrics
+    if config["metrics"] or args.profile:
+        telemetry.configure(config["metrics"], port=config["metrics_port"], path=config["metrics_path"])
+    if args.profile:
+        telemetry.start_profiling(args.profile)
+    try:
+        run(args, parser)
+    finally:
+        telemetry.shutdown()
+
+
+def run(args, parser):
+    """Run the GUI or the subcommand selected on the command line."""
+    global startup_profiler
+    if args.command == "batch":
+        from batch import run_batch
+        run_batch(args.directory, args.output, args.workers, config)
+        return
+    if args.command == "search":
+        print_results(archive.search(" ".join(args.query), patient=args.patient, since=args.since,
+                                     until=args.until, limit=args.limit, order="rank" if args.rank else "newest"))
+        return
+    if args.command == "serve":
+        from server import serve
+        if config["backend"] == "remote":
+            parser.error("the server needs a local backend, not 'remote'")
+        load_model()
+        serve(get_model(), args.host, args.port, args.unix, args.max_batch, args.max_wait_ms)
+        return
+
+    if args.profile_startup:
+        startup_profiler = StartupProfiler(STARTUP_START)
+        startup_profiler.mark("imports")
+
+    load_model_async()
+    load_template_async()
+
     app = WhisperASRApp()
-    app.mainloop()
+    if startup_profiler:
+        startup_profiler.mark("build window")
+        app.after(0, startup_profiler.mark, "first frame")
+    with telemetry.profiled():
+        app.mainloop()
 
 
 if __name__ == "__main__":
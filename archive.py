@@ -0,0 +1,181 @@
+"""Append-only archive of prescriptions with a full-text search index.
+
+Every embedded prescription becomes one row in an SQLite database: the
+transcription, the patient, when it was recorded and archived, the hash of
+the audio and the path of the .docx. An FTS5 index over the text and the
+patient name is kept up to date by a trigger, so searches stay in the
+millisecond range with hundreds of thousands of prescriptions. Rows can
+neither be changed nor deleted; triggers reject it.
+
+    archive = PrescriptionArchive("prescriptions/archive.db")
+    archive.add("Ibuprofen 400 mg ...", docx_path=path, patient="Max Mustermann")
+    archive.search("ibupro", patient="muster")
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prescriptions (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    recorded_at TEXT,
+    patient TEXT NOT NULL DEFAULT '',
+    text TEXT NOT NULL,
+    audio_sha256 TEXT,
+    docx_path TEXT,
+    model TEXT,
+    language TEXT
+);
+CREATE INDEX IF NOT EXISTS prescriptions_created_at ON prescriptions (created_at);
+CREATE INDEX IF NOT EXISTS prescriptions_audio ON prescriptions (audio_sha256);
+
+-- External content: the index stores no second copy of the text
+CREATE VIRTUAL TABLE IF NOT EXISTS prescriptions_fts USING fts5 (
+    text, patient,
+    content='prescriptions', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS prescriptions_index AFTER INSERT ON prescriptions BEGIN
+    INSERT INTO prescriptions_fts (rowid, text, patient) VALUES (new.id, new.text, new.patient);
+END;
+CREATE TRIGGER IF NOT EXISTS prescriptions_no_update BEFORE UPDATE ON prescriptions BEGIN
+    SELECT RAISE(ABORT, 'the prescription archive is append-only');
+END;
+CREATE TRIGGER IF NOT EXISTS prescriptions_no_delete BEFORE DELETE ON prescriptions BEGIN
+    SELECT RAISE(ABORT, 'the prescription archive is append-only');
+END;
+"""
+
+COLUMNS = ("id", "created_at", "recorded_at", "patient", "text", "audio_sha256", "docx_path", "model", "language")
+SNIPPET_TOKENS = 16
+BUSY_TIMEOUT_MS = 10000  # Batch workers write from several processes
+
+
+def _timestamp(value=None):
+    value = value or datetime.now()
+    return value.strftime("%Y-%m-%d %H:%M:%S") if isinstance(value, datetime) else str(value)
+
+
+def match_expression(query):
+    """FTS5 query for free text: every word must occur, the last one may be incomplete.
+
+    Words are quoted, so punctuation in the input ("ASS-100", quotes) cannot
+    break the FTS syntax.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"  # Search as you type
+    return " ".join(terms)
+
+
+class PrescriptionArchive:
+    """SQLite/FTS5 archive; safe to use from several threads and processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()  # One connection per thread
+        self.schema_lock = threading.Lock()
+        self.schema_ready = False
+
+    def _connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000)
+            connection.row_factory = sqlite3.Row
+            # WAL lets searches run while a prescription is being written
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self.schema_lock:
+                if not self.schema_ready:
+                    connection.executescript(SCHEMA)
+                    self.schema_ready = True
+            self.local.connection = connection
+        return connection
+
+    def add(self, text, docx_path=None, patient="", audio_sha256=None, model=None, language=None,
+            recorded_at=None):
+        """Archive a prescription and return its id."""
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO prescriptions (created_at, recorded_at, patient, text, audio_sha256, docx_path,"
+                " model, language) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (_timestamp(), _timestamp(recorded_at) if recorded_at else None, patient or "", text,
+                 audio_sha256, docx_path and os.path.abspath(docx_path), model, language)
+            )
+        return cursor.lastrowid
+
+    def get(self, prescription_id):
+        row = self._connection().execute("SELECT * FROM prescriptions WHERE id = ?", (prescription_id,)).fetchone()
+        return dict(row) if row else None
+
+    def count(self):
+        return self._connection().execute("SELECT count(*) FROM prescriptions").fetchone()[0]
+
+    def search(self, query="", patient=None, since=None, until=None, limit=50, order="newest"):
+        """Matching prescriptions as dicts, with a highlighted `snippet`.
+
+        `query` and `patient` are free text (see `match_expression`);
+        `since`/`until` are dates or "YYYY-MM-DD[ HH:MM:SS]" strings. Results
+        are newest first, or best match first with order="rank" (slower when a
+        word occurs in most prescriptions). Without a query the newest
+        prescriptions are returned.
+        """
+        match = match_expression(query or "")
+        patient_match = match_expression(patient or "")
+        if patient_match:
+            patient_match = f"patient : ({patient_match})"
+            match = f"({match}) AND {patient_match}" if match else patient_match
+
+        conditions, parameters = [], []
+        if since:
+            conditions.append("p.created_at >= ?")
+            parameters.append(_timestamp(since))
+        if until:
+            until = _timestamp(until)
+            conditions.append("p.created_at <= ?")
+            parameters.append(until + " 23:59:59" if len(until) == 10 else until)  # A date includes the whole day
+
+        columns = ", ".join(f"p.{column}" for column in COLUMNS)
+        if match:
+            sql = (f"SELECT {columns}, snippet(prescriptions_fts, 0, '[', ']', ' ... ', {SNIPPET_TOKENS}) AS snippet"
+                   " FROM prescriptions_fts JOIN prescriptions p ON p.id = prescriptions_fts.rowid"
+                   " WHERE prescriptions_fts MATCH ?")
+            parameters.insert(0, match)
+            sql += "".join(f" AND {condition}" for condition in conditions)
+            # rowid order streams straight out of the index; rank has to score every match
+            sql += " ORDER BY rank" if order == "rank" else " ORDER BY prescriptions_fts.rowid DESC"
+        else:
+            sql = f"SELECT {columns}, substr(p.text, 1, 120) AS snippet FROM prescriptions p"
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += " ORDER BY p.id DESC"
+        sql += " LIMIT ?"
+        parameters.append(limit)
+        return [dict(row) for row in self._connection().execute(sql, parameters)]
+
+    def close(self):
+        """Close this thread's connection."""
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+def print_results(results):
+    """Print search results for the command line."""
+    for result in results:
+        patient = f"  {result['patient']}" if result["patient"] else ""
+        print(f"#{result['id']}  {result['created_at']}{patient}")
+        print(f"    {' '.join(result['snippet'].split())}")
+        if result["docx_path"]:
+            print(f"    {result['docx_path']}")
+    print(f"{len(results)} prescription(s)")
@@ -0,0 +1,139 @@
+"""Preallocated ring buffer between the PortAudio callback and its reader.
+
+The audio callback writes every block straight into a float32 array instead
+of copying it onto a queue, and readers get zero-copy views of what has been
+written. There is exactly one producer (the callback) and one consumer (the
+streaming worker, or stop_recording once the stream has stopped); each side
+only ever advances its own position, so no lock is needed.
+"""
+import numpy as np
+
+
+class AudioRingBuffer:
+    """Single-producer/single-consumer float32 ring buffer for mono audio.
+
+    When the consumer falls behind, the buffer grows (doubling, up to
+    `max_capacity` frames) instead of overwriting unread audio. Beyond that
+    new frames are dropped and counted in `dropped_frames`.
+    """
+
+    def __init__(self, capacity, max_capacity=None):
+        self.storage = np.zeros(capacity, dtype=np.float32)
+        self.max_capacity = max_capacity
+        # Absolute frame counts; the buffer index is position % capacity
+        self.write_pos = 0  # Only advanced by the producer
+        self.read_pos = 0   # Only advanced by the consumer
+        self.dropped_frames = 0
+        self.overruns = 0          # PortAudio input overflows
+        self.status_errors = 0     # Any other PortAudio status flag
+
+    @property
+    def capacity(self):
+        return len(self.storage)
+
+    # --- Producer side ---
+
+    def record_status(self, status):
+        """Count a PortAudio callback status instead of printing from the audio thread."""
+        if status.input_overflow:
+            self.overruns += 1
+        else:
+            self.status_errors += 1
+
+    def write(self, frames):
+        """Append frames; returns how many were stored."""
+        n = len(frames)
+        storage = self.storage
+        if n > len(storage) - (self.write_pos - self.read_pos):
+            storage = self._grow(self.write_pos - self.read_pos + n)
+            free = len(storage) - (self.write_pos - self.read_pos)
+            if n > free:
+                self.dropped_frames += n - free
+                frames = frames[:free]
+                n = free
+
+        capacity = len(storage)
+        start = self.write_pos % capacity
+        first = min(n, capacity - start)
+        storage[start:start + first] = frames[:first]
+        storage[:n - first] = frames[first:]
+        # Publishing the new position last makes the frames visible to the reader
+        self.write_pos += n
+        return n
+
+    def _grow(self, required):
+        old = self.storage
+        capacity = len(old)
+        new_capacity = capacity
+        while new_capacity < required:
+            new_capacity *= 2
+        if self.max_capacity:
+            new_capacity = min(new_capacity, max(self.max_capacity, capacity))
+        if new_capacity == capacity:
+            return old
+
+        # Unread frames keep their absolute positions in the larger buffer.
+        # Readers holding views of the old array are unaffected: it is never
+        # written again after the swap.
+        new = np.zeros(new_capacity, dtype=np.float32)
+        read_pos, write_pos = self.read_pos, self.write_pos
+        for view, position in self._segments(old, read_pos, write_pos):
+            start = position % new_capacity
+            first = min(len(view), new_capacity - start)
+            new[start:start + first] = view[:first]
+            new[:len(view) - first] = view[first:]
+        self.storage = new
+        return new
+
+    # --- Consumer side ---
+
+    @staticmethod
+    def _segments(storage, start, end):
+        """Zero-copy views covering absolute positions [start, end), with their positions."""
+        capacity = len(storage)
+        segments = []
+        while start < end:
+            index = start % capacity
+            length = min(end - start, capacity - index)
+            segments.append((storage[index:index + length], start))
+            start += length
+        return segments
+
+    def available(self):
+        """Number of frames written but not yet consumed."""
+        return self.write_pos - self.read_pos
+
+    def peek(self, max_frames=None):
+        """Zero-copy views (at most two) of the unread frames.
+
+        The views stay valid until the frames are consumed.
+        """
+        # Read the write position before the storage: a grow publishes the new
+        # array before any frame written into it becomes visible.
+        end = self.write_pos
+        storage = self.storage
+        if max_frames is not None:
+            end = min(end, self.read_pos + max_frames)
+        return [view for view, _ in self._segments(storage, self.read_pos, end)]
+
+    def consume(self, n):
+        """Release `n` frames back to the producer."""
+        self.read_pos += min(n, self.available())
+
+    def read(self, max_frames=None):
+        """Copy out and consume the unread frames."""
+        views = self.peek(max_frames)
+        data = np.concatenate(views) if views else np.zeros(0, dtype=np.float32)
+        self.consume(len(data))
+        return data
+
+    def drain(self):
+        """Return all unread frames once the producer has stopped.
+
+        Zero-copy unless the data wraps around the end of the buffer.
+        """
+        views = self.peek()
+        self.consume(sum(len(view) for view in views))
+        if len(views) == 1:
+            return views[0]
+        return np.concatenate(views) if views else np.zeros(0, dtype=np.float32)
@@ -0,0 +1,430 @@
+"""Inference backends for Whisper transcription.
+
+Every backend exposes the same `transcribe(audio, language=..., initial_prompt=...)`
+call and returns a dict shaped like openai-whisper's result ("text", "segments",
+"language"), so the UI does not care which engine runs underneath.
+
+- pytorch:     openai-whisper as before (fp16 only on CUDA), with the weights
+               converted once into a memory-mapped checkpoint; optionally
+               int8 linear layers on the CPU, see cpu_tuning.py for threads
+               and priority
+- ctranslate2: faster-whisper with int8 weights, the fastest option on CPU
+- onnx:        ONNX Runtime via optimum, exported once and cached on disk
+- remote:      client of a shared local transcription server (see server.py)
+
+The optional engines are only imported when selected, so they do not need to
+be installed unless they are used.
+"""
+import http.client
+import json
+import os
+import socket
+import tempfile
+import time
+import urllib.parse
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+WARMUP_SECONDS = 1.0
+
+
+class TranscriptionBackend:
+    """Base class for inference engines."""
+
+    name = None
+    word_timestamps = False  # Whether transcribe() accepts word_timestamps=True
+
+    def __init__(self, model_name="base", cache_dir="models"):
+        self.model_name = model_name
+        self.cache_dir = os.path.join(cache_dir, self.name)
+
+    def load(self):
+        """Load (downloading or converting on first use) the model."""
+        raise NotImplementedError
+
+    def prepare(self):
+        """Do the first-use download or conversion now, so that processes loading the
+        model later find it on disk; returns whether there was anything to do."""
+        return False
+
+    def warm_up(self, language=None):
+        """Decode a second of near-silence so the first real transcription does not pay for
+        kernel selection, allocator growth and mel filter setup; returns the seconds it took."""
+        started_at = time.perf_counter()
+        noise = np.random.default_rng(0).normal(0, 1e-3, int(SAMPLE_RATE * WARMUP_SECONDS)).astype(np.float32)
+        self.transcribe(noise, language=language)
+        return time.perf_counter() - started_at
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **options):
+        """Transcribe a float32 16 kHz mono array and return a whisper-style result dict."""
+        raise NotImplementedError
+
+    def transcribe_batch(self, audios, language=None, initial_prompt=None, **options):
+        """Transcribe several arrays; engines that can decode a batch in one pass override this."""
+        return [self.transcribe(audio, language=language, initial_prompt=initial_prompt, **options)
+                for audio in audios]
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.model_name!r})"
+
+
+class PyTorchBackend(TranscriptionBackend):
+    """The reference openai-whisper PyTorch model."""
+
+    name = "pytorch"
+    word_timestamps = True
+
+    def __init__(self, model_name="base", cache_dir="models", quantize=False, threads=None,
+                 interop_threads=None, priority="normal", cores=None):
+        from cpu_tuning import InferenceThread
+
+        super().__init__(model_name, cache_dir)
+        self.quantize = quantize              # Dynamic int8 quantization of the linear layers (CPU only)
+        self.threads = threads                # torch intra-op threads of this instance; None = one per core
+        self.interop_threads = interop_threads
+        self.priority = priority              # "low": inference threads yield to the UI and audio
+        self.cores = cores                    # Pin inference threads to these cores (Linux)
+        self.inference = InferenceThread(priority, cores)  # Runs load() and the transcribe calls
+
+    def _run(self, fn, *args, **kwargs):
+        """Call `fn` on this instance's inference thread, split over `threads` intra-op threads."""
+        from cpu_tuning import use_threads
+
+        def call():
+            if self.threads:
+                use_threads(self.threads)
+            return fn(*args, **kwargs)
+        return self.inference.run(call)
+
+    def _mmap_path(self):
+        stem = os.path.splitext(os.path.basename(self.model_name))[0]
+        return os.path.join(self.cache_dir, f"{stem}.mmap.pt")
+
+    def _convert(self, path):
+        """Save the checkpoint once as fp32 tensors that can be memory-mapped as they are."""
+        import torch
+        import whisper
+
+        model = whisper.load_model(self.model_name, device="cpu", download_root=self.cache_dir)
+        state = {name: tensor.float().contiguous() for name, tensor in model.state_dict().items()}
+        # Buffers the state dict leaves out; the alignment heads are set again on load
+        persistent = set(state)
+        buffers = {
+            name: tensor for name, tensor in model.named_buffers()
+            if name not in persistent and not tensor.is_sparse
+        }
+        # A file of its own: batch workers may be converting the same model side by side
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                        dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            torch.save({"dims": vars(model.dims), "model_state_dict": state, "buffers": buffers}, tmp_path)
+            if not os.path.exists(path):  # Another process finishing first is just as good
+                os.replace(tmp_path, path)  # Never leave a half-written checkpoint behind
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def prepare(self):
+        path = self._mmap_path()
+        if os.path.exists(path):
+            return False
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._convert(path)
+        return True
+
+    def load(self):
+        from cpu_tuning import configure_torch
+
+        default_threads = configure_torch(self.interop_threads)
+        self.threads = self.threads or default_threads
+        return self._run(self._load)
+
+    def _load(self):
+        import torch
+        import whisper
+        from whisper.model import ModelDimensions, Whisper
+
+        self.converted = self.prepare()
+        path = self._mmap_path()
+
+        # The tensors stay in the file's pages: no copy, and other processes loading
+        # the same file (batch workers, a second window) share them via the page cache
+        checkpoint = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+        dims = ModelDimensions(**checkpoint["dims"])
+        try:
+            with torch.device("meta"):
+                model = Whisper(dims)  # No allocation or random init for weights about to be replaced
+        except (NotImplementedError, RuntimeError):
+            model = Whisper(dims)
+        model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+        for name, tensor in checkpoint["buffers"].items():
+            module_name, _, buffer_name = name.rpartition(".")
+            model.get_submodule(module_name).register_buffer(buffer_name, tensor, persistent=False)
+        alignment_heads = whisper._ALIGNMENT_HEADS.get(self.model_name)
+        if alignment_heads is not None:
+            model.set_alignment_heads(alignment_heads)
+        else:
+            # Whisper's default: all heads in the second half of the decoder
+            heads = torch.zeros(dims.n_text_layer, dims.n_text_head, dtype=torch.bool)
+            heads[dims.n_text_layer // 2:] = True
+            model.register_buffer("alignment_heads", heads.to_sparse(), persistent=False)
+
+        if torch.cuda.is_available():
+            model = model.to("cuda")  # The GPU needs its own copy anyway
+            if self.quantize:
+                print("int8 quantization is CPU-only, running the fp16 model on the GPU")
+                self.quantize = False
+        elif self.quantize:
+            model = self._quantize(model.eval())
+        self.model = model.eval()
+        self.fp16 = self.model.device.type == "cuda"
+        return self
+
+    def _quantize(self, model):
+        """Swap the linear layers for dynamically quantized int8 ones, in place.
+
+        The weights are quantized once here and the activations on the fly, so
+        the int8 model needs no calibration; the encoder and decoder matmuls
+        get faster and the model smaller, at a small cost in accuracy (see
+        benchmarks/bench_quantization.py). Convolutions, embeddings and
+        layer norms stay fp32.
+        """
+        import torch
+        import whisper.model
+
+        # whisper's Linear only differs by casting the weights to the input dtype, which
+        # is fp32 here anyway; quantize_dynamic only takes plain nn.Linear modules
+        for module in model.modules():
+            if type(module) is whisper.model.Linear:
+                module.__class__ = torch.nn.Linear
+        # In place: a copy would read every memory-mapped weight into memory
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **options):
+        options.setdefault("fp16", self.fp16)
+        return self._run(self.model.transcribe, audio, language=language, initial_prompt=initial_prompt, **options)
+
+    def count_tokens(self, text):
+        """Prompt tokens `text` takes, as transcribe() encodes it."""
+        from whisper.tokenizer import get_tokenizer
+
+        tokenizer = get_tokenizer(self.model.is_multilingual, num_languages=self.model.num_languages)
+        return len(tokenizer.encode(" " + text.strip()))
+
+    def transcribe_batch(self, audios, language=None, initial_prompt=None, **options):
+        """Decode all clips of up to 30 s in a single batched decoder pass."""
+        return self._run(self._transcribe_batch, audios, language, initial_prompt, **options)
+
+    def _transcribe_batch(self, audios, language, initial_prompt, **options):
+        import torch
+        import whisper
+
+        results = [None] * len(audios)
+        short = [i for i, audio in enumerate(audios) if len(audio) <= whisper.audio.N_SAMPLES]
+        if len(short) > 1:
+            mel = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(audios[i]), self.model.dims.n_mels)
+                for i in short
+            ]).to(self.model.device)
+            decode_options = whisper.DecodingOptions(
+                language=language,
+                prompt=initial_prompt,
+                fp16=options.get("fp16", self.fp16),
+                without_timestamps=True
+            )
+            for i, decoded in zip(short, whisper.decode(self.model, mel, decode_options)):
+                results[i] = {
+                    "text": decoded.text,
+                    "segments": [{"id": 0, "start": 0.0, "end": len(audios[i]) / SAMPLE_RATE, "text": decoded.text}],
+                    "language": decoded.language
+                }
+
+        # Longer recordings need transcribe()'s sliding window
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = self.transcribe(audios[i], language=language, initial_prompt=initial_prompt, **options)
+        return results
+
+
+class CTranslate2Backend(TranscriptionBackend):
+    """faster-whisper (CTranslate2) with int8-quantized weights."""
+
+    name = "ctranslate2"
+    compute_type = "int8"
+    word_timestamps = True
+
+    def __init__(self, model_name="base", cache_dir="models", threads=None):
+        super().__init__(model_name, cache_dir)
+        self.threads = threads  # CPU threads of this instance; None = CTranslate2's default
+
+    def load(self):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError as e:
+            raise ImportError("The ctranslate2 backend needs faster-whisper: pip install faster-whisper") from e
+
+        # The converted CTranslate2 model is downloaded once into the cache dir
+        self.model = WhisperModel(
+            self.model_name,
+            device="cpu",
+            compute_type=self.compute_type,
+            cpu_threads=self.threads or 0,
+            download_root=self.cache_dir
+        )
+        return self
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **options):
+        segments, info = self.model.transcribe(
+            audio, language=language, initial_prompt=initial_prompt, **options
+        )
+        # faster-whisper decodes lazily while the generator is consumed
+        segments = [
+            {"id": i, "start": s.start, "end": s.end, "text": s.text, "words": s.words}
+            for i, s in enumerate(segments)
+        ]
+        for segment in segments:
+            # Word objects only with word_timestamps=True, as dicts like openai-whisper's
+            words = segment.pop("words")
+            if words:
+                segment["words"] = [
+                    {"word": w.word, "start": w.start, "end": w.end, "probability": w.probability} for w in words
+                ]
+        return {
+            "text": "".join(s["text"] for s in segments),
+            "segments": segments,
+            "language": info.language
+        }
+
+    def count_tokens(self, text):
+        return len(self.model.hf_tokenizer.encode(" " + text.strip(), add_special_tokens=False).ids)
+
+
+class OnnxBackend(TranscriptionBackend):
+    """ONNX Runtime inference of the Hugging Face Whisper export."""
+
+    name = "onnx"
+
+    def load(self):
+        try:
+            from optimum.onnxruntime import ORTModelForSpeechSeq2Seq
+            from transformers import AutoProcessor, pipeline
+        except ImportError as e:
+            raise ImportError("The onnx backend needs optimum: pip install optimum[onnxruntime]") from e
+
+        model_dir = os.path.join(self.cache_dir, f"whisper-{self.model_name}")
+        if os.path.isdir(model_dir):
+            model = ORTModelForSpeechSeq2Seq.from_pretrained(model_dir)
+            self.processor = AutoProcessor.from_pretrained(model_dir)
+        else:
+            # Export to ONNX once; later launches load the cached graph directly
+            hub_id = f"openai/whisper-{self.model_name}"
+            model = ORTModelForSpeechSeq2Seq.from_pretrained(hub_id, export=True)
+            self.processor = AutoProcessor.from_pretrained(hub_id)
+            model.save_pretrained(model_dir)
+            self.processor.save_pretrained(model_dir)
+
+        self.pipe = pipeline(
+            "automatic-speech-recognition",
+            model=model,
+            tokenizer=self.processor.tokenizer,
+            feature_extractor=self.processor.feature_extractor,
+            chunk_length_s=30
+        )
+        return self
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **options):
+        generate_kwargs = dict(options, task="transcribe")
+        if language:
+            generate_kwargs["language"] = language
+        if initial_prompt:
+            generate_kwargs["prompt_ids"] = self.processor.get_prompt_ids(initial_prompt, return_tensors="pt")
+
+        output = self.pipe(
+            {"raw": audio, "sampling_rate": SAMPLE_RATE},
+            generate_kwargs=generate_kwargs,
+            return_timestamps=True
+        )
+        segments = [
+            {"id": i, "start": chunk["timestamp"][0], "end": chunk["timestamp"][1], "text": chunk["text"]}
+            for i, chunk in enumerate(output.get("chunks", []))
+        ]
+        return {"text": output["text"], "segments": segments, "language": language}
+
+    def count_tokens(self, text):
+        return len(self.processor.get_prompt_ids(text)) - 1  # Without the start-of-prompt token
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket."""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class RemoteBackend(TranscriptionBackend):
+    """Send audio to a shared transcription server instead of loading a model.
+
+    `server_url` is either http://host:port or unix:///path/to/socket.
+    """
+
+    name = "remote"
+    timeout = 600
+
+    def __init__(self, model_name="base", cache_dir="models", server_url="http://127.0.0.1:8765"):
+        super().__init__(model_name, cache_dir)
+        self.server_url = server_url
+
+    def _connection(self):
+        url = urllib.parse.urlsplit(self.server_url)
+        if url.scheme == "unix":
+            return UnixHTTPConnection(url.path, timeout=self.timeout)
+        return http.client.HTTPConnection(url.hostname, url.port or 80, timeout=self.timeout)
+
+    def _request(self, method, path, body=None):
+        connection = self._connection()
+        try:
+            connection.request(method, path, body=body, headers={"Content-Type": "application/octet-stream"})
+            response = connection.getresponse()
+            payload = json.loads(response.read() or b"{}")
+            if response.status != 200:
+                raise RuntimeError(f"Transcription server error {response.status}: {payload.get('error')}")
+            return payload
+        finally:
+            connection.close()
+
+    def warm_up(self, language=None):
+        return 0.0  # The server keeps its own model warm
+
+    def load(self):
+        # Nothing to load locally; fail early if the server is not running
+        info = self._request("GET", "/health")
+        print(f"Using transcription server at {self.server_url} ({info.get('backend')}, {info.get('model')})")
+        return self
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **options):
+        query = {key: value for key, value in (("language", language), ("prompt", initial_prompt)) if value}
+        path = "/transcribe" + ("?" + urllib.parse.urlencode(query) if query else "")
+        return self._request("POST", path, body=np.ascontiguousarray(audio, dtype="<f4").tobytes())
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (PyTorchBackend, CTranslate2Backend, OnnxBackend, RemoteBackend)
+}
+
+
+def create_backend(name, model_name="base", cache_dir="models", **options):
+    """Instantiate (but do not load) the backend registered under `name`."""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown backend {name!r}, expected one of: {', '.join(BACKENDS)}")
+    return backend_class(model_name, cache_dir, **options)
@@ -0,0 +1,149 @@
+"""Headless batch transcription of a folder of dictations.
+
+    python app.py batch <dir> [--output prescriptions] [--workers 4]
+
+Every WAV/FLAC file under <dir> is transcribed and written as a prescription
+next to the others in the output folder, mirroring the input folder layout,
+and recorded in the prescription archive.
+Each worker process loads the model once and keeps it for all of its files.
+Finished files are appended to a progress file in the output folder, so an
+interrupted run picks up where it stopped when started again.
+"""
+import json
+import multiprocessing
+import os
+import time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from backends import SAMPLE_RATE, create_backend
+from transcription_cache import audio_fingerprint
+
+AUDIO_EXTENSIONS = (".wav", ".flac")
+PROGRESS_FILE = "batch_progress.jsonl"
+
+# Per-worker state, set up once by _init_worker
+_recorder = None
+
+
+def find_audio_files(directory):
+    """Return the dictations under `directory` as sorted relative paths."""
+    audio_files = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                audio_files.append(os.path.relpath(os.path.join(root, name), directory))
+    return sorted(audio_files)
+
+
+def load_progress(progress_path):
+    """Return the set of input files that a previous run already finished."""
+    done = set()
+    if not os.path.exists(progress_path):
+        return done
+    with open(progress_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by an interrupted run
+            if entry.get("status") == "done":
+                done.add(entry["file"])
+    return done
+
+
+def _init_worker(config, threads_per_worker):
+    """Load the model once per worker process."""
+    global _recorder
+    # Keep the workers from oversubscribing the cores between them
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads_per_worker)
+
+    import app
+
+    app.config.update(config)
+    app.config["longform_workers"] = 1  # Files already run in parallel across the workers
+    app.config["torch_threads"] = app.config["torch_threads"] or threads_per_worker
+    app.load_model()
+    _recorder = app.AudioRecorder()
+
+
+def _transcribe_file(directory, relative_path, output_dir):
+    import app
+    import whisper
+
+    started_at = time.perf_counter()
+    audio_path = os.path.join(directory, relative_path)
+    audio = whisper.load_audio(audio_path)  # 16 kHz mono float32
+    # The same denoising and normalization as a recording, so the text matches the app's
+    audio = _recorder.prepare(audio, in_place=True)
+    # Errors raise and leave the file for a retry; empty text means no speech was found
+    transcription = _recorder.transcribe_audio(audio, raise_errors=True)
+    doc_path = os.path.join(output_dir, os.path.splitext(relative_path)[0] + ".docx")
+    app.write_prescription(transcription, doc_path)
+    if transcription:
+        app.archive.add(transcription, docx_path=doc_path, audio_sha256=audio_fingerprint(audio),
+                        model=app.config["model"], language=app.transcription_language(),
+                        recorded_at=datetime.fromtimestamp(os.path.getmtime(audio_path)))
+    result = {
+        "audio_seconds": round(len(audio) / SAMPLE_RATE, 2),
+        "seconds": round(time.perf_counter() - started_at, 2),
+        "output": doc_path
+    }
+    if not transcription:
+        result["no_speech"] = True  # An empty prescription, done all the same
+    suggestions = app.vocabulary_suggestions(transcription)
+    if suggestions:
+        result["check"] = [f"{heard} -> {suggestion}?" for heard, suggestion in suggestions]  # Left unchanged
+    return result
+
+
+def run_batch(directory, output_dir, workers=None, config=None):
+    """Transcribe every dictation under `directory` into `output_dir`."""
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+    os.makedirs(output_dir, exist_ok=True)
+    progress_path = os.path.join(output_dir, PROGRESS_FILE)
+    done = load_progress(progress_path)
+    audio_files = find_audio_files(directory)
+    todo = [path for path in audio_files if path not in done]
+
+    print(f"{len(audio_files)} dictations found, {len(audio_files) - len(todo)} already done, "
+          f"{len(todo)} to go with {workers} workers.")
+    if not todo:
+        return
+
+    if config:
+        # Convert the model once here instead of in every worker at the same time
+        try:
+            create_backend(config["backend"], config["model"], config["model_cache_dir"]).prepare()
+        except Exception as e:
+            print(f"Could not prepare the model, the workers will try: {e}")
+
+    started_at = time.perf_counter()
+    failed = 0
+    # spawn: workers must not inherit a forked Tk/PortAudio state
+    context = multiprocessing.get_context("spawn")
+    with open(progress_path, "a", encoding="utf-8") as progress, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                initializer=_init_worker, initargs=(config or {}, threads_per_worker)) as pool:
+        futures = {pool.submit(_transcribe_file, directory, path, output_dir): path for path in todo}
+        for count, future in enumerate(as_completed(futures), start=1):
+            path = futures[future]
+            try:
+                entry = dict(file=path, status="done", **future.result())
+                message = f"{entry['output']} ({entry['seconds']} s)" + (", no speech" if entry.get("no_speech") else "")
+            except Exception as e:
+                failed += 1
+                entry = {"file": path, "status": "error", "error": str(e)}
+                message = f"error: {e}"
+            progress.write(json.dumps(entry) + "\n")
+            progress.flush()
+
+            elapsed = time.perf_counter() - started_at
+            remaining = elapsed / count * (len(todo) - count)
+            print(f"[{count}/{len(todo)}] {path} -> {message}  (ETA {remaining:.0f} s)")
+
+    print(f"Finished in {time.perf_counter() - started_at:.1f} s, {failed} failed."
+          + (" Run again to retry the failed files." if failed else ""))
@@ -0,0 +1,100 @@
+"""Prescription archive: insert rate and search latency over a large synthetic archive.
+
+    python benchmarks/bench_archive.py [--count 200000] [--runs 20] [--db archive.db]
+
+Prescriptions are generated from a small vocabulary of drugs, doses and
+instructions, so some words occur in almost every row and others in few.
+Each query is run --runs times; p50/p95 latencies are reported for both
+result orders.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive import PrescriptionArchive  # noqa: E402
+
+DRUGS = ["Ibuprofen", "Metformin", "Ramipril", "Amlodipin", "Pantoprazol", "Simvastatin", "Levothyroxin",
+         "Metoprolol", "Bisoprolol", "Candesartan", "Torasemid", "Allopurinol", "Amoxicillin", "Novaminsulfon",
+         "Prednisolon", "Salbutamol", "Apixaban", "Rivaroxaban", "Sertralin", "Citalopram"]
+DOSES = ["2,5 mg", "5 mg", "10 mg", "20 mg", "40 mg", "100 mg", "400 mg", "500 mg", "1000 mg"]
+SCHEDULES = ["einmal täglich morgens", "zweimal täglich", "3x täglich nach dem Essen", "bei Bedarf",
+             "abends vor dem Schlafengehen"]
+NOTES = ["Kontrolle in einer Woche.", "Blutbild in vier Wochen.", "Bei Beschwerden Wiedervorstellung.",
+         "Nierenwerte kontrollieren.", "Blutdruck selbst messen und notieren.", "Dosis langsam steigern."]
+NAMES = ["Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker", "Schulz", "Hoffmann"]
+
+QUERIES = [
+    ("rare drug", {"query": "Rivaroxaban 20"}),
+    ("common word", {"query": "täglich"}),
+    ("prefix", {"query": "Metfo"}),
+    ("drug + patient", {"query": "Ramipril", "patient": "Schmidt"}),
+    ("drug + date range", {"query": "Apixaban", "since": "2026-01-01", "until": "2026-03-31"}),
+    ("no match", {"query": "Penicillin"}),
+    ("newest", {}),
+]
+
+
+def prescription(rng):
+    lines = [f"{rng.choice(DRUGS)} {rng.choice(DOSES)}, {rng.choice(SCHEDULES)}." for _ in range(rng.randint(1, 4))]
+    return "\n".join(lines + [rng.choice(NOTES)])
+
+
+def fill(archive, count, seed=0):
+    rng = random.Random(seed)
+    connection = archive._connection()
+    started_at = time.perf_counter()
+    with connection:  # One transaction; archive.add commits per prescription
+        for i in range(count):
+            day = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" if i < count // 2 else \
+                f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            connection.execute(
+                "INSERT INTO prescriptions (created_at, patient, text, docx_path) VALUES (?, ?, ?, ?)",
+                (f"{day} 10:00:00", f"{rng.choice(['Anna', 'Max', 'Lena', 'Paul'])} {rng.choice(NAMES)}",
+                 prescription(rng), f"prescriptions/prescription_{i}.docx")
+            )
+    return time.perf_counter() - started_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--db", help="reuse (or create) this archive instead of a temporary one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = PrescriptionArchive(args.db or os.path.join(tmp, "archive.db"))
+        existing = archive.count()
+        if existing < args.count:
+            seconds = fill(archive, args.count - existing)
+            print(f"Inserted {args.count - existing} prescriptions in {seconds:.1f} s "
+                  f"({(args.count - existing) / seconds:.0f}/s, bulk)")
+
+        started_at = time.perf_counter()
+        for i in range(200):
+            archive.add(f"Ibuprofen 400 mg, bei Bedarf. Einzeln archiviert {i}.", patient="Benchmark")
+        print(f"archive.add: {(time.perf_counter() - started_at) / 200 * 1000:.2f} ms per prescription")
+
+        print(f"{archive.count()} prescriptions, {os.path.getsize(archive.path) / 2 ** 20:.0f} MB")
+        for name, query in QUERIES:
+            for order in ("newest", "rank"):
+                times = []
+                for _ in range(args.runs):
+                    started_at = time.perf_counter()
+                    results = archive.search(limit=args.limit, order=order, **query)
+                    times.append(time.perf_counter() - started_at)
+                times.sort()
+                print(f"{name:<20} {order:<7} p50 {statistics.median(times) * 1000:7.2f} ms  "
+                      f"p95 {times[int(0.95 * (len(times) - 1))] * 1000:7.2f} ms  {len(results)} results")
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Parallel long-dictation decoding: wall-clock time against the number of workers.
+
+    python benchmarks/bench_longform.py [dictation.wav] [--seconds 300] [--workers 1 2 4]
+                                        [--backend pytorch] [--model base]
+
+A long recording (a WAV file, or synthetic speech-like audio) is decoded by
+LongFormTranscriber with each number of workers, once with the cores split
+between the instances as the app does it and once with every instance
+using all cores, which shows what oversubscription costs. The model
+instances are loaded before the timed run.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backends import SAMPLE_RATE, create_backend  # noqa: E402
+from bench_pipeline import load_wav, synthetic_audio  # noqa: E402
+from longform import LongFormTranscriber  # noqa: E402
+from preprocessing import AudioPreprocessor  # noqa: E402
+
+
+def load_audio(path, seconds):
+    if path is None:
+        audio, rate = synthetic_audio(SAMPLE_RATE, seconds), SAMPLE_RATE
+    else:
+        audio, rate = load_wav(path)
+    preprocessor = AudioPreprocessor(rate, SAMPLE_RATE)
+    return np.concatenate([preprocessor.process(audio), preprocessor.flush()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("fixture", nargs="?", help="WAV file (default: synthetic audio)")
+    parser.add_argument("--seconds", type=float, default=300, help="length of the synthetic audio")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--backend", default="pytorch", choices=["pytorch", "ctranslate2"])
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--language", default="de")
+    parser.add_argument("--cache-dir", default=os.path.join(ROOT, "models"))
+    args = parser.parse_args()
+
+    audio = load_audio(args.fixture, args.seconds)
+    audio_seconds = len(audio) / SAMPLE_RATE
+    cores = os.cpu_count() or 1
+    print(f"{audio_seconds:.0f} s of audio, {cores} cores, {args.backend} '{args.model}'")
+
+    print(f"{'workers':>7} {'threads':>16} {'wall s':>8} {'RTF':>6} {'speed-up':>9}")
+    single = None
+    for workers in args.workers:
+        for split in (True, False):
+            if workers == 1 and not split:
+                continue  # The same thing
+            threads = max(1, cores // workers) if split else cores
+            backends = [create_backend(args.backend, args.model, args.cache_dir, threads=threads).load()
+                        for _ in range(workers)]
+            for backend in backends:
+                backend.warm_up(language=args.language)
+            pool = iter(backends)
+            decoder = LongFormTranscriber(lambda: next(pool), workers)
+            started_at = time.perf_counter()
+            decoder.transcribe(audio, SAMPLE_RATE, language=args.language)
+            wall = time.perf_counter() - started_at
+            single = single or wall
+            label = f"{threads} each" + ("" if split else " (all)")
+            print(f"{workers:>7} {label:>16} {wall:>8.1f} {wall / audio_seconds:>6.2f} {single / wall:>8.2f}x")
+            del backends, pool, decoder
+
+
+if __name__ == "__main__":
+    main()
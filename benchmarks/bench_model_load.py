@@ -0,0 +1,93 @@
+"""Cold vs warm model start: load time, warm-up and first-transcription latency.
+
+    python benchmarks/bench_model_load.py [--backend pytorch] [--model base] [--runs 3]
+
+Every measurement runs in a fresh interpreter so nothing is cached in-process:
+
+- baseline:   whisper.load_model as before (pytorch only)
+- cold start: the converted/memory-mapped weights are deleted first
+- warm start: the converted weights exist and are in the page cache
+
+For each it reports the load time and the latency of the first and second
+transcription of a short clip, with and without the warm-up decode.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+import numpy as np
+started_at = time.perf_counter()
+if {baseline!r}:
+    import whisper
+    from backends import PyTorchBackend
+    backend = PyTorchBackend({model!r}, {cache_dir!r})
+    backend.model = whisper.load_model({model!r}, download_root=backend.cache_dir)
+    backend.fp16 = False
+else:
+    from backends import create_backend
+    backend = create_backend({backend!r}, {model!r}, {cache_dir!r}).load()
+load = time.perf_counter() - started_at
+warm_up = backend.warm_up() if {warm_up!r} else 0.0
+rng = np.random.default_rng(0)
+clip = (0.1 * np.sin(2 * np.pi * 220 * np.arange(16000 * 5) / 16000) + 0.01 * rng.standard_normal(16000 * 5))
+latencies = []
+for _ in range(2):
+    started_at = time.perf_counter()
+    backend.transcribe(clip.astype(np.float32))
+    latencies.append(time.perf_counter() - started_at)
+print(json.dumps({{"load": load, "warm_up": warm_up, "first": latencies[0], "second": latencies[1]}}))
+"""
+
+
+def run_child(backend, model, cache_dir, baseline=False, warm_up=False):
+    code = CHILD.format(root=ROOT, backend=backend, model=model, cache_dir=cache_dir,
+                        baseline=baseline, warm_up=warm_up)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def report(name, results):
+    row = {key: statistics.median(result[key] for result in results) * 1000 for key in results[0]}
+    print(f"{name:<28} load {row['load']:8.0f} ms  warm-up {row['warm_up']:7.0f} ms  "
+          f"1st transcription {row['first']:7.0f} ms  2nd {row['second']:7.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", default="pytorch")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--cache-dir", default=os.path.join(ROOT, "models"))
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    def converted_path():
+        return os.path.join(args.cache_dir, args.backend, f"{args.model}.mmap.pt")
+
+    if args.backend == "pytorch":
+        report("baseline whisper.load_model", [
+            run_child(args.backend, args.model, args.cache_dir, baseline=True) for _ in range(args.runs)
+        ])
+
+        cold = []
+        for _ in range(args.runs):
+            if os.path.exists(converted_path()):
+                os.remove(converted_path())
+            cold.append(run_child(args.backend, args.model, args.cache_dir))
+        report("cold start (convert)", cold)
+
+    report("warm start", [run_child(args.backend, args.model, args.cache_dir) for _ in range(args.runs)])
+    report("warm start + warm-up", [
+        run_child(args.backend, args.model, args.cache_dir, warm_up=True) for _ in range(args.runs)
+    ])
+
+
+if __name__ == "__main__":
+    main()
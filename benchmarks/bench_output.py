@@ -0,0 +1,95 @@
+"""Latency of saving/printing a prescription: native pipeline vs MS Word COM.
+
+    python benchmarks/bench_output.py [--runs 20] [--template template.docx] [--print]
+
+The COM variants only run on Windows with Word installed. Without --print the
+print paths stop right before the spooler, so nothing is actually printed.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import make_template  # noqa: E402
+from document_output import NativeOutput, WordOutput, pdf_bytes  # noqa: E402
+from templates import PrescriptionTemplate  # noqa: E402
+
+BODY = "Ibuprofen 400 mg, 3x täglich nach dem Essen für 5 Tage.\nKontrolle in einer Woche."
+
+
+def measure(name, runs, func):
+    times = []
+    for i in range(runs):
+        started_at = time.perf_counter()
+        func(i)
+        times.append((time.perf_counter() - started_at) * 1000)
+    times.sort()
+    p95 = times[min(len(times) - 1, int(round(0.95 * (len(times) - 1))))]
+    print(f"{name:<34} mean {statistics.mean(times):8.1f} ms  p50 {statistics.median(times):8.1f} ms  p95 {p95:8.1f} ms")
+
+
+def com_per_request(path):
+    """The former save_document: a new Word process for every click."""
+    import win32com.client
+
+    word = win32com.client.Dispatch("Word.Application")
+    word.Visible = False
+    doc = word.Documents.Add()
+    doc.Content.Text = BODY
+    doc.SaveAs(os.path.abspath(path))
+    doc.Close()
+    word.Quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--template", help="template .docx (default: a synthetic one)")
+    parser.add_argument("--print", action="store_true", help="really send the print jobs to the spooler")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template_path = args.template
+        if not template_path:
+            template_path = os.path.join(tmp, "template.docx")
+            make_template(template_path)
+        template = PrescriptionTemplate(template_path)
+        paragraphs = template.paragraphs(BODY, patient="Max Mustermann")
+
+        def render_docx(path):
+            with open(path, "wb") as f:
+                template.render(f, BODY, patient="Max Mustermann")
+            return path
+
+        native = NativeOutput()
+        measure("native save .docx", args.runs, lambda i: native.save(os.path.join(tmp, f"n{i}.docx"), paragraphs, render_docx))
+        measure("native save .pdf", args.runs, lambda i: native.save(os.path.join(tmp, f"n{i}.pdf"), paragraphs, render_docx))
+        if args.print:
+            measure("native print (lp/shell spooler)", args.runs, lambda i: native.print(paragraphs, render_docx))
+        else:
+            measure("native print (PDF render only)", args.runs, lambda i: pdf_bytes(paragraphs))
+
+        try:
+            import win32com.client  # noqa: F401
+        except ImportError:
+            print("win32com not available, skipping the Word COM comparison")
+            return
+
+        measure("COM save, Word per request", args.runs, lambda i: com_per_request(os.path.join(tmp, f"c{i}.docx")))
+        word = WordOutput()
+        try:
+            measure("COM save, long-lived Word", args.runs,
+                    lambda i: word.save(os.path.join(tmp, f"w{i}.pdf"), paragraphs, render_docx))
+            if args.print:
+                measure("COM print, long-lived Word", args.runs, lambda i: word.print(paragraphs, render_docx))
+        finally:
+            word.close()
+
+
+if __name__ == "__main__":
+    main()
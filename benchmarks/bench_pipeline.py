@@ -0,0 +1,301 @@
+"""End-to-end benchmark of record -> transcribe -> embed -> preview, without a GUI.
+
+    python benchmarks/bench_pipeline.py [fixtures.wav|dir ...] [--seconds 10 60] [--runs 5]
+                                        [--backend ctranslate2] [--model base] [--output results.json]
+
+The sound device is replaced by a fake one that plays the fixture into
+AudioRecorder's callback at the fixture's own sample rate, so capture,
+resampling, buffering and spooling to disk run exactly as when recording.
+WAV files (16/32-bit PCM) can be given as fixtures; otherwise synthetic
+speech-like audio of the given lengths is generated. The transcription cache is off unless --cache is
+passed. Results (p50/p95 per stage, real-time factor, throughput, peak RSS)
+are printed and written as JSON together with the commit, backend and model,
+so runs can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import wave
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BLOCK_MS = 10  # Size of the fake device's callback blocks
+
+
+class FakeInputStream:
+    """Stands in for sounddevice.InputStream and plays the current fixture into the callback."""
+
+    fixture = None       # float32 mono audio at fixture_rate
+    fixture_rate = 48000
+    realtime = False
+    current = None       # The stream the recorder opened last
+
+    def __init__(self, samplerate, channels, device, callback, **kwargs):
+        self.samplerate = samplerate
+        self.callback = callback
+        self.done = threading.Event()
+        self.callback_seconds = 0.0
+        self.thread = None
+
+    def _play(self):
+        block = int(self.samplerate * BLOCK_MS / 1000)
+        audio = FakeInputStream.fixture
+        for i in range(0, len(audio), block):
+            indata = audio[i:i + block, None]
+            started_at = time.perf_counter()
+            self.callback(indata, len(indata), None, None)
+            self.callback_seconds += time.perf_counter() - started_at
+            if FakeInputStream.realtime:
+                time.sleep(len(indata) / self.samplerate)
+        self.done.set()
+
+    def start(self):
+        FakeInputStream.current = self
+        self.thread = threading.Thread(target=self._play, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.thread.join()
+
+    def close(self):
+        pass
+
+
+def install_fake_sounddevice():
+    """Register a stand-in `sounddevice` module before app is imported."""
+    sd = types.ModuleType("sounddevice")
+    sd.PortAudioError = type("PortAudioError", (Exception,), {})
+    sd.InputStream = FakeInputStream
+
+    def query_devices(device=None, kind=None):
+        info = {"name": "QuickDoc benchmark fixture", "index": 0, "max_input_channels": 1,
+                "default_samplerate": float(FakeInputStream.fixture_rate)}
+        return info if device is not None or kind is not None else [info]
+
+    sd.query_devices = query_devices
+    sys.modules["sounddevice"] = sd
+
+
+def synthetic_audio(rate, seconds, seed=0):
+    """Voiced bursts of 2-6 s separated by short pauses, with noise and a DC offset."""
+    rng = np.random.default_rng(seed)
+    total = int(rate * seconds)
+    t = np.arange(total) / rate
+    voice = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((140, 280, 420, 700, 1200)))
+    envelope = np.zeros(total)
+    position = 0
+    while position < total:
+        length = min(int(rate * rng.uniform(2, 6)), total - position)
+        envelope[position:position + length] = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t[:length]) ** 2
+        position += length + int(rate * rng.uniform(0.3, 1.5))
+    return (0.2 * envelope * voice + 0.005 * rng.standard_normal(total) + 0.02).astype(np.float32)
+
+
+def load_wav(path):
+    with wave.open(path, "rb") as f:
+        rate, channels, width = f.getframerate(), f.getnchannels(), f.getsampwidth()
+        data = f.readframes(f.getnframes())
+    if width not in (2, 4):
+        raise ValueError(f"{path}: only 16/32-bit PCM WAV is supported")
+    audio = np.frombuffer(data, dtype="<i2" if width == 2 else "<i4").reshape(-1, channels)[:, 0]
+    return audio.astype(np.float32) / float(2 ** (8 * width - 1)), rate
+
+
+def find_fixtures(paths):
+    fixtures = []
+    for path in paths:
+        if os.path.isdir(path):
+            fixtures.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(".wav")
+            ))
+        else:
+            fixtures.append(path)
+    return fixtures
+
+
+def make_template(path, filler=0):
+    """A synthetic prescription template, with `filler` paragraphs of letterhead text."""
+    import docx
+
+    doc = docx.Document()
+    doc.add_paragraph("Praxis Dr. med. Beispiel")
+    doc.add_paragraph("Patient: {{patient}}    Datum: {{date}}")
+    for _ in range(filler):
+        doc.add_paragraph("Lorem ipsum dolor sit amet, consetetur sadipscing elitr.")
+    doc.add_paragraph("{{body}}")
+    doc.save(path)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(times):
+    return {
+        "mean_ms": round(statistics.mean(times) * 1000, 2),
+        "p50_ms": round(percentile(times, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(times, 0.95) * 1000, 2),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 2 ** 20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10  # bytes on macOS, KiB on Linux
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_fixture(app, recorder, template_path, output_dir, audio, rate, runs, warmup):
+    from preview import PreviewRenderer
+    from templates import get_template
+
+    FakeInputStream.fixture, FakeInputStream.fixture_rate = audio, rate
+    stages = {"capture": [], "stop_recording": [], "transcribe": [], "embed": [], "preview": []}
+    text = ""
+    for run in range(warmup + runs):
+        times = {}
+        recorder.start_recording(0)
+        stream = FakeInputStream.current
+        stream.done.wait()
+        times["capture"] = stream.callback_seconds
+
+        started_at = time.perf_counter()
+        audio_data = recorder.stop_recording()
+        times["stop_recording"] = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        text = recorder.transcribe_audio(audio_data)
+        times["transcribe"] = time.perf_counter() - started_at
+        if recorder.spool is not None:
+            os.remove(recorder.spool.path)
+
+        started_at = time.perf_counter()
+        app.write_prescription(text, os.path.join(output_dir, f"run{run}.docx"), template_path,
+                               patient="Max Mustermann")
+        times["embed"] = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        paragraphs = get_template(template_path).paragraphs(text, patient="Max Mustermann")
+        PreviewRenderer().render(paragraphs)
+        times["preview"] = time.perf_counter() - started_at
+
+        if run >= warmup:
+            for stage, seconds in times.items():
+                stages[stage].append(seconds)
+
+    seconds = len(audio) / rate
+    total_p50 = sum(percentile(times, 0.5) for times in stages.values())
+    return {
+        "seconds": round(seconds, 2),
+        "sample_rate": rate,
+        "stages": {stage: summarize(times) for stage, times in stages.items()},
+        "rtf": round(percentile(stages["transcribe"], 0.5) / seconds, 4),
+        "end_to_end_rtf": round(total_p50 / seconds, 4),
+        "throughput_audio_s_per_s": round(seconds / total_p50, 2),
+        "words": len(text.split()),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("fixtures", nargs="*", help="WAV files or folders of them (default: synthetic audio)")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 60], help="lengths of synthetic fixtures")
+    parser.add_argument("--rate", type=int, default=48000, help="sample rate of synthetic fixtures")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs per fixture")
+    parser.add_argument("--backend", help="inference backend (default: from the config file)")
+    parser.add_argument("--model", help="model size (default: from the config file)")
+    parser.add_argument("--cache", action="store_true", help="keep the transcription cache on")
+    parser.add_argument("--realtime", action="store_true", help="play fixtures at real-time speed")
+    parser.add_argument("--template", help="template .docx (default: a synthetic one)")
+    parser.add_argument("--output", default="bench_pipeline.json", help="JSON results file")
+    args = parser.parse_args()
+
+    install_fake_sounddevice()
+    FakeInputStream.realtime = args.realtime
+    import app
+
+    if args.backend:
+        app.config["backend"] = args.backend
+    if args.model:
+        app.config["model"] = args.model
+    app.config["cache"] = args.cache
+    app.config["capture_rate"] = None  # Always the fixture's rate
+
+    started_at = time.perf_counter()
+    app.load_model()
+    app.get_model()
+    load_seconds = time.perf_counter() - started_at
+    recorder = app.AudioRecorder()
+
+    fixtures = [(os.path.basename(path),) + load_wav(path) for path in find_fixtures(args.fixtures)]
+    if not fixtures:
+        fixtures = [(f"synthetic_{seconds:g}s", synthetic_audio(args.rate, seconds), args.rate)
+                    for seconds in args.seconds]
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "backend": app.config["backend"],
+        "model": app.config["model"],
+        "language": app.config["language"],
+        "vad": app.config["vad"],
+        "cache": args.cache,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "runs": args.runs,
+        "model_load_s": round(load_seconds, 2),
+        "fixtures": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        app.config["spool_dir"] = os.path.join(tmp, "spool")
+        template_path = args.template
+        if not template_path:
+            template_path = os.path.join(tmp, "template.docx")
+            make_template(template_path)
+
+        print(f"{app.config['backend']} / {app.config['model']}, model loaded in {load_seconds:.1f} s")
+        for name, audio, rate in fixtures:
+            result = run_fixture(app, recorder, template_path, tmp, audio, rate, args.runs, args.warmup)
+            results["fixtures"][name] = result
+            stages = "  ".join(f"{stage} {summary['p50_ms']:.0f}/{summary['p95_ms']:.0f}"
+                               for stage, summary in result["stages"].items())
+            print(f"{name:<24} {result['seconds']:7.1f} s  RTF {result['rtf']:.3f}  "
+                  f"end-to-end {result['throughput_audio_s_per_s']:.1f}x real time  "
+                  f"peak RSS {result['peak_rss_mb']:.0f} MB")
+            print(f"{'':<24} p50/p95 ms: {stages}")
+
+    results["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
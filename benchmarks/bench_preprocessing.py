@@ -0,0 +1,75 @@
+"""Cost of audio preprocessing per minute of captured audio.
+
+    python benchmarks/bench_preprocessing.py [--minutes 1] [--rates 48000 44100] [--block-ms 10]
+
+Runs the capture pipeline (DC removal + polyphase resampling to 16 kHz) in
+callback-sized blocks and on whole recordings, compares it with
+scipy.signal.resample_poly, and times normalization and, if installed,
+noisereduce. The input is synthetic speech-like audio with a DC offset and noise.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing import TARGET_RATE, AudioPreprocessor, StreamingResampler, denoise, normalize  # noqa: E402
+
+
+def make_audio(rate, seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(rate * seconds)) / rate
+    # Harmonics with a syllable-rate envelope, some noise and a DC offset
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2
+    voice = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((140, 280, 420, 700, 1200)))
+    return (0.2 * envelope * voice + 0.01 * rng.standard_normal(len(t)) + 0.05).astype(np.float32)
+
+
+def measure(name, minutes, func, runs=3):
+    best = float("inf")
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started_at)
+    print(f"{name:<44} {best * 1000 / minutes:8.1f} ms per minute of audio")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=1.0)
+    parser.add_argument("--rates", type=int, nargs="+", default=[48000, 44100])
+    parser.add_argument("--block-ms", type=float, default=10.0, help="capture callback block size")
+    args = parser.parse_args()
+
+    from scipy.signal import resample_poly
+
+    for rate in args.rates:
+        audio = make_audio(rate, args.minutes * 60)
+        block = max(1, int(rate * args.block_ms / 1000))
+        print(f"--- {rate} Hz -> {TARGET_RATE} Hz, {block}-sample blocks")
+
+        streamed = measure("pipeline, streamed in blocks", args.minutes,
+                           lambda: AudioPreprocessor(rate).run(audio, block))
+        measure("pipeline, whole recording", args.minutes, lambda: AudioPreprocessor(rate).run(audio))
+        resampler = StreamingResampler(rate)
+        reference = measure("scipy resample_poly, whole recording", args.minutes,
+                            lambda: resample_poly(audio, resampler.up, resampler.down).astype(np.float32))
+        resampled = np.concatenate([resampler.process(audio[i:i + block]) for i in range(0, len(audio), block)]
+                                   + [resampler.flush()])
+        print(f"{'max deviation from resample_poly':<44} {np.max(np.abs(resampled - reference)):.2e}")
+
+        measure("normalize", args.minutes, lambda: normalize(streamed))
+        try:
+            import noisereduce  # noqa: F401
+        except ImportError:
+            print("noisereduce not installed, skipping noise reduction")
+        else:
+            measure("noisereduce (stationary)", args.minutes, lambda: denoise(streamed), runs=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""int8 quantization and thread counts of the pytorch backend: word error rate vs speed.
+
+    python benchmarks/bench_quantization.py [fixtures.wav|dir ...] [--model base] [--threads 4 2]
+                                            [--runs 3] [--seconds 10 30]
+
+benchmarks/fixtures holds short prescription dictations as reference texts
+(NN_name.txt); record each one read aloud as NN_name.wav (16/32-bit PCM) in
+the same folder, or pass any other dictations. Every WAV file is transcribed
+by the fp32 and the int8 model at each thread count. The word error rate is
+measured against the .txt next to the WAV; a WAV without one is compared
+with the fp32 transcript instead, which shows only how much quantization
+changes the result. Without any WAV files, synthetic speech-like audio of
+the given lengths is decoded: the speed figures hold, and the word error
+rate is left out (n/a) as there are no words to get right. Reported per
+configuration: word error rate, real-time factor, median latency per file
+and the time to load the model.
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backends import SAMPLE_RATE, create_backend  # noqa: E402
+from bench_pipeline import find_fixtures, load_wav, synthetic_audio  # noqa: E402
+from preprocessing import AudioPreprocessor  # noqa: E402
+
+
+def words(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def word_errors(reference, hypothesis):
+    """Word-level edit distance (substitutions, insertions, deletions)."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, word in enumerate(reference, start=1):
+        current = [i] + [0] * len(hypothesis)
+        for j, heard in enumerate(hypothesis, start=1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (word != heard))
+        previous = current
+    return previous[-1]
+
+
+def preprocess(audio, rate):
+    """16 kHz audio as the recorder would produce it."""
+    preprocessor = AudioPreprocessor(rate, SAMPLE_RATE)
+    return np.concatenate([preprocessor.process(audio), preprocessor.flush()])
+
+
+def load_fixture(path):
+    """The fixture's audio, and the reference text if there is one."""
+    audio = preprocess(*load_wav(path))
+    reference_path = os.path.splitext(path)[0] + ".txt"
+    reference = None
+    if os.path.exists(reference_path):
+        with open(reference_path, "r", encoding="utf-8") as f:
+            reference = f.read().strip()
+    return os.path.basename(path), audio, reference
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("fixtures", nargs="*", default=[os.path.join(ROOT, "benchmarks", "fixtures")],
+                        help="WAV files or folders of them (default: benchmarks/fixtures)")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 30],
+                        help="lengths of synthetic fixtures, used when there are no WAV files")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--language", default="de")
+    parser.add_argument("--threads", type=int, nargs="+", default=[os.cpu_count() or 1],
+                        help="intra-op thread counts to compare")
+    parser.add_argument("--runs", type=int, default=3, help="timed runs per file")
+    parser.add_argument("--cache-dir", default=os.path.join(ROOT, "models"))
+    args = parser.parse_args()
+
+    fixtures = [load_fixture(path) for path in find_fixtures(args.fixtures)]
+    synthetic = not fixtures
+    if synthetic:
+        print("No WAV fixtures found, decoding synthetic audio for the speed only (WER n/a); "
+              "record the dictations in benchmarks/fixtures to measure the word error rate")
+        fixtures = [
+            (f"synthetic_{seconds:g}s", preprocess(synthetic_audio(SAMPLE_RATE, seconds), SAMPLE_RATE), None)
+            for seconds in args.seconds
+        ]
+    audio_seconds = sum(len(audio) for _, audio, _ in fixtures) / SAMPLE_RATE
+    with_reference = sum(reference is not None for _, _, reference in fixtures)
+    print(f"{len(fixtures)} fixtures, {audio_seconds:.0f} s of audio, {with_reference} with a reference text")
+
+    baseline = {}  # fixture -> fp32 transcript, the reference for fixtures without a text
+    rows = []
+    for quantize in (False, True):
+        started_at = time.perf_counter()
+        backend = create_backend("pytorch", args.model, args.cache_dir, quantize=quantize,
+                                 priority="normal").load()
+        load_seconds = time.perf_counter() - started_at
+        backend.warm_up(language=args.language)
+        for threads in args.threads:
+            backend.threads = threads
+            errors, total, latencies, decode_seconds = 0, 0, [], 0.0
+            for name, audio, reference in fixtures:
+                for _ in range(args.runs):
+                    started_at = time.perf_counter()
+                    text = backend.transcribe(audio, language=args.language)["text"]
+                    latencies.append(time.perf_counter() - started_at)
+                decode_seconds += statistics.median(latencies[-args.runs:])
+                baseline.setdefault(name, text)
+                expected = words(reference if reference is not None else baseline[name])
+                errors += word_errors(expected, words(text))
+                total += len(expected)
+            rows.append(("int8" if quantize else "fp32", threads, None if synthetic else errors / max(1, total),
+                         decode_seconds / audio_seconds, statistics.median(latencies), load_seconds))
+        del backend
+
+    print(f"{'weights':<8} {'threads':>7} {'WER':>7} {'RTF':>6} {'p50 s':>7} {'load s':>7}")
+    for weights, threads, wer, rtf, p50, load_seconds in rows:
+        wer = "n/a" if wer is None else f"{wer:.1%}"
+        print(f"{weights:<8} {threads:>7} {wer:>7} {rtf:>6.2f} {p50:>7.2f} {load_seconds:>7.1f}")
+    if with_reference < len(fixtures) and not synthetic:
+        print(f"{len(fixtures) - with_reference} fixtures without a reference text count "
+              f"differences from the fp32 transcript as errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Throughput of prescription rendering: re-parsing template.docx vs the in-memory template.
+
+    python benchmarks/bench_templates.py [--count 2000] [--template template.docx]
+
+Without a template file a small synthetic one with {{patient}}, {{date}} and
+{{body}} placeholders is generated.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_pipeline import make_template  # noqa: E402
+from templates import PrescriptionTemplate  # noqa: E402
+
+BODY = "Ibuprofen 400 mg, 3x täglich nach dem Essen für 5 Tage.\nKontrolle in einer Woche."
+
+
+def reparse(template_path, out_dir, count):
+    import docx
+
+    for i in range(count):
+        doc = docx.Document(template_path)
+        doc.add_paragraph(BODY)
+        doc.save(os.path.join(out_dir, f"reparse_{i}.docx"))
+
+
+def cached(template_path, out_dir, count):
+    template = PrescriptionTemplate(template_path)
+    for i in range(count):
+        template.render_to_file(out_dir, BODY, patient=f"Patient {i}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--template", help="template .docx (default: a synthetic one)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template_path = args.template
+        if not template_path:
+            template_path = os.path.join(tmp, "template.docx")
+            make_template(template_path, filler=20)
+
+        for name, run in (("re-parse per document", reparse), ("in-memory template", cached)):
+            out_dir = os.path.join(tmp, name.replace(" ", "_"))
+            os.makedirs(out_dir)
+            started_at = time.perf_counter()
+            run(template_path, out_dir, args.count)
+            elapsed = time.perf_counter() - started_at
+            print(f"{name:<24} {args.count} docs in {elapsed:6.2f} s  "
+                  f"{args.count / elapsed:8.1f} docs/s  {elapsed / args.count * 1000:6.2f} ms/doc")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Vocabulary post-correction: accuracy on misheard drug names, false corrections and latency.
+
+    python benchmarks/bench_vocabulary.py [--vocabulary vocabulary.txt] [--count 2000]
+
+Sentences are built from prescription phrases and ordinary German text. In
+each one a drug name from the vocabulary is garbled the way Whisper tends to
+garble them (a letter dropped, doubled, swapped or replaced, an "e" added,
+the word split in two, lower case). Reported are the share of garbled names
+restored exactly, the number of words changed that should have been left
+alone (in the garbled sentences and in clean ones), the time to build the
+indexes and the added latency per transcription. Real drugs next to a
+lexicon entry (Prednison, Saxagliptin, Kalzium) must come back unchanged and
+without a suggestion; the run fails otherwise.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from vocabulary import WORD_RE, Vocabulary  # noqa: E402
+
+TEMPLATES = [
+    "{drug} 400 mg dreimal täglich nach dem Essen für 5 Tage.",
+    "Bitte {drug} morgens nüchtern einnehmen, Kontrolle in einer Woche.",
+    "Der Patient nimmt seit Jahren {drug}, die Dosis bleibt unverändert.",
+    "Neu angesetzt wird {drug} 1-0-1, bei Beschwerden Wiedervorstellung.",
+    "Wegen der Nierenwerte wird {drug} abgesetzt und der Hausarzt informiert.",
+    "Zusätzlich {drug} bei Bedarf, maximal viermal am Tag.",
+]
+FILLER = [
+    "Die Patientin berichtet über Kopfschmerzen seit drei Tagen und Schwindel beim Aufstehen.",
+    "Keine Allergien bekannt, der Blutdruck war bei der letzten Messung im Normbereich.",
+    "Metallische Implantate im linken Knie, Magnetresonanztomographie daher nicht möglich.",
+    "Termin zur Verlaufskontrolle in zwei Wochen, vorher Laborwerte bestimmen lassen.",
+    "Sie arbeitet als Lehrerin und möchte nächste Woche wieder unterrichten.",
+    "Kalte Umschläge und Schonung, bei Fieber über 39 Grad bitte melden.",
+    "Der Befund wurde mit dem Patienten besprochen, Fragen wurden beantwortet.",
+    # Plurals and inflections of lexicon words are correct German and must stay
+    "Zwei Kapseln täglich, die Tabletten bitte nicht teilen.",
+    "Filmtabletten, Brausetabletten und Retardtabletten sind gleich wirksam.",
+    "Die Salben werden dünn aufgetragen, die Zäpfchen kühl gelagert.",
+    "Die Wirkung des Metformins lässt nach, die Dosis des Ibuprofens wird reduziert.",
+]
+# Real drugs next to a lexicon entry; rewriting one would prescribe a different drug
+NEIGHBOURS = [
+    "Prednison 5 mg morgens, nicht Prednisolon.",
+    "Saxagliptin 5 mg einmal täglich statt Sitagliptin.",
+    "Kalzium 500 mg zweimal täglich, Kalium bleibt abgesetzt.",
+]
+
+
+def garble(word, rng):
+    """A plausible mishearing of `word`."""
+    kind = rng.choice(["drop", "double", "swap", "replace", "suffix", "split", "lower"])
+    i = rng.randrange(1, len(word) - 1)
+    if kind == "drop":
+        return word[:i] + word[i + 1:]
+    if kind == "double":
+        return word[:i] + word[i] + word[i:]
+    if kind == "swap":
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if kind == "replace":
+        return word[:i] + rng.choice("aeiounmrlst") + word[i + 1:]
+    if kind == "suffix":
+        return word + "e"
+    if kind == "split":
+        i = len(word) // 2
+        return word[:i] + " " + word[i].upper() + word[i + 1:]
+    return word.lower()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vocabulary", default=os.path.join(ROOT, "vocabulary.txt"))
+    parser.add_argument("--count", type=int, default=2000, help="garbled sentences")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    started_at = time.perf_counter()
+    vocabulary = Vocabulary.load(args.vocabulary)
+    build_ms = (time.perf_counter() - started_at) * 1000
+    started_at = time.perf_counter()
+    prompt = vocabulary.prompt()
+    prompt_ms = (time.perf_counter() - started_at) * 1000
+    print(f"{len(vocabulary.entries)} entries, indexes built in {build_ms:.1f} ms, "
+          f"prompt ({len(prompt)} chars) in {prompt_ms:.2f} ms")
+
+    rng = random.Random(args.seed)
+    fuzzy = {word for words in vocabulary.fuzzy.values() for word in words}  # Not the [exact] entries
+    drugs = sorted(word for word in fuzzy if len(word) >= 6 and word[0].isupper())
+    restored, false_changes, words, latencies = 0, 0, 0, []
+    for _ in range(args.count):
+        drug = rng.choice(drugs)
+        heard = garble(drug, rng)
+        text = " ".join(rng.sample(FILLER, 2) + [rng.choice(TEMPLATES).format(drug=heard)])
+
+        started_at = time.perf_counter()
+        corrected, corrections = vocabulary.correct(text)
+        latencies.append(time.perf_counter() - started_at)
+
+        restored += drug in corrected and heard not in corrected.replace(drug, "")
+        false_changes += sum((before, after) != (heard, drug) for before, after in corrections)
+        words += len(WORD_RE.findall(text))
+
+    clean_changes, clean_words = 0, 0
+    for sentence in FILLER + NEIGHBOURS + [template.format(drug=rng.choice(drugs)) for template in TEMPLATES]:
+        corrected, corrections = vocabulary.correct(sentence)
+        clean_changes += len(corrections)
+        clean_words += len(WORD_RE.findall(sentence))
+
+    latencies.sort()
+    print(f"restored {restored}/{args.count} garbled drug names ({restored / args.count:.1%})")
+    print(f"wrong changes: {false_changes} of {words} words in garbled text, "
+          f"{clean_changes} of {clean_words} in clean text")
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"latency per transcription ({words / args.count:.0f} words): "
+          f"p50 {statistics.median(latencies) * 1e6:.0f} us, p95 {p95 * 1e6:.0f} us")
+
+    # Regressions: these must come back unchanged and without a suggestion
+    wrong = [(sentence, vocabulary.correct(sentence)[1] + vocabulary.suggest(sentence)) for sentence in NEIGHBOURS]
+    wrong = [(sentence, changes) for sentence, changes in wrong if changes]
+    for sentence, changes in wrong:
+        print(f"WRONG DRUG: {sentence!r} -> {changes}")
+    if wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
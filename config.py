@@ -0,0 +1,85 @@
+"""Persistent settings for QuickDoc.
+
+Settings live in a small JSON file next to the app. Missing keys fall back to
+DEFAULT_CONFIG so older config files keep working when new settings are added.
+"""
+import json
+import os
+
+CONFIG_PATH = "quickdoc_config.json"
+
+DEFAULT_CONFIG = {
+    "backend": "pytorch",        # pytorch, ctranslate2, onnx or remote (see backends.py)
+    "model": "base",             # Whisper model size
+    "language": "de",            # Or "auto" to let Whisper detect it
+    "model_mode": "fixed",       # fixed: always "model"; adaptive: pick the size per dictation
+    "adaptive_short_seconds": 15,   # Notes up to this long use adaptive_short_model
+    "adaptive_short_model": "tiny",
+    "adaptive_long_seconds": 120,   # Dictations this long (or any while the CPU is idle) use adaptive_long_model
+    "adaptive_long_model": "small",
+    "adaptive_idle_cpu_percent": 25,
+    "adaptive_backlog": 2,          # Waiting transcriptions that make it step down a model size
+    "model_cache_max_mb": 4096,     # Loaded models are kept until they use more memory than this
+    "vad": True,                 # Cut long pauses out before transcription (see vad.py)
+    "pytorch_quantize": False,    # int8 linear layers for the pytorch backend on CPU (see bench_quantization.py)
+    "torch_threads": None,        # torch intra-op threads; None = one per core
+    "torch_interop_threads": None,
+    "inference_priority": "low",  # "low": inference yields the CPU to the window and audio capture; or "normal"
+    "inference_cores": None,      # Pin inference to these cores, e.g. [1, 2, 3] (Linux only)
+    "warmup": True,               # Decode a second of silence after loading so the first dictation is fast
+    "model_cache_dir": "models",  # Downloaded and converted models are kept here
+    "cache": True,               # Reuse results for audio that was transcribed before
+    "cache_dir": "cache/transcriptions",
+    "cache_max_mb": 200,
+    "vocabulary_path": "vocabulary.txt",  # Drug names and phrases; None switches both uses off
+    "vocabulary_prompt": True,      # Pass the vocabulary to Whisper as its initial prompt
+    "vocabulary_correction": True,  # Fix near misses of drug names after decoding
+    "longform_min_seconds": 120,  # Recordings at least this long are decoded in parallel windows
+    "longform_workers": None,     # Model instances for that; None = half the cores (max 4), 1 = off
+    "microphone": None,           # Input device chosen in the sidebar ("host API/name"); None = system default
+    "device_poll_seconds": 5,     # Look for plugged-in or removed microphones this often; 0 = only at startup
+    "capture_rate": None,         # Input sample rate; None uses the device's default
+    "denoise": False,             # Spectral noise reduction with noisereduce before inference
+    "spool_dir": "cache/spool",   # Recordings are written here while recording, until transcribed
+    "metrics": None,              # Export spans and counters: None, "prometheus" or "jsonl"
+    "metrics_port": 9464,         # Prometheus endpoint on 127.0.0.1
+    "metrics_path": "logs/quickdoc_metrics.jsonl",
+    "archive_path": "prescriptions/archive.db",  # Searchable archive of every embedded prescription
+    "job_workers": 2,             # Background threads for transcription, documents and previews
+    "document_output": "native",  # native (python-docx/reportlab + OS spooler) or word (COM)
+    "printer": None,              # Printer name; None uses the system default
+    "server_url": "http://127.0.0.1:8765",  # Used by the remote backend (or unix:///path)
+}
+
+
+def load_config(path=CONFIG_PATH):
+    """Load the config file merged over the defaults."""
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                config.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Could not read config file {path}: {e}")
+    return config
+
+
+def update_config_file(changes, path=CONFIG_PATH):
+    """Persist `changes`, keeping whatever else the config file already contains."""
+    stored = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read config file {path}: {e}")
+    stored.update(changes)
+    save_config(stored, path)
+
+
+def save_config(config, path=CONFIG_PATH):
+    """Write the config file atomically."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp_path, path)
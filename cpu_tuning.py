@@ -0,0 +1,163 @@
+"""Keeping CPU inference from starving the UI and the audio callback.
+
+On a 4-core workstation Whisper takes every core it can get, and the Tk
+event loop and PortAudio's callback thread have to wait for a time slice:
+the window stutters and, worse, audio frames are dropped. Three settings
+help, all applied by the PyTorch backend:
+
+- thread counts: torch's intra-op threads (the threads one operation is
+  split across) per model instance, so parallel instances share the cores
+  instead of each taking all of them, and the inter-op pool once per process
+- priority: threads that run inference get a lower scheduling priority, so
+  they only use the CPU the UI and the audio thread leave over; on an idle
+  machine nothing gets slower
+- cores: on Linux, inference threads can be pinned to some of the cores, e.g.
+  all but core 0
+
+Priority and cores are set on a thread that only runs inference (see
+InferenceThread), before it runs any parallel work, because the pool threads
+torch starts from it inherit both on Linux. The job workers that hand it the
+work keep their normal priority for everything else they run, such as saving
+documents; an unprivileged thread could not raise its priority again once
+lowered. Windows threads do not inherit a thread priority, so there the
+process is lowered to "below normal" and the UI (main) thread raised above it
+instead; PortAudio raises its own callback thread either way. Pinning is only
+supported on Linux.
+"""
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future
+
+NICE_LOW = 10            # Linux nice level of inference threads with "low" priority
+INFERENCE_IDLE_SECONDS = 60  # An idle inference thread exits and is started again on the next call
+
+_process_tuned = False
+_process_lock = threading.Lock()
+_default_threads = None
+
+
+def configure_torch(interop_threads=None):
+    """Size torch's inter-op pool and return its default intra-op thread count (one per core)."""
+    global _default_threads
+    import torch
+
+    if _default_threads is None:
+        _default_threads = torch.get_num_threads()  # Before anything changed it
+    if interop_threads and torch.get_num_interop_threads() != interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # Only possible before the pool is first used, e.g. not for a second model
+            print(f"Could not set torch inter-op threads: {e}")
+    return _default_threads
+
+
+def use_threads(threads):
+    """Split the calling thread's torch operations over `threads` intra-op threads.
+
+    With OpenMP (the Linux and Windows builds) the count is kept per calling
+    thread, so instances decoding side by side each keep their own; it is set
+    before every call because the last thread to change it also sets the
+    default for threads that have not run torch yet.
+    """
+    import torch
+
+    if torch.get_num_threads() != threads:
+        torch.set_num_threads(threads)
+
+
+class InferenceThread:
+    """Runs one model instance's inference calls on a thread with the priority and core settings.
+
+    `run(fn, ...)` blocks until `fn` returned on that thread, so callers see
+    a plain call. With normal priority and no cores there is nothing to
+    apply, and `fn` runs on the calling thread.
+    """
+
+    def __init__(self, priority="low", cores=None):
+        self.priority = priority
+        self.cores = cores
+        self.calls = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def run(self, fn, *args, **kwargs):
+        if (self.priority != "low" and not self.cores) or threading.current_thread() is self.thread:
+            return fn(*args, **kwargs)
+        future = Future()
+        with self.lock:
+            self.calls.put((future, fn, args, kwargs))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._serve, name="quickdoc-inference", daemon=True)
+                self.thread.start()
+        return future.result()
+
+    def _serve(self):
+        tune_inference_thread(self.priority, self.cores)
+        while True:
+            try:
+                future, fn, args, kwargs = self.calls.get(timeout=INFERENCE_IDLE_SECONDS)
+            except queue.Empty:
+                with self.lock:
+                    if self.calls.empty():
+                        self.thread = None  # Also ends the thread of an instance nobody uses any more
+                        return
+                continue
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+def tune_inference_thread(priority="low", cores=None):
+    """Apply the priority and core settings to the calling thread, for good."""
+    if priority == "low":
+        try:
+            _lower_priority()
+        except Exception as e:  # OSError, or psutil.AccessDenied on Windows
+            print(f"Could not lower the inference priority: {e}")
+    if cores:
+        if not hasattr(os, "sched_setaffinity"):
+            print("Pinning inference to cores is only supported on Linux")
+            return
+        try:
+            os.sched_setaffinity(0, cores)  # 0 is the calling thread
+        except (OSError, ValueError) as e:
+            print(f"Could not pin inference to cores {cores}: {e}")
+
+
+def _lower_priority():
+    if sys.platform.startswith("linux"):
+        # The nice value is per thread on Linux; raising it needs no privileges
+        thread_id = threading.get_native_id()
+        os.setpriority(os.PRIO_PROCESS, thread_id, max(NICE_LOW, os.getpriority(os.PRIO_PROCESS, thread_id)))
+    elif sys.platform == "win32":
+        _lower_windows_process()
+    # macOS: priorities are per process there, which would slow the UI just as much
+
+
+def _lower_windows_process():
+    global _process_tuned
+    import ctypes
+
+    import psutil
+
+    with _process_lock:
+        if _process_tuned:
+            return
+        _process_tuned = True
+        psutil.Process().nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
+        kernel32 = ctypes.windll.kernel32
+        thread_set_information = 0x0020
+        thread_priority_above_normal = 1
+        handle = kernel32.OpenThread(thread_set_information, False, threading.main_thread().native_id)
+        if not handle:
+            raise ctypes.WinError()
+        try:
+            kernel32.SetThreadPriority(handle, thread_priority_above_normal)
+        finally:
+            kernel32.CloseHandle(handle)
@@ -0,0 +1,126 @@
+"""Microphone discovery in the background, with hot-plug detection.
+
+Querying PortAudio can take a noticeable moment (much longer on Windows with
+several host APIs), so devices are scanned on a background thread and the
+result is cached; starting a recording uses the cached device and does not
+query anything. PortAudio only sees devices that were plugged in or removed
+after it was initialized when it is initialized again, so the monitor
+re-initializes it every few seconds, but only while no stream is open.
+
+Devices are identified by host API and name (plus a counter for identical
+names), which stays the same when other devices come and go; the PortAudio
+index of a device can change with every scan.
+"""
+import threading
+from collections import Counter
+
+import sounddevice as sd
+
+POLL_SECONDS = 5.0
+
+
+class InputDevice:
+    """An input device as found by the last scan."""
+
+    __slots__ = ("id", "name", "label", "index", "hostapi", "default_samplerate", "is_default")
+
+    def __init__(self, device_id, name, label, index, hostapi, default_samplerate, is_default):
+        self.id = device_id          # Stable across scans, e.g. saved in the config file
+        self.name = name
+        self.label = label           # Unique name for the dropdown
+        self.index = index           # PortAudio device index, valid until the next re-initialization
+        self.hostapi = hostapi
+        self.default_samplerate = default_samplerate
+        self.is_default = is_default
+
+    def __eq__(self, other):
+        return isinstance(other, InputDevice) and (self.id, self.index) == (other.id, other.index)
+
+    def __hash__(self):
+        return hash((self.id, self.index))
+
+    def __repr__(self):
+        return f"InputDevice({self.id!r}, index={self.index})"
+
+
+def scan_input_devices():
+    """Query PortAudio for all input devices (blocking)."""
+    hostapis = [hostapi["name"] for hostapi in sd.query_hostapis()]
+    default_index = sd.default.device[0]
+    if default_index is None or default_index < 0:
+        try:
+            default_index = sd.query_devices(kind="input")["index"]
+        except sd.PortAudioError:
+            default_index = None
+
+    inputs = [device for device in sd.query_devices() if device["max_input_channels"] > 0]
+    # Number of host APIs listing each name
+    names = Counter(name for name, _ in {(device["name"], device["hostapi"]) for device in inputs})
+    occurrences = Counter()
+    devices = []
+    for device in inputs:
+        hostapi = hostapis[device["hostapi"]]
+        key = f"{hostapi}/{device['name']}"
+        occurrences[key] += 1
+        device_id = key if occurrences[key] == 1 else f"{key}#{occurrences[key]}"
+        # The same microphone shows up once per host API on Windows
+        label = device["name"] if names[device["name"]] == 1 else f"{device['name']} ({hostapi})"
+        if occurrences[key] > 1:
+            label += f" #{occurrences[key]}"
+        devices.append(InputDevice(device_id, device["name"], label, device["index"], hostapi,
+                                   device["default_samplerate"], device["index"] == default_index))
+    return devices
+
+
+def _reinitialize():
+    # sounddevice has no public call for this; it is how hot-plugged devices become visible
+    sd._terminate()
+    sd._initialize()
+
+
+class DeviceMonitor:
+    """Keeps `devices` up to date on a background thread and reports changes to `on_change(devices)`.
+
+    `lock` must be held by whoever opens or closes a stream, and `busy()`
+    must be true while a stream is open; PortAudio is never re-initialized
+    then. `devices` is replaced while the lock is held, so whoever holds it
+    sees the indexes that are valid right now.
+    """
+
+    def __init__(self, on_change, lock, busy, poll_seconds=POLL_SECONDS):
+        self.on_change = on_change
+        self.lock = lock
+        self.busy = busy
+        self.poll_seconds = poll_seconds
+        self.devices = None  # None until the first scan finished
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="quickdoc-devices", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        self.rescan(reinitialize=False)  # PortAudio was just initialized by the import
+        while self.poll_seconds and not self.stop_event.wait(self.poll_seconds):
+            self.rescan()
+
+    def rescan(self, reinitialize=True):
+        """Scan again and report the devices if they changed."""
+        with self.lock:
+            if self.busy():
+                return
+            try:
+                if reinitialize:
+                    _reinitialize()
+                devices = scan_input_devices()
+            except (sd.PortAudioError, OSError) as e:
+                print(f"Audio device scan failed: {e}")
+                return
+            changed = devices != self.devices
+            self.devices = devices
+        if changed:
+            self.on_change(devices)
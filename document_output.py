@@ -0,0 +1,204 @@
+"""Saving and printing prescriptions without starting MS Word per click.
+
+The native path writes .docx with python-docx (templates.py) and .pdf with
+reportlab, and prints by handing the PDF to the OS print spooler: `lp` on
+Linux/macOS, the shell "print" verb on Windows (from a temporary PDF that is
+deleted once the PDF viewer is done with it). The Word COM path is kept as
+an option for sites that need Word's layout, but the Word instance is started
+once and reused by the output worker instead of per request.
+"""
+import glob
+import io
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import telemetry
+
+PDF_MARGIN = 50
+PDF_FONT = "Helvetica"
+PDF_FONT_SIZE = 11
+PDF_LEADING = 15
+PRINT_FILE_PREFIX = "quickdoc_print_"
+PRINT_FILE_MAX_AGE_SECONDS = 600  # The PDF viewer has long sent a print job to the spooler by then
+
+
+def render_pdf(paragraphs, stream):
+    """Write paragraphs as a letter-size PDF with word wrapping into a binary stream."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import simpleSplit
+    from reportlab.pdfgen import canvas
+
+    width, height = letter
+    c = canvas.Canvas(stream, pagesize=letter)
+    c.setFont(PDF_FONT, PDF_FONT_SIZE)
+    y_position = height - PDF_MARGIN
+    for paragraph in paragraphs:
+        for part in paragraph.split("\n"):
+            lines = simpleSplit(part, PDF_FONT, PDF_FONT_SIZE, width - 2 * PDF_MARGIN) or [""]
+            for line in lines:
+                if y_position < PDF_MARGIN:  # Create a new page if reaching bottom
+                    c.showPage()
+                    c.setFont(PDF_FONT, PDF_FONT_SIZE)
+                    y_position = height - PDF_MARGIN
+                c.drawString(PDF_MARGIN, y_position, line)
+                y_position -= PDF_LEADING
+    c.save()
+
+
+def pdf_bytes(paragraphs):
+    stream = io.BytesIO()
+    render_pdf(paragraphs, stream)
+    return stream.getvalue()
+
+
+def remove_stale_print_files(max_age=PRINT_FILE_MAX_AGE_SECONDS):
+    """Delete temporary print PDFs older than `max_age` seconds, e.g. from an earlier run."""
+    cutoff = time.time() - max_age
+    for path in glob.glob(os.path.join(tempfile.gettempdir(), PRINT_FILE_PREFIX + "*.pdf")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass  # Still open in the PDF viewer, or already gone
+
+
+def spool_pdf(data, printer=None):
+    """Send PDF bytes to the OS print spooler."""
+    if sys.platform == "win32":
+        # The shell print verb needs a file and returns before the PDF viewer has read it,
+        # so the file is deleted by a later print or the next start instead of here
+        remove_stale_print_files()
+        fd, path = tempfile.mkstemp(suffix=".pdf", prefix=PRINT_FILE_PREFIX)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.startfile(path, "print")
+        return
+    command = ["lp"] + (["-d", printer] if printer else [])
+    # lp reads the document from stdin, so nothing touches the disk
+    subprocess.run(command, input=data, check=True, capture_output=True)
+
+
+class NativeOutput:
+    """python-docx/reportlab output and the OS print spooler."""
+
+    def __init__(self, printer=None):
+        self.printer = printer
+        if sys.platform == "win32":
+            remove_stale_print_files()  # Patient data must not pile up in %TEMP%
+
+    def save(self, path, paragraphs, render_docx):
+        if path.lower().endswith(".pdf"):
+            with open(path, "wb") as f:
+                render_pdf(paragraphs, f)
+        else:
+            render_docx(path)
+        return path
+
+    def print(self, paragraphs, render_docx):
+        spool_pdf(pdf_bytes(paragraphs), self.printer)
+
+    def close(self):
+        pass
+
+
+class WordOutput:
+    """MS Word via COM, started once and reused for every request."""
+
+    def __init__(self, printer=None):
+        self.printer = printer
+        self.word = None
+
+    def _word(self):
+        if self.word is None:
+            import pythoncom
+            import win32com.client  # For MS Word integration
+
+            pythoncom.CoInitialize()  # COM is per thread; this runs on the output worker
+            self.word = win32com.client.Dispatch("Word.Application")
+            self.word.Visible = False
+            if self.printer:
+                self.word.ActivePrinter = self.printer
+        return self.word
+
+    def save(self, path, paragraphs, render_docx):
+        if not path.lower().endswith(".pdf"):
+            return render_docx(path)
+        # Word converts from a .docx, which is not kept next to the PDF
+        fd, docx_path = tempfile.mkstemp(suffix=".docx", prefix="quickdoc_save_")
+        os.close(fd)
+        try:
+            doc = self._word().Documents.Open(os.path.abspath(render_docx(docx_path)))
+            doc.SaveAs(os.path.abspath(path), FileFormat=17)  # wdFormatPDF
+            doc.Close(False)
+        finally:
+            os.remove(docx_path)
+        return path
+
+    def print(self, paragraphs, render_docx):
+        fd, path = tempfile.mkstemp(suffix=".docx", prefix="quickdoc_print_")
+        os.close(fd)
+        try:
+            doc = self._word().Documents.Open(os.path.abspath(render_docx(path)))
+            doc.PrintOut(Background=False)
+            doc.Close(False)
+        finally:
+            os.remove(path)
+
+    def close(self):
+        if self.word is not None:
+            self.word.Quit()
+            self.word = None
+
+
+OUTPUTS = {"native": NativeOutput, "word": WordOutput}
+
+
+class OutputWorker:
+    """Long-lived thread that runs save/print requests off the UI thread.
+
+    Requests run one at a time on the same thread, so a Word instance (or any
+    other warmed-up state) is created once and reused.
+    """
+
+    def __init__(self, output):
+        self.output = output
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="quickdoc-output", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                self.output.close()
+                return
+            method, args, on_done = request
+            try:
+                with telemetry.span(f"document.{method}", output=type(self.output).__name__), telemetry.profiled():
+                    result, error = getattr(self.output, method)(*args), None
+            except Exception as e:
+                result, error = None, e
+            if on_done is not None:
+                on_done(result, error)
+
+    def save(self, path, paragraphs, render_docx, on_done=None):
+        self.requests.put(("save", (path, paragraphs, render_docx), on_done))
+
+    def print(self, paragraphs, render_docx, on_done=None):
+        self.requests.put(("print", (paragraphs, render_docx), on_done))
+
+    def close(self):
+        self.requests.put(None)
+
+
+def create_output_worker(kind="native", printer=None):
+    try:
+        output_class = OUTPUTS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown document output {kind!r}, expected one of: {', '.join(OUTPUTS)}")
+    return OutputWorker(output_class(printer))
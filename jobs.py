@@ -0,0 +1,132 @@
+"""Background job scheduler between the UI and the transcription/document work.
+
+A fixed pool of worker threads takes jobs from a priority queue, so a
+transcription is always started before a pending preview render. Jobs can be
+cancelled: a pending job is skipped, a running one is asked to stop via
+`job.cancelled` and its result is discarded. Status changes and progress
+reports are handed to `dispatch` (the Tk `after` in the app) so listeners
+always run on the UI thread.
+"""
+import itertools
+import queue
+import threading
+import time
+
+import telemetry
+
+PRIORITY_TRANSCRIPTION = 0
+PRIORITY_DOCUMENT = 1
+PRIORITY_PREVIEW = 2
+
+HISTORY_SIZE = 20  # Finished jobs kept for the job list
+
+
+class Job:
+    """A unit of work; `func(job)` runs on a worker thread."""
+
+    def __init__(self, job_id, name, func, priority, on_done, on_progress, listed, kind=None):
+        self.id = job_id
+        self.name = name
+        self.kind = kind         # What the result is, e.g. "transcription" for the job list's Open button
+        self.func = func
+        self.priority = priority
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.listed = listed
+        self.status = "pending"  # pending, running, done, failed, cancelled
+        self.progress = None     # 0..1 if the job reports it
+        self.message = ""
+        self.result = None
+        self.details = {}        # Extra information for on_done (e.g. which audio a transcription came from)
+        self.error = None
+        self.submitted_at = time.time()
+        self.scheduler = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def cancel(self):
+        """Skip the job if pending; a running job should check `cancelled`."""
+        self._cancel_event.set()
+
+    def report(self, progress=None, message=""):
+        """Report progress from the worker thread; delivered on the UI thread."""
+        self.progress = progress
+        self.message = message
+        self.scheduler._notify(self, progress=True)
+
+
+class JobScheduler:
+    """Bounded worker pool with job priorities, cancellation and UI-thread callbacks."""
+
+    def __init__(self, workers=2, dispatch=None):
+        self.dispatch = dispatch or (lambda func, *args: func(*args))
+        self.queue = queue.PriorityQueue()
+        self.counter = itertools.count(1)
+        self.lock = threading.Lock()
+        self.jobs = []       # Listed jobs, oldest first
+        self.listeners = []  # Called with a job whenever a listed job changes
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"quickdoc-job-{i + 1}", daemon=True).start()
+
+    def submit(self, name, func, priority=PRIORITY_DOCUMENT, on_done=None, on_progress=None, listed=True,
+               kind=None):
+        """Queue `func(job)`; `on_done(job)` runs on the UI thread once it finished."""
+        job = Job(next(self.counter), name, func, priority, on_done, on_progress, listed, kind)
+        job.scheduler = self
+        if listed:
+            with self.lock:
+                self.jobs.append(job)
+                # Forget the oldest finished jobs
+                finished = [j for j in self.jobs if j.finished]
+                for old in finished[:max(0, len(self.jobs) - HISTORY_SIZE)]:
+                    self.jobs.remove(old)
+        # The id breaks ties so equal priorities run first-in, first-out
+        self.queue.put((priority, job.id, job))
+        self._notify(job)
+        return job
+
+    def pending(self, priority=None):
+        """Jobs waiting to run, without cancelled ones; only those of `priority` if given."""
+        with self.queue.mutex:
+            return sum(1 for job_priority, _, job in self.queue.queue
+                       if not job.cancelled and (priority is None or job_priority == priority))
+
+    def _worker(self):
+        while True:
+            _, _, job = self.queue.get()
+            if job.cancelled:
+                job.status = "cancelled"
+                self._notify(job, done=True)
+                continue
+
+            job.status = "running"
+            self._notify(job)
+            try:
+                with telemetry.profiled():
+                    job.result = job.func(job)
+                job.status = "cancelled" if job.cancelled else "done"
+            except Exception as e:
+                job.error = e
+                job.status = "failed"
+                print(f"Job {job.name} failed: {e}")
+            self._notify(job, done=True)
+
+    def _notify(self, job, done=False, progress=False):
+        self.dispatch(self._deliver, job, done, progress)
+
+    def _deliver(self, job, done, progress):
+        # Runs on the UI thread
+        if progress and job.on_progress is not None:
+            job.on_progress(job)
+        if done and job.on_done is not None:
+            job.on_done(job)
+        if job.listed:
+            for listener in self.listeners:
+                listener(job)
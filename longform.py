@@ -0,0 +1,186 @@
+"""Parallel decoding of long dictations.
+
+`transcribe` works through a long recording one 30-second window after the
+other. Here the recording is cut into windows up front, at pauses found by
+the VAD where possible, and the windows are decoded at the same time by a
+small pool of model instances. Where no pause is found the cut falls on the
+quietest spot and the two windows overlap a little; after decoding, each
+window only keeps the words (or segments, for backends without word
+timestamps) whose midpoint lies between its two cuts, so the overlap is not
+transcribed twice.
+"""
+import itertools
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from vad import FRAME_SECONDS, frame_rms, speech_threshold
+from vocabulary import join_prompts
+
+WINDOW_SECONDS = 30.0      # Whisper's context length
+OVERLAP_SECONDS = 2.0      # Shared by two windows when a cut is not in a pause
+SEARCH_SECONDS = 10.0      # How far before the window end a pause is looked for
+SMOOTHING_SECONDS = 0.2    # Level smoothing when no pause is found
+MIN_PAUSE_SECONDS = 0.3    # Quiet stretches shorter than this may be inside a word
+SEAM_MAX_WORDS = 8         # Longest repeat removed at a seam without word timestamps
+
+
+def plan_windows(audio, sample_rate, window_seconds=WINDOW_SECONDS, overlap_seconds=OVERLAP_SECONDS,
+                 search_seconds=SEARCH_SECONDS):
+    """Cut `audio` into windows of at most `window_seconds`.
+
+    Returns a list of (start, end, own_start, own_end) sample indices: the
+    window that is decoded and the part of it whose words it keeps.
+    """
+    total = len(audio)
+    window = int(window_seconds * sample_rate)
+    if total <= window:
+        return [(0, total, 0, total)]
+
+    half_overlap = int(overlap_seconds * sample_rate / 2)
+    search = int(search_seconds * sample_rate)
+    frame = int(sample_rate * FRAME_SECONDS)
+    levels = frame_rms(audio, frame)
+    width = max(1, int(round(SMOOTHING_SECONDS / FRAME_SECONDS)))
+    smoothed = np.convolve(levels, np.ones(width) / width, mode="same")
+    level_db = 20 * np.log10(levels + 1e-10)
+    pause = level_db <= speech_threshold(level_db)
+    min_pause = int(round(MIN_PAUSE_SECONDS / FRAME_SECONDS))
+
+    windows = []
+    start = own_start = 0
+    while total - start > window:
+        # Leave room for an overlap after the cut, and do not cut before half a window
+        last = (start + window - half_overlap) // frame
+        first = max(last - search // frame, (start + window // 2) // frame)
+        edges = np.diff(np.concatenate(([0], pause[first:last].astype(np.int8), [0])))
+        run_starts, run_ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        long_runs = np.flatnonzero(run_ends - run_starts >= min_pause)
+        if len(long_runs):
+            # The middle of the last pause in range; nothing is said there, so no overlap
+            run = long_runs[-1]
+            cut = (first + (run_starts[run] + run_ends[run]) // 2) * frame
+            overlap = 0
+        else:
+            cut = (first + int(np.argmin(smoothed[first:last]))) * frame
+            overlap = half_overlap
+        windows.append((start, min(cut + overlap, total), own_start, cut))
+        start, own_start = cut - overlap, cut
+    windows.append((start, total, own_start, total))
+    return windows
+
+
+def _words(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def _drop_repeat(previous_text, text):
+    """Remove the start of `text` if it repeats the end of `previous_text`."""
+    previous, current = _words(previous_text), _words(text)
+    for n in range(min(SEAM_MAX_WORDS, len(previous), len(current)), 0, -1):
+        if previous[-n:] == current[:n]:
+            # Skip past the n-th repeated word in the original text
+            match = list(itertools.islice(re.finditer(r"\w+", text), n))[-1]
+            return text[match.end():]
+    return text
+
+
+def stitch(windows, results, sample_rate):
+    """Merge per-window results into one whisper-style result in recording time."""
+    segments = []
+    for (start, end, own_start, own_end), result in zip(windows, results):
+        offset = start / sample_rate
+        low, high = own_start / sample_rate, own_end / sample_rate
+        overlapped = start < own_start
+        first_in_window = True
+        for segment in result.get("segments", []):
+            words = segment.get("words")
+            if words:
+                kept = []
+                for word in words:
+                    word_start, word_end = float(word["start"]) + offset, float(word["end"]) + offset
+                    if low <= (word_start + word_end) / 2 < high:
+                        kept.append(dict(word, start=word_start, end=word_end))
+                if not kept:
+                    continue
+                segment = {"start": kept[0]["start"], "end": kept[-1]["end"],
+                           "text": "".join(word["word"] for word in kept), "words": kept}
+            else:
+                segment_start, segment_end = float(segment["start"]) + offset, float(segment["end"]) + offset
+                if not low <= (segment_start + segment_end) / 2 < high:
+                    continue
+                segment = {"start": segment_start, "end": segment_end, "text": segment["text"]}
+                if overlapped and first_in_window and segments:
+                    # Without word times a segment may still repeat the end of the previous window
+                    segment["text"] = _drop_repeat(segments[-1]["text"], segment["text"])
+            first_in_window = False
+            segments.append(segment)
+
+    for i, segment in enumerate(segments):
+        segment["id"] = i
+    language = next((result.get("language") for result in results if result.get("language")), None)
+    return {"text": "".join(segment["text"] for segment in segments).strip(),
+            "segments": segments, "language": language}
+
+
+class LongFormTranscriber:
+    """Decodes the windows of a long recording in parallel on a pool of model instances.
+
+    Whisper models are not safe to share between threads, so every worker gets
+    its own instance from `backend_factory`; they are created on first use and
+    kept for later dictations.
+    """
+
+    def __init__(self, backend_factory, workers):
+        self.backend_factory = backend_factory
+        self.workers = workers
+        self.idle = queue.Queue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            create = self.created < self.workers
+            if create:
+                self.created += 1
+        if not create:
+            return self.idle.get()
+        try:
+            return self.backend_factory()
+        except BaseException:
+            with self.lock:
+                self.created -= 1
+            raise
+
+    def _decode(self, audio, index, language, initial_prompt, shared_prompt, options):
+        backend = self._acquire()
+        try:
+            if getattr(backend, "word_timestamps", False):
+                options = dict(options, word_timestamps=True)
+            # Windows run at the same time, so only the first one can continue from the prompt
+            prompt = join_prompts(shared_prompt, initial_prompt if index == 0 else None)
+            return backend.transcribe(audio, language=language, initial_prompt=prompt, **options)
+        finally:
+            self.idle.put(backend)
+
+    def transcribe(self, audio, sample_rate, language=None, initial_prompt=None, shared_prompt=None, **options):
+        """Transcribe `audio` window by window in parallel; same result shape as `transcribe`.
+
+        `shared_prompt` (e.g. the vocabulary) is given to every window, `initial_prompt` only to the first.
+        """
+        windows = plan_windows(audio, sample_rate)
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(windows))) as executor:
+            futures = [
+                executor.submit(self._decode, audio[start:end], i, language, initial_prompt, shared_prompt, options)
+                for i, (start, end, _, _) in enumerate(windows)
+            ]
+            results = [future.result() for future in futures]
+        print(f"Long-form: {len(audio) / sample_rate:.0f} s in {len(windows)} windows on {self.workers} workers")
+        return stitch(windows, results, sample_rate)
@@ -0,0 +1,149 @@
+"""Choosing and keeping Whisper models.
+
+`choose_model` picks the model size for a dictation: with "model_mode":
+"adaptive" short notes go to a small, fast model, long dictations (or any
+dictation while the CPU is idle) to a larger one, and when transcriptions
+queue up the choice steps down a size so the backlog clears. `ModelCache`
+keeps every model that was loaded so switching back is instant, and evicts
+the least recently used ones once their resident memory exceeds the limit.
+Extra instances for parallel decoding of long dictations are counted against
+the same limit.
+"""
+import gc
+import threading
+from collections import OrderedDict
+
+import psutil
+
+MODEL_SIZES = ["tiny", "base", "small", "medium", "large-v3"]
+LANGUAGES = ["de", "en", "fr", "it", "es", "nl", "pl", "tr", "auto"]
+
+# Resident size of the fp32 weights, used when the measured growth is not meaningful
+MODEL_MEMORY_MB = {"tiny": 160, "base": 300, "small": 980, "medium": 3100, "large-v3": 6200}
+DEFAULT_MEMORY_MB = 1000
+
+
+def model_memory_mb(name):
+    """Estimated resident size of a model."""
+    return MODEL_MEMORY_MB.get(name.removesuffix(".en"), DEFAULT_MEMORY_MB)
+
+
+def smaller_model(name):
+    """The next smaller size, or `name` itself if there is none."""
+    base = name.removesuffix(".en")
+    if base not in MODEL_SIZES or MODEL_SIZES.index(base) == 0:
+        return name
+    return MODEL_SIZES[MODEL_SIZES.index(base) - 1] + name[len(base):]
+
+
+def choose_model(config, audio_seconds, pending_jobs=0, cpu_percent=None):
+    """Return (model name, reason) for a dictation of `audio_seconds`.
+
+    `audio_seconds` is None for live transcription, where the length is not
+    known yet when the model has to be chosen.
+    """
+    if config["model_mode"] != "adaptive":
+        return config["model"], "fixed"
+
+    if audio_seconds is not None and audio_seconds <= config["adaptive_short_seconds"]:
+        name, reason = config["adaptive_short_model"], "short note"
+    elif audio_seconds is not None and audio_seconds >= config["adaptive_long_seconds"]:
+        name, reason = config["adaptive_long_model"], "long dictation"
+    elif cpu_percent is not None and cpu_percent <= config["adaptive_idle_cpu_percent"]:
+        name, reason = config["adaptive_long_model"], "CPU idle"
+    else:
+        name, reason = config["model"], "default"
+
+    if pending_jobs >= config["adaptive_backlog"]:
+        # Trade accuracy for catching up with the queue
+        name, reason = smaller_model(name), f"{pending_jobs} transcriptions waiting"
+    return name, reason
+
+
+class ModelCache:
+    """Loaded backends by model name, evicted least recently used above `max_mb`."""
+
+    def __init__(self, factory, max_mb):
+        self.factory = factory  # name -> loaded backend
+        self.max_mb = max_mb
+        self.lock = threading.Lock()
+        self.models = OrderedDict()  # name -> (backend, resident MB), most recently used last
+        self.loading = {}            # name -> Event while another thread loads it
+        self.instances = []          # (name, resident MB) of uncached extra instances
+
+    def get(self, name, keep=()):
+        """Return the backend for `name`, loading it on first use.
+
+        Models in `keep` (e.g. the configured default) are never evicted.
+        """
+        while True:
+            with self.lock:
+                if name in self.models:
+                    self.models.move_to_end(name)
+                    return self.models[name][0]
+                event = self.loading.get(name)
+                if event is None:
+                    event = self.loading[name] = threading.Event()
+                    break
+            event.wait()  # Loaded (or failed) by another thread; look again
+
+        try:
+            backend, size_mb = self._load(name)
+            with self.lock:
+                self.models[name] = (backend, size_mb)
+                self._evict(keep=set(keep) | {name})
+            return backend
+        finally:
+            with self.lock:
+                self.loading.pop(name).set()
+
+    def _load(self, name, **options):
+        rss_before = psutil.Process().memory_info().rss
+        backend = self.factory(name, **options)
+        grown_mb = (psutil.Process().memory_info().rss - rss_before) / 2 ** 20
+        # Memory-mapped weights are only resident once touched, so never count less than the weights
+        return backend, max(grown_mb, model_memory_mb(name))
+
+    def instances_that_fit(self, name, keep=()):
+        """How many extra instances of `name` fit under the limit next to the models in `keep`."""
+        with self.lock:
+            used = sum(size for _, size in self.instances)
+            used += sum(size for cached, (_, size) in self.models.items() if cached in keep)
+        return max(0, int((self.max_mb - used) // model_memory_mb(name)))
+
+    def load_instance(self, name, keep=(), **options):
+        """Load a separate, uncached instance of `name`, e.g. for parallel decoding.
+
+        It counts against the limit until `release_instances(name)`; cached
+        models not in `keep` are evicted to make room. `options` go to the factory.
+        """
+        backend, size_mb = self._load(name, **options)
+        with self.lock:
+            self.instances.append((name, size_mb))
+            self._evict(keep=set(keep))
+        return backend
+
+    def release_instances(self, name):
+        """Stop counting the extra instances of `name` (their owner dropped them)."""
+        with self.lock:
+            self.instances = [(instance, size) for instance, size in self.instances if instance != name]
+
+    def _evict(self, keep):
+        # Called with the lock held
+        total = sum(size for _, size in self.models.values()) + sum(size for _, size in self.instances)
+        evicted = False
+        for name in list(self.models):
+            if total <= self.max_mb:
+                break
+            if name in keep:
+                continue
+            _, size = self.models.pop(name)
+            total -= size
+            evicted = True
+            print(f"Unloaded model '{name}' ({size:.0f} MB) to stay under {self.max_mb} MB")
+        if evicted:
+            gc.collect()  # Running transcriptions keep their own reference until they finish
+
+    def resident_mb(self):
+        with self.lock:
+            return {name: round(size) for name, (_, size) in self.models.items()}
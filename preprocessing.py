@@ -0,0 +1,186 @@
+"""Audio preprocessing between the sound card and the model.
+
+Audio is captured at the device's native rate (many USB headsets refuse
+16 kHz or resample it badly) and brought to the model rate here. The pipeline
+runs chunk by chunk in the capture callback, with its state carried from one
+chunk to the next, so its output matches processing the whole recording at once:
+
+1. DC removal: a one-pole high-pass (DC blocker) via scipy's lfilter.
+2. Polyphase resampling: the same Kaiser-windowed FIR as
+   scipy.signal.resample_poly, evaluated as a gather plus one dot product per
+   output sample.
+
+Gain normalization and the optional spectral noise reduction (noisereduce)
+need the whole take or window and are applied when it is handed to the model.
+"""
+from fractions import Fraction
+
+import numpy as np
+
+TARGET_RATE = 16000
+DC_BLOCKER_POLE = 0.995  # About 13 Hz cut-off at 16 kHz
+RESAMPLE_HALF_LEN = 10   # Filter half length in units of max(up, down), as resample_poly
+RESAMPLE_WINDOW = ("kaiser", 5.0)
+NORMALIZE_PEAK = 0.95
+NORMALIZE_MAX_GAIN = 30.0  # Do not blow up near-silent takes (about +30 dB)
+SILENCE_PEAK = 1e-4        # Below this the input is treated as silence and left alone
+
+
+def normalize(audio, peak=NORMALIZE_PEAK, max_gain=NORMALIZE_MAX_GAIN, in_place=False):
+    """Scale audio to `peak`, with limited gain and without dividing by zero on silence."""
+    audio = np.asarray(audio, dtype=np.float32)
+    current = float(np.max(np.abs(audio))) if len(audio) else 0.0
+    if current < SILENCE_PEAK:
+        return audio
+    gain = np.float32(min(peak / current, max_gain))
+    if in_place:
+        audio *= gain
+        return audio
+    return audio * gain
+
+
+def denoise(audio, sample_rate=TARGET_RATE):
+    """Stationary spectral noise reduction; returns the input if noisereduce is missing."""
+    try:
+        import noisereduce
+    except ImportError:
+        print("noisereduce is not installed; skipping noise reduction")
+        return audio
+    return noisereduce.reduce_noise(y=audio, sr=sample_rate, stationary=True).astype(np.float32)
+
+
+class StreamingResampler:
+    """Polyphase FIR resampler that keeps its filter history between chunks.
+
+    Output sample m is sum_n x[n] * h[m * down + half_len - n * up], the same
+    alignment resample_poly uses, so the concatenated chunks equal resampling
+    the whole signal at once (up to float rounding).
+    """
+
+    def __init__(self, input_rate, output_rate=TARGET_RATE):
+        from scipy.signal import firwin
+
+        ratio = Fraction(int(output_rate), int(input_rate))
+        self.up, self.down = ratio.numerator, ratio.denominator
+        if self.passthrough:
+            return
+        max_rate = max(self.up, self.down)
+        self.half_len = RESAMPLE_HALF_LEN * max_rate
+        h = firwin(2 * self.half_len + 1, 1.0 / max_rate, window=RESAMPLE_WINDOW) * self.up
+
+        # Phase p uses taps h[p], h[p + up], ...; stored reversed so each output
+        # is a dot product with a contiguous, time-ordered slice of the input
+        self.taps = -(-len(h) // self.up)
+        phases = np.zeros((self.up, self.taps))
+        for p in range(self.up):
+            k = h[p::self.up]
+            phases[p, :len(k)] = k
+        self.phases = np.ascontiguousarray(phases[:, ::-1], dtype=np.float32)
+        self.reset()
+
+    @property
+    def passthrough(self):
+        return self.up == self.down
+
+    def reset(self):
+        # Zeros stand in for the samples before the first chunk
+        self.history = np.zeros(self.taps - 1, dtype=np.float32)
+        self.base = -(self.taps - 1)  # Input index of history[0]
+        self.consumed = 0             # Input samples seen so far
+        self.produced = 0             # Output samples emitted so far
+
+    def _emit(self, data, last_output):
+        """Outputs produced .. last_output - 1 from `data`, which starts at input index self.base."""
+        m = np.arange(self.produced, last_output, dtype=np.int64)
+        if not len(m):
+            return np.zeros(0, dtype=np.float32)
+        position = m * self.down + self.half_len
+        newest = position // self.up                   # Newest input sample each output needs
+        phase = position - newest * self.up
+        start = newest - (self.taps - 1) - self.base   # Window of each output in `data`
+        windows = np.lib.stride_tricks.sliding_window_view(data, self.taps)
+        self.produced = last_output
+        if len(m) < 4 * self.up:
+            # Few outputs per phase (e.g. 44.1 kHz in small blocks): one gather for all
+            return np.einsum("ij,ij->i", windows[start], self.phases[phase]).astype(np.float32, copy=False)
+
+        # Every up-th output shares a phase and its windows are `down` samples
+        # apart, so each phase is one matrix-vector product over a strided view
+        out = np.empty(len(m), dtype=np.float32)
+        for i in range(self.up):
+            rows = windows[start[i]::self.down][:len(out[i::self.up])]
+            out[i::self.up] = rows @ self.phases[phase[i]]
+        return out
+
+    def process(self, chunk):
+        """Resample the next chunk; outputs wait until their filter support has arrived."""
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if self.passthrough:
+            return chunk
+        data = np.concatenate((self.history, chunk))
+        self.consumed += len(chunk)
+        # Output m is ready once input (m * down + half_len) // up has arrived
+        ready = max(0, (self.consumed * self.up - 1 - self.half_len) // self.down + 1)
+        out = self._emit(data, ready)
+
+        # Keep what the next outputs can still reach
+        keep_from = (self.produced * self.down + self.half_len) // self.up - (self.taps - 1)
+        keep_from = min(max(keep_from, self.base), self.consumed)
+        self.history = data[keep_from - self.base:].copy()
+        self.base = keep_from
+        return out
+
+    def flush(self):
+        """Emit the outputs still held back, treating the input after the end as zeros."""
+        if self.passthrough:
+            return np.zeros(0, dtype=np.float32)
+        total = -(-self.consumed * self.up // self.down)  # Same length as resample_poly
+        if total <= self.produced:
+            return np.zeros(0, dtype=np.float32)
+        needed = (total - 1) * self.down + self.half_len
+        padding = np.zeros(max(0, needed // self.up + 1 - self.consumed), dtype=np.float32)
+        out = self._emit(np.concatenate((self.history, padding)), total)
+        self.reset()
+        return out
+
+
+class AudioPreprocessor:
+    """Chunk-by-chunk DC removal and resampling of captured audio to the model rate."""
+
+    def __init__(self, input_rate, output_rate=TARGET_RATE, remove_dc=True):
+        from scipy.signal import lfilter_zi
+
+        self.input_rate = int(input_rate)
+        self.output_rate = int(output_rate)
+        self.remove_dc = remove_dc
+        self.dc_b = np.array([1.0, -1.0], dtype=np.float32)
+        self.dc_a = np.array([1.0, -DC_BLOCKER_POLE], dtype=np.float32)
+        self.dc_zi_unit = lfilter_zi(self.dc_b, self.dc_a).astype(np.float32)
+        self.dc_zi = None
+        self.resampler = StreamingResampler(self.input_rate, self.output_rate)
+
+    def process(self, chunk):
+        """Preprocess the next captured chunk; safe to call from the audio callback."""
+        from scipy.signal import lfilter
+
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if self.remove_dc and len(chunk):
+            if self.dc_zi is None:
+                # Start in steady state for the first sample so the offset does not ring in
+                self.dc_zi = self.dc_zi_unit * chunk[0]
+            chunk, self.dc_zi = lfilter(self.dc_b, self.dc_a, chunk, zi=self.dc_zi)
+            chunk = chunk.astype(np.float32, copy=False)
+        return self.resampler.process(chunk)
+
+    def flush(self):
+        """Remaining resampled samples at the end of a recording."""
+        self.dc_zi = None
+        return self.resampler.flush()
+
+    def run(self, audio, chunk_size=None):
+        """Preprocess a whole recording, optionally in chunks of `chunk_size` input samples."""
+        audio = np.asarray(audio, dtype=np.float32)
+        chunk_size = chunk_size or len(audio) or 1
+        parts = [self.process(audio[i:i + chunk_size]) for i in range(0, len(audio), chunk_size)]
+        parts.append(self.flush())
+        return np.concatenate(parts)
@@ -0,0 +1,116 @@
+"""In-memory page preview of the prescription.
+
+Draws the prescription text straight into a PIL image that the UI shows via
+CTkImage; there is no PDF or PNG round-trip through the disk. Wrapped lines
+are cached per paragraph and only the lines from the first change downwards
+are redrawn, so appending dictated text touches just the bottom of the page.
+"""
+from itertools import takewhile
+
+from PIL import Image, ImageDraw, ImageFont
+
+PAGE_SIZE = (612, 792)  # US Letter at 72 dpi, like the former reportlab PDF
+MARGIN = 50
+FONT_SIZE = 11
+LINE_SPACING = 1.4
+FONT_NAMES = ("arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf")
+WRAP_CACHE_SIZE = 512
+
+
+def load_font(size):
+    """The first available TrueType font, or Pillow's built-in one."""
+    for name in FONT_NAMES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+class PreviewRenderer:
+    """Incrementally renders paragraphs onto a single page image."""
+
+    def __init__(self, page_size=PAGE_SIZE, margin=MARGIN, font_size=FONT_SIZE):
+        self.page_size = page_size
+        self.margin = margin
+        self.font = load_font(font_size)
+        self.line_height = int(font_size * LINE_SPACING)
+        self.max_width = page_size[0] - 2 * margin
+        self.max_lines = (page_size[1] - 2 * margin) // self.line_height
+        self.image = Image.new("RGB", page_size, "white")
+        self.draw = ImageDraw.Draw(self.image)
+        self.space_width = self.font.getlength(" ")
+        self.lines = []        # Lines currently drawn on the page
+        self.version = 0       # Counts the renders that changed the page
+        self.wrap_cache = {}   # Paragraph text -> wrapped lines
+        self.word_widths = {}  # Word -> rendered width
+
+    def wrap(self, paragraph):
+        """Greedy word wrap of one paragraph to the page width."""
+        lines = self.wrap_cache.get(paragraph)
+        if lines is not None:
+            return lines
+
+        lines = []
+        line = []
+        line_width = 0
+        for word in paragraph.split(" "):
+            # Summing cached word widths avoids re-measuring the growing line
+            width = self.word_widths.get(word)
+            if width is None:
+                width = self.word_widths[word] = self.font.getlength(word)
+            if not line or line_width + self.space_width + width <= self.max_width:
+                line_width += (self.space_width if line else 0) + width
+                line.append(word)
+                if line_width <= self.max_width:
+                    continue
+            else:
+                lines.append(" ".join(line))
+                line, line_width = [word], width
+                if width <= self.max_width:
+                    continue
+            # A single word wider than the page is broken up by characters
+            word = line.pop()
+            if line:
+                lines.append(" ".join(line))
+            while self.font.getlength(word) > self.max_width and len(word) > 1:
+                cut = len(word) - 1
+                while cut > 1 and self.font.getlength(word[:cut]) > self.max_width:
+                    cut -= 1
+                lines.append(word[:cut])
+                word = word[cut:]
+            line, line_width = [word], self.font.getlength(word)
+        lines.append(" ".join(line))
+
+        if len(self.wrap_cache) >= WRAP_CACHE_SIZE:
+            self.wrap_cache.clear()
+        if len(self.word_widths) >= WRAP_CACHE_SIZE * 16:
+            self.word_widths.clear()
+        self.wrap_cache[paragraph] = lines
+        return lines
+
+    def layout(self, paragraphs):
+        lines = []
+        for paragraph in paragraphs:
+            for part in paragraph.split("\n"):
+                lines.extend(self.wrap(part))
+        if len(lines) > self.max_lines:
+            lines = lines[:self.max_lines - 1] + ["…"]
+        return lines
+
+    def render(self, paragraphs):
+        """Bring the page up to date; returns the redrawn (x0, y0, x1, y1) box or None."""
+        lines = self.layout(paragraphs)
+        first = sum(1 for _ in takewhile(lambda pair: pair[0] == pair[1], zip(lines, self.lines)))
+        if first == len(lines) == len(self.lines):
+            return None
+
+        top = self.margin + first * self.line_height
+        bottom = self.margin + max(len(lines), len(self.lines)) * self.line_height
+        box = (0, top, self.page_size[0], min(bottom, self.page_size[1]))
+        self.draw.rectangle(box, fill="white")
+        for i in range(first, len(lines)):
+            self.draw.text((self.margin, self.margin + i * self.line_height), lines[i], fill="black", font=self.font)
+        self.lines = lines
+        self.version += 1
+        return box
@@ -0,0 +1,232 @@
+"""Local transcription server holding a single shared model.
+
+    python app.py serve [--host 127.0.0.1] [--port 8765] [--unix /tmp/quickdoc.sock]
+
+Workstations configured with the "remote" backend send their audio here
+instead of each loading their own copy of the model. Requests that arrive
+within a few milliseconds of each other are decoded together in one batched
+decoder pass.
+
+API:
+    POST /transcribe?language=de&prompt=...  body: little-endian float32 PCM, 16 kHz mono
+    GET  /metrics                             queue depth, batch sizes and latencies
+    GET  /health                              backend and model name
+"""
+import collections
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+MAX_BATCH_SIZE = 8
+MAX_BATCH_WAIT_MS = 50
+LATENCY_WINDOW = 1000  # Number of recent requests the latency percentiles cover
+
+
+class TranscriptionRequest:
+    def __init__(self, audio, language, initial_prompt):
+        self.audio = audio
+        self.language = language
+        self.initial_prompt = initial_prompt
+        self.received_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Collect concurrent requests and run them through the backend in batches."""
+
+    def __init__(self, backend, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.requests_total = 0
+        self.errors_total = 0
+        self.batches_total = 0
+        self.batched_requests_total = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.inference_times = collections.deque(maxlen=LATENCY_WINDOW)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, audio, language=None, initial_prompt=None):
+        """Queue a request and block until its batch has been decoded."""
+        request = TranscriptionRequest(audio, language, initial_prompt)
+        self.requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            with self.lock:
+                self.in_flight = len(batch)
+
+            # Requests can only share a decoder pass if they share the decoding options
+            groups = collections.defaultdict(list)
+            for request in batch:
+                groups[(request.language, request.initial_prompt)].append(request)
+
+            for (language, initial_prompt), requests in groups.items():
+                started_at = time.perf_counter()
+                try:
+                    results = self.backend.transcribe_batch(
+                        [request.audio for request in requests],
+                        language=language,
+                        initial_prompt=initial_prompt
+                    )
+                    for request, result in zip(requests, results):
+                        request.result = result
+                except Exception as e:
+                    for request in requests:
+                        request.error = e
+                finished_at = time.perf_counter()
+
+                with self.lock:
+                    self.batches_total += 1
+                    self.batched_requests_total += len(requests)
+                    self.inference_times.append(finished_at - started_at)
+                    for request in requests:
+                        self.requests_total += 1
+                        self.errors_total += request.error is not None
+                        self.latencies.append(finished_at - request.received_at)
+                for request in requests:
+                    request.done.set()
+
+            with self.lock:
+                self.in_flight = 0
+
+    def metrics(self):
+        """Return queue depth, batch and latency statistics as a dict."""
+        def percentiles(values):
+            if not values:
+                return {"p50": None, "p95": None, "max": None}
+            p50, p95 = np.percentile(values, [50, 95]) * 1000
+            return {"p50": round(p50, 1), "p95": round(p95, 1), "max": round(max(values) * 1000, 1)}
+
+        with self.lock:
+            return {
+                "queue_depth": self.requests.qsize(),
+                "in_flight": self.in_flight,
+                "requests_total": self.requests_total,
+                "errors_total": self.errors_total,
+                "batches_total": self.batches_total,
+                "mean_batch_size": round(self.batched_requests_total / self.batches_total, 2) if self.batches_total else None,
+                "latency_ms": percentiles(list(self.latencies)),
+                "inference_ms": percentiles(list(self.inference_times))
+            }
+
+
+class TranscriptionHandler(BaseHTTPRequestHandler):
+    server_version = "QuickDoc"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send_json(200, self.server.batcher.metrics())
+        elif self.path == "/health":
+            backend = self.server.batcher.backend
+            self._send_json(200, {"status": "ok", "backend": backend.name, "model": backend.model_name})
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != "/transcribe":
+            self._send_json(404, {"error": f"unknown path {url.path}"})
+            return
+
+        query = dict(urllib.parse.parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length", 0))
+        if length == 0 or length % 4:
+            self._send_json(400, {"error": "body must be float32 PCM samples"})
+            return
+        audio = np.frombuffer(self.rfile.read(length), dtype="<f4").astype(np.float32)
+
+        try:
+            result = self.server.batcher.submit(audio, query.get("language"), query.get("prompt"))
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, {
+            "text": result.get("text", ""),
+            "segments": [
+                {key: segment[key] for key in ("id", "start", "end", "text") if key in segment}
+                for segment in result.get("segments", [])
+            ],
+            "language": result.get("language")
+        })
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) address
+        return self.client_address[0] if self.client_address else "unix"
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)  # Left over from a previous run
+        super().server_bind()
+
+
+def create_server(backend, host="127.0.0.1", port=8765, unix_socket=None,
+                  max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS):
+    """Create (but do not start serving) a server around a loaded backend."""
+    if unix_socket:
+        server = UnixHTTPServer(unix_socket, TranscriptionHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), TranscriptionHandler)
+    server.batcher = MicroBatcher(backend, max_batch_size, max_wait_ms).start()
+    return server
+
+
+def serve(backend, host="127.0.0.1", port=8765, unix_socket=None,
+          max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS):
+    """Serve transcriptions until interrupted."""
+    server = create_server(backend, host, port, unix_socket, max_batch_size, max_wait_ms)
+    print(f"Serving {backend.name} '{backend.model_name}' on {unix_socket or f'http://{host}:{port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.remove(unix_socket)
@@ -0,0 +1,142 @@
+"""On-disk spool of the audio being recorded.
+
+While recording, the captured (16 kHz, preprocessed) audio is appended to a
+spool file a few times a second instead of piling up in memory, so a long
+dictation needs no more RAM than a short one and a crash loses at most the
+last fraction of a second. The file is a 24-byte header followed by
+little-endian float16 samples (2 bytes per sample, about 1.9 MB per minute);
+there is no length field to update, so a file cut short by a crash is still
+valid. Transcription reads it back through a memory map.
+
+Spool files are deleted once their recording has been transcribed. Any left
+over at the next launch belong to a recording that was never transcribed and
+are offered for recovery.
+"""
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+
+import numpy as np
+import psutil
+
+MAGIC = b"QDSPOOL1"
+HEADER = struct.Struct("<8sId4x")  # magic, sample rate, recording start (Unix time)
+EXTENSION = ".qdspool"
+SAMPLE_DTYPE = np.dtype("<f2")
+FSYNC_SECONDS = 5.0  # Also survive a power cut, not only a crash, within this
+
+
+class SpoolWriter:
+    """Appends mono float32 audio to a new spool file in `directory`."""
+
+    def __init__(self, directory, sample_rate):
+        os.makedirs(directory, exist_ok=True)
+        self.started_at = time.time()
+        stamp = datetime.fromtimestamp(self.started_at).strftime("%Y%m%d_%H%M%S")
+        # The pid tells a recording in progress in another instance from an abandoned one
+        self.path = os.path.join(directory, f"recording_{stamp}_{os.getpid()}{EXTENSION}")
+        self.sample_rate = sample_rate
+        self.file = open(self.path, "wb")
+        self.file.write(HEADER.pack(MAGIC, sample_rate, self.started_at))
+        self.file.flush()
+        self.synced_at = time.monotonic()
+        self.error = None
+        self.overflow = []  # Audio kept in memory after a write error (e.g. disk full)
+
+    def write(self, views):
+        """Append frames (a list of arrays) and hand them to the OS."""
+        if self.error is not None:
+            self.overflow.extend(np.array(view, dtype=np.float32) for view in views)
+            return
+        try:
+            for view in views:
+                self.file.write(view.astype(SAMPLE_DTYPE).tobytes())
+            self.file.flush()
+            if time.monotonic() - self.synced_at >= FSYNC_SECONDS:
+                os.fsync(self.file.fileno())
+                self.synced_at = time.monotonic()
+        except OSError as e:
+            print(f"Audio spool write error, keeping the rest of the recording in memory: {e}")
+            self.error = e
+            self.overflow.extend(np.array(view, dtype=np.float32) for view in views)
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except OSError as e:
+            print(f"Audio spool error: {e}")
+        self.file.close()
+
+    def read(self):
+        """The whole recording as float32, read back from the file (plus anything kept in memory)."""
+        self.close()
+        audio, _, _ = read_spool(self.path)
+        if self.overflow:
+            audio = np.concatenate([audio] + self.overflow)
+        return audio
+
+
+def read_spool(path):
+    """Return (float32 audio, sample rate, start time) of a spool file."""
+    with open(path, "rb") as f:
+        magic, sample_rate, started_at = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an audio spool file")
+        # A torn last sample is ignored
+        frames = (os.fstat(f.fileno()).st_size - HEADER.size) // SAMPLE_DTYPE.itemsize
+        if frames <= 0:
+            return np.zeros(0, dtype=np.float32), sample_rate, started_at
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            samples = np.frombuffer(mapped, dtype=SAMPLE_DTYPE, count=frames, offset=HEADER.size)
+            audio = samples.astype(np.float32)
+            del samples  # The map can only be closed once no array refers to it
+    return audio, sample_rate, started_at
+
+
+def spool_info(path):
+    """Return (length in seconds, start time) of a spool file without reading the audio."""
+    with open(path, "rb") as f:
+        _, sample_rate, started_at = HEADER.unpack(f.read(HEADER.size))
+    return max(0, os.path.getsize(path) - HEADER.size) // SAMPLE_DTYPE.itemsize / sample_rate, started_at
+
+
+def find_unfinished(directory):
+    """Spool files of recordings that were never transcribed, oldest first.
+
+    Files of QuickDoc instances that are still running are left alone;
+    abandoned files without any audio are deleted.
+    """
+    if not os.path.isdir(directory):
+        return []
+    unfinished = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(EXTENSION):
+            continue
+        path = os.path.join(directory, name)
+        pid = name[:-len(EXTENSION)].rsplit("_", 1)[-1]
+        if pid.isdigit() and psutil.pid_exists(int(pid)):
+            continue
+        try:
+            if spool_info(path)[0] > 0:
+                unfinished.append(path)
+                continue
+        except (OSError, struct.error) as e:
+            print(f"Unreadable audio spool {path}: {e}")
+            continue
+        remove_spool(path)
+    return unfinished
+
+
+def remove_spool(path):
+    """Delete a spool file once its recording is transcribed (or discarded)."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Could not delete audio spool {path}: {e}")
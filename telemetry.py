@@ -0,0 +1,315 @@
+"""Tracing spans, counters and a metrics exporter for the hot paths.
+
+    with telemetry.span("inference", audio_seconds=12.5):
+        ...
+    telemetry.increment("capture.overruns")
+
+Span durations go into per-name histograms; counters and gauges are plain
+numbers, and collectors registered with `add_collector` report live values
+such as queue depths when the metrics are read. Nothing is recorded until
+`configure` is called, and disabled spans are a shared no-op, so the
+instrumentation costs next to nothing when metrics are off.
+
+Exporters:
+- prometheus: text format at http://127.0.0.1:9464/metrics
+- jsonl:      span events and periodic snapshots in a rotating JSONL file,
+              written by a background thread
+
+`start_profiling` turns on cProfile for the sections wrapped in `profiled()`
+(the Tk main loop, background jobs, streaming windows) and writes the merged
+statistics on shutdown. From Python 3.12 cProfile can only run in one thread
+at a time, so a section that starts while another thread is being profiled
+runs unprofiled. Worker threads carry descriptive names so that py-spy
+dump/top output is readable as well.
+"""
+import bisect
+import contextlib
+import cProfile
+import json
+import logging
+import logging.handlers
+import os
+import pstats
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROMETHEUS_HOST = "127.0.0.1"
+PROMETHEUS_PORT = 9464
+JSONL_PATH = os.path.join("logs", "quickdoc_metrics.jsonl")
+JSONL_MAX_BYTES = 10 * 1024 * 1024
+JSONL_BACKUPS = 3
+SNAPSHOT_SECONDS = 60  # How often the JSONL exporter writes counters and histograms
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding quantile `q` (coarse, but cheap)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(BUCKETS + (self.max,), self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.collectors = []
+        self.logger = None      # Span event logger of the JSONL exporter
+        self.listener = None
+        self.server = None
+        self.stop_event = threading.Event()
+        self.profile_path = None
+        self.profiles = []
+        self.profiling = threading.local()
+        self.profile_conflict_reported = False
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self):
+        """Counters, gauges (including collected ones) and span statistics as a dict."""
+        gauges = {}
+        for collector in list(self.collectors):
+            try:
+                gauges.update(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        with self.lock:
+            gauges.update(self.gauges)
+            return {
+                "counters": dict(self.counters),
+                "gauges": gauges,
+                "spans": {
+                    name: {
+                        "count": h.count,
+                        "sum_s": round(h.sum, 6),
+                        "p50_s": _round(h.quantile(0.5)),
+                        "p95_s": _round(h.quantile(0.95)),
+                        "max_s": round(h.max, 6),
+                    }
+                    for name, h in self.histograms.items()
+                },
+            }
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = _metric_name(name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, value in sorted(snapshot["gauges"].items()):
+            metric = _metric_name(name)
+            lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+        lines.append("# TYPE quickdoc_span_seconds histogram")
+        with self.lock:
+            histograms = {name: (list(h.buckets), h.sum, h.count) for name, h in self.histograms.items()}
+        for name, (buckets, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + ("+Inf",), buckets):
+                cumulative += bucket
+                lines.append(f'quickdoc_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'quickdoc_span_seconds_sum{{span="{name}"}} {total}')
+            lines.append(f'quickdoc_span_seconds_count{{span="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _round(seconds):
+    return None if seconds is None else round(seconds, 6)
+
+
+def _metric_name(name):
+    return "quickdoc_" + "".join(c if c.isalnum() else "_" for c in name)
+
+
+_registry = Registry()
+
+
+class _Span:
+    __slots__ = ("name", "log", "attributes", "started_at")
+
+    def __init__(self, name, log, attributes):
+        self.name = name
+        self.log = log
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.started_at
+        _registry.observe(self.name, duration)
+        if exc_type is not None:
+            increment(f"{self.name}.errors")
+        if self.log and _registry.logger is not None:
+            event = {"type": "span", "name": self.name, "ts": round(time.time() - duration, 6),
+                     "duration_ms": round(duration * 1000, 3), "thread": threading.current_thread().name}
+            if self.attributes:
+                event["attributes"] = self.attributes
+            if exc_type is not None:
+                event["error"] = exc_type.__name__
+            _registry.logger.info(json.dumps(event, default=str))
+        return False
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(name, log=True, **attributes):
+    """Time the enclosed block as span `name`; `log=False` keeps per-call events out of the JSONL file."""
+    if not _registry.enabled:
+        return _NO_SPAN
+    return _Span(name, log, attributes)
+
+
+def increment(name, value=1):
+    """Add `value` to counter `name`."""
+    if not _registry.enabled:
+        return
+    with _registry.lock:
+        _registry.counters[name] = _registry.counters.get(name, 0) + value
+
+
+def set_gauge(name, value):
+    if not _registry.enabled:
+        return
+    with _registry.lock:
+        _registry.gauges[name] = value
+
+
+def add_collector(collector):
+    """Register a function returning {gauge name: value}, called whenever metrics are read."""
+    _registry.collectors.append(collector)
+
+
+def snapshot():
+    return _registry.snapshot()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = _registry.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the console
+
+
+def _write_snapshots():
+    while not _registry.stop_event.wait(SNAPSHOT_SECONDS):
+        _registry.logger.info(json.dumps({"type": "snapshot", "ts": round(time.time(), 3), **snapshot()}))
+
+
+def configure(exporter=None, host=PROMETHEUS_HOST, port=PROMETHEUS_PORT, path=JSONL_PATH,
+              max_bytes=JSONL_MAX_BYTES, backups=JSONL_BACKUPS):
+    """Start recording and, optionally, an exporter: "prometheus" or "jsonl"."""
+    _registry.enabled = True
+    if exporter == "prometheus":
+        _registry.server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        _registry.server.daemon_threads = True
+        threading.Thread(target=_registry.server.serve_forever, name="quickdoc-metrics", daemon=True).start()
+        print(f"Metrics at http://{host}:{port}/metrics")
+    elif exporter == "jsonl":
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                            encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        # Callers only enqueue; the file is written on the listener's thread
+        records = queue.SimpleQueue()
+        _registry.listener = logging.handlers.QueueListener(records, file_handler)
+        _registry.listener.start()
+        logger = logging.getLogger("quickdoc.metrics")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(logging.handlers.QueueHandler(records))
+        _registry.logger = logger
+        threading.Thread(target=_write_snapshots, name="quickdoc-metrics", daemon=True).start()
+        print(f"Writing metrics to {path}")
+    elif exporter is not None:
+        raise ValueError(f"Unknown metrics exporter {exporter!r}, expected prometheus or jsonl")
+
+
+def start_profiling(path):
+    """Profile the sections wrapped in `profiled()` and write the stats to `path` on shutdown."""
+    _registry.profile_path = path
+    print(f"Profiling to {path} (pid {os.getpid()} for py-spy)")
+
+
+@contextlib.contextmanager
+def profiled():
+    """Run the enclosed block under cProfile if profiling is on."""
+    local = _registry.profiling
+    if _registry.profile_path is None or getattr(local, "active", False):
+        yield
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError as e:
+        # Python 3.12+: "Another profiling tool is already active" in another thread
+        if not _registry.profile_conflict_reported:
+            _registry.profile_conflict_reported = True
+            print(f"Profiling only one thread at a time ({e}); use py-spy for the others")
+        yield
+        return
+    local.active = True
+    try:
+        yield
+    finally:
+        profile.disable()
+        local.active = False
+        with _registry.lock:
+            _registry.profiles.append(profile)
+
+
+def shutdown():
+    """Flush the exporters and write the profile, if any."""
+    _registry.stop_event.set()
+    if _registry.logger is not None:
+        _registry.logger.info(json.dumps({"type": "snapshot", "ts": round(time.time(), 3), **snapshot()}))
+        _registry.listener.stop()
+    if _registry.server is not None:
+        _registry.server.shutdown()
+    if _registry.profile_path and _registry.profiles:
+        with _registry.lock:
+            stats = pstats.Stats(*_registry.profiles)
+        stats.dump_stats(_registry.profile_path)
+        stats.sort_stats("cumulative").print_stats(20)
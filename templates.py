@@ -0,0 +1,165 @@
+"""In-memory prescription template rendering.
+
+The template .docx is parsed once. Every prescription is rendered from a
+copy of the cached document XML and written out together with the other
+package parts (styles, fonts, images) kept as raw bytes, so the zip and XML
+parsing is paid once per launch instead of once per click.
+
+Placeholders are written in the template as {{patient}}, {{date}} and
+{{body}} (any {{name}} works if a value is passed for it). A template without
+a {{body}} placeholder gets the transcription appended as a final paragraph,
+as before.
+"""
+import copy
+import io
+import os
+import re
+import threading
+import uuid
+import zipfile
+from datetime import datetime
+
+PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+def _set_run_text(run, text):
+    """Replace the content of a w:r element, turning newlines into line breaks."""
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    for child in list(run):
+        if child.tag in (qn("w:t"), qn("w:br"), qn("w:tab")):
+            run.remove(child)
+    for i, line in enumerate(text.split("\n")):
+        if i:
+            run.append(OxmlElement("w:br"))
+        t = OxmlElement("w:t")
+        t.set(qn("xml:space"), "preserve")
+        t.text = line
+        run.append(t)
+
+
+def _paragraph_text(paragraph):
+    """Text of the paragraph's own runs (the ones rendering rewrites)."""
+    from docx.oxml.ns import qn
+
+    return "".join(t.text or "" for run in paragraph.findall(qn("w:r")) for t in run.iter(qn("w:t")))
+
+
+class PrescriptionTemplate:
+    """A parsed template that renders prescriptions without touching the template file."""
+
+    def __init__(self, path):
+        import docx
+        from docx.oxml.ns import qn
+
+        self.path = path
+        with open(path, "rb") as f:
+            data = f.read()
+        self.document = docx.Document(io.BytesIO(data))
+        self.body = self.document.element.body
+        self.document_part = self.document.part.partname.lstrip("/")
+        with zipfile.ZipFile(io.BytesIO(data)) as package:
+            self.parts = [(info, package.read(info)) for info in package.infolist()]
+
+        # Remember which paragraphs hold placeholders so rendering only visits those
+        self.paragraph_texts = [_paragraph_text(paragraph) for paragraph in self.body.iter(qn("w:p"))]
+        self.placeholder_paragraphs = []
+        self.has_body_placeholder = False
+        for index, text in enumerate(self.paragraph_texts):
+            names = PLACEHOLDER.findall(text)
+            if names:
+                self.placeholder_paragraphs.append(index)
+                self.has_body_placeholder |= "body" in names
+
+    def _fill(self, body, values):
+        from docx.oxml import OxmlElement
+        from docx.oxml.ns import qn
+
+        paragraphs = list(body.iter(qn("w:p")))
+        for index in self.placeholder_paragraphs:
+            runs = paragraphs[index].findall(qn("w:r"))
+            filled = PLACEHOLDER.sub(lambda m: str(values.get(m.group(1), m.group(0))),
+                                     _paragraph_text(paragraphs[index]))
+            # Word often splits a placeholder over several runs; keep the first run's formatting
+            _set_run_text(runs[0], filled)
+            for run in runs[1:]:
+                paragraphs[index].remove(run)
+
+        if not self.has_body_placeholder and values.get("body"):
+            paragraph = OxmlElement("w:p")
+            run = OxmlElement("w:r")
+            _set_run_text(run, values["body"])
+            paragraph.append(run)
+            section = body.find(qn("w:sectPr"))
+            if section is not None:
+                section.addprevious(paragraph)
+            else:
+                body.append(paragraph)
+
+    @staticmethod
+    def _values(body, values):
+        values.setdefault("date", datetime.now().strftime("%d.%m.%Y"))
+        values.setdefault("patient", "")
+        values["body"] = body
+        return values
+
+    def paragraphs(self, body="", **values):
+        """Text of the rendered prescription's paragraphs, without building a .docx."""
+        values = self._values(body, values)
+        paragraphs = [
+            PLACEHOLDER.sub(lambda m: str(values.get(m.group(1), m.group(0))), text)
+            for text in self.paragraph_texts
+        ]
+        if not self.has_body_placeholder and body:
+            paragraphs.append(body)
+        return paragraphs
+
+    def render(self, stream, body="", **values):
+        """Render the template with `body` and placeholder `values` into a binary stream."""
+        from lxml import etree
+
+        values = self._values(body, values)
+
+        # Neither the cached tree nor the cached ZipInfos are modified, so rendering needs no lock
+        element = copy.deepcopy(self.document.element)
+        self._fill(element.body, values)
+        document_xml = etree.tostring(element, encoding="UTF-8", xml_declaration=True, standalone=True)
+
+        with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as package:
+            for info, data in self.parts:
+                # writestr fills in offsets and sizes on the ZipInfo it is given, so each write gets a copy
+                package.writestr(copy.copy(info), document_xml if info.filename == self.document_part else data)
+
+    def render_to_file(self, folder, body="", **values):
+        """Render into a new, uniquely named .docx in `folder` and return its path."""
+        os.makedirs(folder, exist_ok=True)
+        patient = re.sub(r"[^\w-]+", "_", values.get("patient") or "").strip("_")
+        stem = "_".join(filter(None, ["prescription", datetime.now().strftime("%Y%m%d_%H%M%S"), patient]))
+        while True:
+            path = os.path.join(folder, f"{stem}_{uuid.uuid4().hex[:8]}.docx")
+            try:
+                # "x" fails instead of overwriting if the name were ever taken
+                f = open(path, "xb")
+            except FileExistsError:
+                continue
+            try:
+                with f:
+                    self.render(f, body, **values)
+            except BaseException:
+                os.remove(path)
+                raise
+            return path
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def get_template(path):
+    """Return the parsed template for `path`, parsing it only on first use."""
+    with _templates_lock:
+        template = _templates.get(path)
+        if template is None:
+            template = _templates[path] = PrescriptionTemplate(path)
+        return template
@@ -0,0 +1,140 @@
+"""Content-addressed on-disk cache of transcription results.
+
+The key is a hash of the normalized audio together with everything that
+changes the result (backend, model, language, prompt, VAD), so re-running a
+take or restarting a batch returns the earlier result instead of decoding
+again. Entries are written atomically and the least recently used ones are
+evicted once the cache grows past its size limit.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+
+def audio_fingerprint(audio):
+    """Hash of the peak-normalized audio as 16-bit PCM.
+
+    Quantizing first makes the hash independent of float rounding and of the
+    recording gain.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    peak = np.max(np.abs(audio)) if len(audio) else 0
+    if peak > 0:
+        audio = audio / peak
+    pcm = np.clip(np.round(audio * 32767), -32768, 32767).astype("<i2")
+    return hashlib.sha256(pcm.tobytes()).hexdigest()
+
+
+class TranscriptionCache:
+    """LRU cache of whisper-style result dicts, one JSON file per entry."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.index = None  # key -> [size, last access], built on first use
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, audio, **options):
+        """Cache key for `audio` decoded with `options` (model, language, ...)."""
+        options_json = json.dumps(options, sort_keys=True, default=str)
+        return hashlib.sha256(f"{audio_fingerprint(audio)}:{options_json}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def _load_index(self):
+        # Called with the lock held
+        if self.index is not None:
+            return
+        self.index = {}
+        self.total_bytes = 0
+        if not os.path.isdir(self.directory):
+            return
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                self.index[name[:-5]] = [stat.st_size, stat.st_mtime]
+                self.total_bytes += stat.st_size
+
+    def get(self, key):
+        """Return the cached result for `key`, or None."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            os.utime(path)  # The modification time doubles as the LRU timestamp
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+            if self.index is not None and key in self.index:
+                self.index[key][1] = os.path.getmtime(path)
+        return result
+
+    def put(self, key, result):
+        """Store `result` atomically, then evict old entries if over the limit."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)  # Readers see either no entry or a complete one
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        stat = os.stat(path)
+        with self.lock:
+            self._load_index()
+            if key in self.index:
+                self.total_bytes -= self.index[key][0]
+            self.index[key] = [stat.st_size, stat.st_mtime]
+            self.total_bytes += stat.st_size
+            self._evict()
+
+    def _evict(self):
+        # Called with the lock held
+        if self.total_bytes <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self.index.items(), key=lambda item: item[1][1]):
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass  # Already removed, e.g. by another batch worker
+            del self.index[key]
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        """Hit/miss counters and the current size of the cache."""
+        with self.lock:
+            self._load_index()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "entries": len(self.index),
+                "bytes": self.total_bytes
+            }
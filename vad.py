@@ -0,0 +1,135 @@
+"""Energy-based voice activity detection.
+
+Long pauses (reading the chart, looking up a dosage) cost inference time and
+make Whisper hallucinate filler text. `trim_silence` cuts them out before
+transcription and returns a SpeechMap so timestamps in the trimmed audio can
+be mapped back to the original recording.
+"""
+import numpy as np
+
+FRAME_SECONDS = 0.03       # Analysis frame length
+NOISE_PERCENTILE = 10      # Quietest frames used to estimate the noise floor
+THRESHOLD_DB = 10          # Speech must be this far above the noise floor...
+SPEECH_RANGE_DB = 30       # ...or within this range of the loudest frame...
+MIN_THRESHOLD_DB = -50     # ...and never quieter than this (dBFS)
+PADDING_SECONDS = 0.2      # Kept around speech so word onsets are not clipped
+MIN_SILENCE_SECONDS = 0.6  # Shorter pauses are kept as part of the speech
+MIN_SPEECH_SECONDS = 0.1   # Shorter bursts (clicks, coughs) are dropped
+
+
+def frame_rms(audio, frame_length):
+    """RMS of consecutive non-overlapping frames; a trailing partial frame is ignored."""
+    n_frames = len(audio) // frame_length
+    frames = audio[:n_frames * frame_length].reshape(n_frames, frame_length)
+    return np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+
+
+def _runs(mask):
+    """Start and end (exclusive) indices of the runs of True in a boolean array."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def noise_floor(level_db):
+    """Background level (dBFS), estimated from the quietest frames."""
+    return np.percentile(level_db, NOISE_PERCENTILE)
+
+
+def speech_threshold(level_db):
+    """Frame level (dBFS) above which a frame counts as speech."""
+    # Without any pause the "noise floor" is speech, hence the cap relative to the peak
+    return max(min(noise_floor(level_db) + THRESHOLD_DB, level_db.max() - SPEECH_RANGE_DB), MIN_THRESHOLD_DB)
+
+
+def pause_threshold(level_db):
+    """Frame level (dBFS) at or below which a frame counts as a pause.
+
+    Not capped relative to the peak like `speech_threshold`, so pauses are
+    still found in a noisy room; `level_db` should span some pauses, e.g. the
+    last minute of a dictation.
+    """
+    return max(noise_floor(level_db) + THRESHOLD_DB, MIN_THRESHOLD_DB)
+
+
+def detect_speech(audio, sample_rate):
+    """Return the speech regions of `audio` as an (n, 2) array of sample ranges."""
+    frame_length = int(sample_rate * FRAME_SECONDS)
+    if len(audio) < frame_length:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    level_db = 20 * np.log10(frame_rms(audio, frame_length) + 1e-10)
+    starts, ends = _runs(level_db > speech_threshold(level_db))
+    if not len(starts):
+        return np.zeros((0, 2), dtype=np.int64)
+
+    # Drop isolated bursts, then pad and merge regions separated by short pauses
+    long_enough = (ends - starts) * FRAME_SECONDS >= MIN_SPEECH_SECONDS
+    starts, ends = starts[long_enough], ends[long_enough]
+    if not len(starts):
+        return np.zeros((0, 2), dtype=np.int64)
+    padding = int(round(PADDING_SECONDS / FRAME_SECONDS))
+    min_gap = int(round(MIN_SILENCE_SECONDS / FRAME_SECONDS))
+    starts = np.maximum(starts - padding, 0)
+    ends = ends + padding
+    keep_gap = (starts[1:] - ends[:-1]) >= min_gap
+    starts = starts[np.concatenate(([True], keep_gap))]
+    ends = ends[np.concatenate((keep_gap, [True]))]
+
+    regions = np.stack((starts, ends), axis=1) * frame_length
+    if ends[-1] >= len(level_db):
+        regions[-1, 1] = len(audio)  # Speech runs into the trailing partial frame
+    regions[:, 1] = np.minimum(regions[:, 1], len(audio))
+    return regions
+
+
+class SpeechMap:
+    """Maps times in trimmed audio back to the original recording."""
+
+    def __init__(self, regions, sample_rate, total_samples):
+        self.regions = regions
+        self.sample_rate = sample_rate
+        self.total_samples = total_samples
+        lengths = regions[:, 1] - regions[:, 0]
+        # Start of every kept region inside the trimmed audio
+        self.trimmed_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if len(regions) else np.zeros(0)
+        self.kept_samples = int(lengths.sum())
+
+    @property
+    def total_seconds(self):
+        return self.total_samples / self.sample_rate
+
+    @property
+    def skipped_seconds(self):
+        return (self.total_samples - self.kept_samples) / self.sample_rate
+
+    def to_original(self, seconds):
+        """Convert a time (or array of times) in the trimmed audio to the original."""
+        if not len(self.regions):
+            return seconds
+        samples = np.asarray(seconds) * self.sample_rate
+        index = np.clip(np.searchsorted(self.trimmed_starts, samples, side="right") - 1, 0, None)
+        original = self.regions[index, 0] + (samples - self.trimmed_starts[index])
+        return original / self.sample_rate
+
+    def map_segments(self, segments):
+        """Return copies of whisper segments (and their words) with start/end in original time."""
+        mapped = []
+        for segment in segments:
+            segment = dict(segment)
+            segment["start"] = float(self.to_original(segment["start"]))
+            segment["end"] = float(self.to_original(segment["end"]))
+            if segment.get("words"):
+                segment["words"] = self.map_segments(segment["words"])
+            mapped.append(segment)
+        return mapped
+
+
+def trim_silence(audio, sample_rate):
+    """Cut non-speech regions out of `audio`; returns (trimmed audio, SpeechMap)."""
+    regions = detect_speech(audio, sample_rate)
+    speech_map = SpeechMap(regions, sample_rate, len(audio))
+    if not len(regions):
+        return audio[:0], speech_map
+    if len(regions) == 1 and regions[0, 0] == 0 and regions[0, 1] == len(audio):
+        return audio, speech_map  # Nothing to cut, avoid the copy
+    return np.concatenate([audio[start:end] for start, end in regions]), speech_map
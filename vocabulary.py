@@ -0,0 +1,251 @@
+"""Medical vocabulary: prompt biasing and post-correction of drug names.
+
+The vocabulary file (vocabulary.txt) lists drug names, units and phrases,
+one per line and most important first:
+
+    Ibuprofen
+    Novaminsulfon = Nova Minsulfon, Novamin Sulfon    # known mishearings
+    !Metall                                           # never corrected
+    [exact]                                           # entries below: no near-miss correction
+    Tablette
+    mg = Milligramm
+    bei Bedarf
+
+The entries are passed to Whisper as an initial prompt, which makes it much
+more likely to spell them as listed; the prompt is cut to fit the model's
+prompt budget once per model. After decoding, `correct` fixes what is left:
+listed mishearings (also spanning several words) through a word trie, and
+near misses of drug names ("Metformine", "Pantoprazoll", "Rami Pril") through
+a deletion index, which finds every lexicon word within one or two edits of
+a token with a handful of dictionary lookups. Both are built once when the
+file is loaded. Only a single edit is corrected on its own; two edits are
+as likely to be a different drug (Prednison and Prednisolon, Saxagliptin and
+Sitagliptin), so `suggest` returns those for the user to confirm. Real
+drugs and words one edit from an entry (Kalzium next to Kalium) are listed
+with "!" so they are neither corrected nor suggested. Dosage forms and units go in the [exact] section: "Tabletten"
+is one edit from "Tablette" but a correct plural, so only their listed
+mishearings are replaced. For the same reason a lexicon word with a German
+inflection ending ("Metformins", "Salben") is left as it is.
+"""
+import hashlib
+import re
+
+PROMPT_MAX_TOKENS = 120   # Whisper keeps the last 223 prompt tokens; the rest is left for streaming context
+FUZZY_MIN_LENGTH = 5      # Shorter words are too easily confused with ordinary ones
+AUTO_MAX_DISTANCE = 1     # Farther near misses are only suggested
+CHARS_PER_TOKEN = 2.5     # Estimate for drug names when no tokenizer is at hand
+INFLECTION_SUFFIXES = ("n", "en", "s")
+
+WORD_RE = re.compile(r"\w+(?:[-']\w+)*")
+
+
+def join_prompts(*prompts):
+    """Combine prompts, e.g. the vocabulary and the text said so far; None if all are empty."""
+    return " ".join(prompt for prompt in prompts if prompt) or None
+
+
+def _key(word):
+    return word.casefold()
+
+
+def _max_distance(length):
+    return 1 if length < 8 else 2
+
+
+def _deletes(word, distance):
+    """`word` with up to `distance` characters removed."""
+    results = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        results |= frontier
+    return results
+
+
+def edit_distance(a, b, limit):
+    """Optimal string alignment distance (with transpositions), or limit + 1 once it exceeds `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class Vocabulary:
+    """Prompt and correction indexes over a list of terms."""
+
+    def __init__(self, entries, variants=None, keep=(), exact=()):
+        self.entries = list(entries)        # Canonical spellings, most important first
+        self.keep = {_key(word) for word in keep}
+        exact = set(exact)                   # Entries without near-miss correction
+        self.trie = {}                       # casefolded word -> subtrie; None key holds the replacement
+        self.fuzzy = {}                      # deletion variant -> canonical single words
+        self.words = {}                      # casefolded single-word entry -> canonical spelling
+        self.shapes = set()                  # (first letter, length) a fuzzy match can have, to skip most words
+        self.prompts = {}
+        # Changes whenever the prompt could; part of the transcription cache key
+        self.version = hashlib.sha256("\n".join(self.entries).encode("utf-8")).hexdigest()[:12]
+
+        for entry in self.entries:
+            words = WORD_RE.findall(entry)
+            if len(words) == 1 and words[0] == entry:
+                self.words[_key(entry)] = entry
+                if not entry.islower():
+                    self._add_phrase(entry, entry)  # Fixes the case ("ibuprofen"); phrases are only prompted
+                if len(entry) >= FUZZY_MIN_LENGTH and entry.isalpha() and entry not in exact:
+                    limit = _max_distance(len(entry))
+                    for variant in _deletes(_key(entry), limit):
+                        self.fuzzy.setdefault(variant, set()).add(entry)
+                    self.shapes.update((_key(entry)[0], length)
+                                       for length in range(len(entry) - limit, len(entry) + limit + 1))
+        for canonical, heard in (variants or {}).items():
+            for phrase in heard:
+                self._add_phrase(phrase, canonical)
+
+    @classmethod
+    def load(cls, path):
+        """Read a vocabulary file (see the module docstring)."""
+        entries, variants, keep, exact = [], {}, [], []
+        section = "fuzzy"
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                if line in ("[exact]", "[fuzzy]"):
+                    section = line[1:-1]
+                    continue
+                if line.startswith("!"):
+                    keep.append(line[1:].strip())
+                    continue
+                term, _, heard = line.partition("=")
+                term = term.strip()
+                entries.append(term)
+                if section == "exact":
+                    exact.append(term)
+                if heard.strip():
+                    variants[term] = [phrase.strip() for phrase in heard.split(",") if phrase.strip()]
+        return cls(entries, variants, keep, exact)
+
+    def _add_phrase(self, phrase, replacement):
+        node = self.trie
+        for word in WORD_RE.findall(phrase):
+            node = node.setdefault(_key(word), {})
+        if node is not self.trie:
+            node[None] = replacement
+
+    # --- Prompt ---
+
+    def prompt(self, count_tokens=None, max_tokens=PROMPT_MAX_TOKENS):
+        """Entries as a comma-separated prompt of at most `max_tokens`, built once per tokenizer."""
+        cache_key = count_tokens
+        if cache_key not in self.prompts:
+            count_tokens = count_tokens or (lambda text: int(len(text) / CHARS_PER_TOKEN) + 1)
+            # Grow the list while it fits; the most important entries come first
+            low, high = 0, len(self.entries)
+            while low < high:
+                middle = (low + high + 1) // 2
+                if count_tokens(", ".join(self.entries[:middle]) + ".") <= max_tokens:
+                    low = middle
+                else:
+                    high = middle - 1
+            self.prompts[cache_key] = ", ".join(self.entries[:low]) + "." if low else None
+        return self.prompts[cache_key]
+
+    # --- Correction ---
+
+    def _fuzzy_match(self, word, max_distance=AUTO_MAX_DISTANCE):
+        """The lexicon word within the edit limit of `word`, if there is exactly one best."""
+        key = _key(word)
+        if (key[0], len(key)) not in self.shapes:
+            return None
+        limit = min(_max_distance(len(key)), max_distance)
+        candidates = set()
+        for variant in _deletes(key, limit):
+            candidates |= self.fuzzy.get(variant, set())
+        best, best_distance = None, limit + 1
+        for candidate in candidates:
+            if _key(candidate)[0] != key[0]:
+                continue  # Whisper rarely gets the first letter wrong; this keeps ordinary words out
+            distance = edit_distance(key, _key(candidate), limit)
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+            elif distance == best_distance:
+                best = None  # Ambiguous
+        return best if best_distance <= limit else None
+
+    def _correctable(self, word):
+        key = _key(word)
+        return (len(word) >= FUZZY_MIN_LENGTH and word.isalpha() and key not in self.words
+                and key not in self.keep and not self._inflected(key))
+
+    def _inflected(self, key):
+        """A lexicon word with an inflection ending, e.g. "tabletten" or "metformins"."""
+        return any(key.endswith(suffix) and key[:-len(suffix)] in self.words for suffix in INFLECTION_SUFFIXES)
+
+    def correct(self, text):
+        """Return (corrected text, [(heard, corrected), ...])."""
+        matches = list(WORD_RE.finditer(text))
+        keys = [_key(match.group()) for match in matches]
+        parts, corrections = [], []
+        position = 0  # End of the text already copied
+        i = 0
+        while i < len(matches):
+            replacement, end = self._trie_match(keys, i)
+            if replacement is None and i + 1 < len(matches) and self._joinable(matches, text, i):
+                # Split in two by Whisper ("Rami Pril"); tried first so "Salbu" does not become "Salbe"
+                replacement, end = self._fuzzy_match(matches[i].group() + matches[i + 1].group()), i + 2
+            if replacement is None and self._correctable(matches[i].group()):
+                replacement, end = self._fuzzy_match(matches[i].group()), i + 1
+            if replacement is None:
+                i += 1
+                continue
+            start, stop = matches[i].start(), matches[end - 1].end()
+            heard = text[start:stop]
+            if heard != replacement:
+                parts.append(text[position:start])
+                parts.append(replacement)
+                corrections.append((heard, replacement))
+                position = stop
+            i = end
+        parts.append(text[position:])
+        return "".join(parts), corrections
+
+    def suggest(self, text):
+        """Near misses `correct` leaves alone because they are two edits away: [(heard, suggestion), ...]."""
+        suggestions = []
+        for match in WORD_RE.finditer(text):
+            word = match.group()
+            if self._correctable(word) and self._fuzzy_match(word) is None:
+                candidate = self._fuzzy_match(word, max_distance=2)
+                if candidate is not None and (word, candidate) not in suggestions:
+                    suggestions.append((word, candidate))
+        return suggestions
+
+    def _trie_match(self, keys, i):
+        """Longest listed phrase starting at word `i`: (replacement, end index) or (None, i)."""
+        node, best, best_end = self.trie, None, i
+        for j in range(i, len(keys)):
+            node = node.get(keys[j])
+            if node is None:
+                break
+            if None in node:
+                best, best_end = node[None], j + 1
+        return best, best_end
+
+    def _joinable(self, matches, text, i):
+        first, second = matches[i].group(), matches[i + 1].group()
+        return (first[0].isupper() and first.isalpha() and second.isalpha() and len(first) + len(second) >= 7
+                and text[matches[i].end():matches[i + 1].start()] == " "
+                and _key(first) not in self.keep and _key(second) not in self.keep
+                and _key(first) not in self.words and _key(second) not in self.words)